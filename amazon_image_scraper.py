@@ -4,6 +4,7 @@ import random
 from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright
 from database import db
+from catalog_mirror import mirror
 from image_processor import ImageProcessor
 from ebay_core import EbayManager
 
@@ -21,11 +22,14 @@ class AmazonImageScraper:
         
     async def __get_images_to_scrape(self, limit=50):
         """Returns ASINs that DO NOT have an image URL in product_media yet."""
-        # Query core_products that lack media
-        res = db.client.table("core_products").select("id, asin, product_media(media_url)").execute()
+        # Query core_products that lack media (local catalog mirror when fresh, otherwise Supabase)
+        if mirror.ensure_fresh():
+            products = mirror.iter_core_products()
+        else:
+            products = db.iter_rows("core_products", "id, asin, product_media(media_url)")
         
         needs_image = []
-        for p in res.data:
+        for p in products:
             media = p.get("product_media", [])
             # media can be empty or a list of items where media_url is empty
             if not media or not isinstance(media, list) or len(media) == 0:
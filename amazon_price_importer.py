@@ -2,10 +2,9 @@ import pandas as pd
 import glob
 import os
 import asyncio
-import aiohttp
 from datetime import datetime
-from database import db
-from pricing_engine import PricingEngine
+from database import db, create_async_session
+from repricing_job import RepricingJob
 
 async def update_item(session, url, headers, item):
     product_id = item['product_id']
@@ -35,55 +34,21 @@ async def update_item(session, url, headers, item):
         print(f"Local Error in HTTP update {product_id}: {e}")
         return False
 
-async def update_listing_item(session, url, headers, item):
-    product_id = item['product_id']
-    try:
-        get_url = f"{url}?product_id=eq.{product_id}&select=id"
-        async with session.get(get_url, headers=headers) as resp:
-            data = await resp.json()
-            
-        if data and len(data) > 0:
-            patch_url = f"{url}?product_id=eq.{product_id}"
-            payload = {"listed_price": item['listed_price'], "updated_at": item['updated_at'], "needs_sync": True}
-            async with session.patch(patch_url, headers=headers, json=payload) as resp:
-                return resp.status in [200, 204]
-        # We don't insert here, listings should exist
-        return True 
-    except Exception as e:
-        return False
-
-async def bulk_push(sources_updates, listings_updates):
+async def bulk_push(sources_updates):
     print(f"Büyük veri paketi {len(sources_updates)} gönderime hazırlanıyor (Asenkron İşlem)...")
     success_count = 0
-    listings_count = 0
     
-    from dotenv import load_dotenv
-    load_dotenv()
-    SUPABASE_URL = os.environ.get('SUPABASE_URL')
-    SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
-    sources_url = f"{SUPABASE_URL}/rest/v1/sources"
-    listings_url = f"{SUPABASE_URL}/rest/v1/listings"
+    sources_url = db.rest_url("sources")
+    headers = db.rest_headers(prefer="return=minimal")
     
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "return=minimal"
-    }
-    
-    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
+    # Süreç genelindeki havuz ayarlarıyla keep-alive oturum (binlerce küçük çağrıda TLS el sıkışmasını tekrarlamaz)
+    async with create_async_session(ssl=False) as session:
         # Push to sources table
         tasks_s = [update_item(session, sources_url, headers, item) for item in sources_updates]
         results_s = await asyncio.gather(*tasks_s)
         success_count = sum(1 for r in results_s if r)
         
-        # Push to listings table
-        print(f"Satış Fiyatları da ({len(listings_updates)}) listelere hesaplanıp yükleniyor...")
-        tasks_l = [update_listing_item(session, listings_url, headers, item) for item in listings_updates]
-        results_l = await asyncio.gather(*tasks_l)
-        listings_count = sum(1 for r in results_l if r)
-        
-    return success_count, listings_count
+    return success_count
 
 def run_import():
     print("Amazon Wishlist Sonuç Dosyası (Fiyatlar) taranıyor...")
@@ -105,22 +70,11 @@ def run_import():
         missing_count = 0
         
         print("Supabase'den Ürün ID haritası alınıyor...")
-        all_products = []
-        offset = 0
-        limit_size = 1000
-        while True:
-            res_chunk = db.client.table('core_products').select('id, asin').range(offset, offset + limit_size - 1).execute()
-            if not res_chunk.data:
-                break
-            all_products.extend(res_chunk.data)
-            offset += limit_size
-            if len(res_chunk.data) < limit_size:
-                break
+        all_products = db.iter_rows('core_products', 'id, asin')
                 
         asin_to_id = {row['asin']: row['id'] for row in all_products if row.get('asin')}
         
         sources_updates = []
-        listings_updates = []
         for _, row in valid_rows.iterrows():
             asin = str(row[1]).strip().upper()
             raw_price = str(row[7]).strip()
@@ -147,17 +101,13 @@ def run_import():
                     "updated_at": datetime.utcnow().isoformat()
                 })
                 
-                # Fiyatı hesapla ve Listelere bas (ebay store ID si filan girmeyiz, zaten patch ediyoruz)
-                final_listed_price = PricingEngine.calculate_final_price(price_val, marketplace="ebay")
-                listings_updates.append({
-                    "product_id": product_id,
-                    "listed_price": final_listed_price,
-                    "updated_at": datetime.utcnow().isoformat()
-                })
-                
         if sources_updates:
-            s_count, l_count = asyncio.run(bulk_push(sources_updates, listings_updates))
-            print(f"🎯 GÜNCELLEME TAMAMLANDI! {s_count} Maliyet, {l_count} Satış Fiyatı işlendi (Geri kalan {missing_count} tanesi stokta yok).")
+            s_count = asyncio.run(bulk_push(sources_updates))
+            # Satış fiyatları toplu hesaplanır; sadece fiyatı gerçekten değişen ilanlar yazılıp senkrona işaretlenir
+            summary = RepricingJob().run(product_ids=[s["product_id"] for s in sources_updates])
+            print(f"🎯 GÜNCELLEME TAMAMLANDI! {s_count} Maliyet işlendi, {summary['changed']} Satış Fiyatı değişti ({summary['unchanged']} aynı kaldı, geri kalan {missing_count} tanesi stokta yok).")
+            if summary["write_failed"]:
+                print(f"⚠️ {summary['write_failed']} ilanın yeni fiyatı DB'ye yazılamadı.")
         else:
             print("Güncellenecek geçerli fiyat bulunamadı.")
             
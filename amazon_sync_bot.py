@@ -11,10 +11,14 @@ from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright
 
 from database import db
+from product_resolver import resolver
+from write_buffer import write_buffer
 from pricing_engine import PricingEngine
-from ebay_core import EbayManager
+from repricing_job import RepricingJob
+from ebay_core import EbayManager, CHANNEL_API_INVENTORY
 
 STORE_ID = "197bd215-3bec-4f43-aa40-f2fb4d204eee"
+PRICING_REFRESH_SECONDS = 300  # Kategori komisyonları bu aralıkla yeniden okunur
 UPLOAD_DIR = "/Users/fatihozdemir/Desktop/Kodlar/Informattach_ERP/temp_uploads"
 
 # -- Stealth Ayarları (list_importer'dan uyarlandı) --
@@ -30,9 +34,25 @@ def log(msg):
 class AmazonSyncBot:
     def __init__(self):
         self.ebay = EbayManager(store_id=STORE_ID)
+        self._pricing = None
+        self._pricing_loaded_at = 0.0
         if not os.path.exists(UPLOAD_DIR):
             os.makedirs(UPLOAD_DIR)
 
+    def _pricing_job(self) -> RepricingJob:
+        """
+        Fiyatlar RepricingJob ile aynı kategori komisyonlarıyla hesaplanır; aksi halde bot'un yazdığı
+        computed_price job tarafından eski sayılır ve iki taraf fiyatı her turda birbirine geri yazar.
+        """
+        if self._pricing is None or time.time() - self._pricing_loaded_at > PRICING_REFRESH_SECONDS:
+            self._pricing = RepricingJob(marketplace="ebay")
+            self._pricing_loaded_at = time.time()
+        return self._pricing
+
+    def _listing_category(self, asin: str):
+        _, listing = resolver.listing_for(asin, STORE_ID)
+        return listing.get("category_id") if listing else None
+
     # ---------------------------------------------------------
     # YÖNTEM 1: TOPLU (BULK) EXCEL AKTARIMI
     # ---------------------------------------------------------
@@ -85,9 +105,30 @@ class AmazonSyncBot:
 
                 log(f"{len(updates)} kalem ürün Excel'den okundu. Güncellemeler başlatılıyor...")
                 
-                # 2. Veritabanı ve eBay'i Güncelle
-                for product in updates:
-                    self._process_single_update(product['asin'], product['price'], product['qty'])
+                # 2. Veritabanı ve eBay'i Güncelle (ASIN'ler tek seferde toplu çözümlenir)
+                # Satış fiyatları da tüm dosya için tek vektörel çağrıda (kategori komisyonlarıyla) hesaplanır
+                # eBay çağrıları toplanıp tek seferde eşzamanlı (ebay_async) gönderilir
+                resolver.resolve_asins(product['asin'] for product in updates)
+                listed_prices = self._pricing_job().price(
+                    [product['price'] for product in updates],
+                    [self._listing_category(product['asin']) for product in updates],
+                )
+                pushes = []
+                for product, listed_price in zip(updates, listed_prices):
+                    push = self._process_single_update(product['asin'], product['price'], product['qty'], listed_price=float(listed_price), push=False)
+                    if push:
+                        pushes.append(push)
+                
+                if pushes:
+                    try:
+                        asyncio.run(self._push_to_ebay_async(pushes))
+                    except Exception as e_push:
+                        log(f"eBay toplu gönderim hatası, {len(pushes)} ilan needs_sync=True bırakılıyor: {e_push}")
+                        for push in pushes:
+                            self._mark_needs_sync(push[0])
+                flushed = write_buffer.flush()
+                if flushed["failed"]:
+                    log(f"⚠️ {len(flushed['failed'])} DB satırı yazılamadı (ilkleri: {flushed['failed'][:5]}).")
                 
                 # 3. Dosyayı yedekle veya sil
                 os.remove(file_path)
@@ -188,6 +229,7 @@ class AmazonSyncBot:
                     amazon_sources.append(s)
 
             log(f"Taranacak {len(amazon_sources)} adet ({queue_type} Öncelikli) Amazon ürünü bulundu.")
+            resolver.resolve_asins(s["source_code"] for s in amazon_sources)
             
         except Exception as e:
             log(f"DB Kaynak Çekme Hatası: {e}")
@@ -274,60 +316,106 @@ class AmazonSyncBot:
     # ---------------------------------------------------------
     # ORTAK GÜNCELLEME ÇEKİRDEĞİ (Yöntem 1 ve Yöntem 2 kullanır)
     # ---------------------------------------------------------
-    def _process_single_update(self, asin: str, base_cost: float, qty: int, channel_sku: str = None):
-        """Maliyeti alır, Pricing Engine hesaplar ve Supabase+eBay'e yazar."""
+    async def _push_to_ebay_async(self, pushes):
+        """
+        (asin, sku, item_id, fiyat, stok) listesini eBay'e basar: Inventory API SKU'ları 25'erli
+        bulk_update_price_quantity, legacy ilanlar 4'erli ReviseInventoryStatus çağrılarıyla (update_prices_and_quantities).
+        """
+        from ebay_async import AsyncEbayManager
+
+        log(f"{len(pushes)} ilan eBay'e toplu çağrılarla gönderiliyor...")
+        async with AsyncEbayManager(STORE_ID) as ebay:
+            entries = [{"sku": sku, "item_id": item_id, "price": price, "quantity": qty} for _, sku, item_id, price, qty in pushes]
+            results = await ebay.update_prices_and_quantities(entries)
+
+        failed = 0
+        for (asin, _, _, _, _), result in zip(pushes, results):
+            if not result["success"]:
+                failed += 1
+                log(f"[{asin}] eBay API Hatası ({result['path']}): {result['message']}")
+                self._mark_needs_sync(asin)
+        via_rest = sum(1 for r in results if r["success"] and r["path"] == CHANNEL_API_INVENTORY)
+        log(f"eBay gönderimi tamamlandı: {via_rest} Inventory API, {len(pushes) - via_rest - failed} Trading API yoldan başarılı, {failed} hata.")
+
+    def _mark_needs_sync(self, asin: str):
+        """eBay'e gönderilemeyen ilanı needs_sync=True bırakır (tampondaki False'u ezer, bir sonraki tur tekrar dener)."""
+        product = resolver.resolve_asin(asin)
+        for l in (product or {}).get("listings", []):
+            if l.get("store_id") == STORE_ID:
+                write_buffer.update("listings", l["id"], {"needs_sync": True})
+
+    def _process_single_update(self, asin: str, base_cost: float, qty: int, channel_sku: str = None, listed_price: float = None, push: bool = True):
+        """Maliyeti alır, Pricing Engine hesaplar ve Supabase+eBay'e yazar.
+        listed_price verilirse (toplu fiyatlanmış Excel akışı) yeniden hesaplanmaz.
+        push=False ise eBay çağrısı yapılmaz; toplu gönderim için (asin, sku, item_id, fiyat, stok) döner."""
         from pricing_engine import PricingEngine
         
         try:
-            # 1. Veritabanından product_id ve eğer gerekliyse SKU'yu al
-            p_res = db.client.table("core_products").select("id").eq("asin", asin).execute()
-            if not p_res.data:
+            # 1. product_id ve eğer gerekliyse SKU'yu al (toplu çözümleyici önbelleğinden)
+            product = resolver.resolve_asin(asin)
+            p_id = product["product_id"] if product else None
+            store_listings = [l for l in product["listings"] if l.get("store_id") == STORE_ID] if product else []
+            listing = store_listings[0] if store_listings else None
+            if not p_id:
                 log(f"[{asin}] Veritabanında ürün bulunamadı. DB Güncellemesi atlanıyor.")
                 return
-            p_id = p_res.data[0]["id"]
 
+            item_id = listing.get("channel_item_id") if listing else None
             if not channel_sku:
-                l_res = db.client.table("listings").select("channel_sku, channel_item_id").eq("product_id", p_id).eq("store_id", STORE_ID).execute()
-                if l_res.data and l_res.data[0].get("channel_sku"):
-                    channel_sku = l_res.data[0]["channel_sku"]
-                    item_id = l_res.data[0].get("channel_item_id")
+                if listing and listing.get("channel_sku"):
+                    channel_sku = listing["channel_sku"]
                 else:
                     channel_sku = f"A-{asin}" # Standart Easync kalıbı (Fallback)
                     item_id = None
-            else:
-                # Sku parametreden geldiyse ItemID'yi yine de DB'den al
-                l_res = db.client.table("listings").select("channel_item_id").eq("product_id", p_id).eq("store_id", STORE_ID).execute()
-                item_id = l_res.data[0].get("channel_item_id") if l_res.data else None
             
             # ERP Satış Fiyatı Hesaplama
-            listed_price = PricingEngine.calculate_final_price(
-                source_price=base_cost, 
-                marketplace="ebay"
-            )
+            if listed_price is None:
+                category_id = listing.get("category_id") if listing else None
+                listed_price = float(self._pricing_job().price([base_cost], [category_id])[0])
             
             if listed_price <= 0 and qty > 0:
                 log(f"[{asin}] Uyarı: Maliyet hesabı $0 döndü. Es geçiliyor.")
                 return
 
             # eBay API Güncelleme
-            try:
-                self.ebay.update_price_and_quantity(sku=channel_sku, new_price=listed_price, new_qty=qty, item_id=item_id)
-                log(f"[{asin}] eBay API Başarılı: Stok={qty}, Fiyat=${listed_price}")
-            except Exception as e_api:
-                log(f"[{asin}] eBay API Hatası: {e_api}")
-                # Loglansın ama DB güncellenmeye devam etsin (senkron bozulmasın)
+            # Gönderim başarısızsa DB yine güncellenir ama needs_sync=True kalır (bir sonraki tur tekrar dener).
+            # push=False ise sonuç toplu gönderimde kontrol edilir (_push_to_ebay_async -> _mark_needs_sync).
+            pushed = True
+            if push:
+                try:
+                    result = self.ebay.update_price_and_quantity(sku=channel_sku, new_price=listed_price, new_qty=qty, item_id=item_id)
+                    pushed = bool(result and result.get("success"))
+                    if pushed:
+                        log(f"[{asin}] eBay API Başarılı: Stok={qty}, Fiyat=${listed_price}")
+                    else:
+                        log(f"[{asin}] eBay API Hatası: {result.get('message') if result else 'yanıt yok'}")
+                except Exception as e_api:
+                    pushed = False
+                    log(f"[{asin}] eBay API Hatası: {e_api}")
 
-            # DB Güncelleme
+            # DB Güncelleme (write-behind tampon: satır başına update yerine döngü sonunda toplu upsert)
             # A) sources'ı güncelle (Maliyet)
-            db.client.table("sources").update({"base_cost": base_cost}).eq("product_id", p_id).execute()
+            for src in product.get("sources", []):
+                write_buffer.update("sources", src["id"], {"base_cost": base_cost})
             
             # B) listings'ı güncelle (Son Fiyat, Miktar, needs_sync SIFIRLAMA ve updated_at tazeleme)
-            db.client.table("listings").update({
-                "listed_price": listed_price, 
-                "quantity": qty,
-                "needs_sync": False, # İşlem bitti, aciliyeti kaldır.
-                "updated_at": datetime.utcnow().isoformat()
-            }).eq("product_id", p_id).eq("store_id", STORE_ID).execute()
+            #    computed_price damgası da yazılır ki repricing_job bu satırı tekrar hesaplamasın.
+            now = datetime.utcnow().isoformat()
+            rules_version = PricingEngine.get_rule_set("ebay").version or 0
+            for l in store_listings:
+                write_buffer.update("listings", l["id"], {
+                    "listed_price": listed_price, 
+                    "quantity": qty,
+                    "computed_price": listed_price,
+                    "pricing_rules_version": rules_version,
+                    "priced_cost": base_cost,
+                    "priced_at": now,
+                    "needs_sync": not pushed, # eBay'e ulaştıysa aciliyeti kaldır
+                    "updated_at": now
+                })
+
+            if not push:
+                return (asin, channel_sku, item_id, listed_price, qty)
             
         except Exception as e:
             log(f"[{asin}] İşlem Çekirdeği Hatası: {e}")
@@ -349,6 +437,11 @@ class AmazonSyncBot:
                     # 2. Klasörde dosya yoksa ve zamanı da uyguna tarama motorunu çalıştır
                     # Burayı async çalıştırıyoruz
                     asyncio.run(self.run_live_scraper())
+                
+                # Tur içinde biriken DB güncellemelerini uykudan önce yaz (sonraki kuyruk sorgusu güncel veriyi görsün)
+                flushed = write_buffer.flush()
+                if flushed["failed"]:
+                    log(f"⚠️ {len(flushed['failed'])} DB satırı yazılamadı (ilkleri: {flushed['failed'][:5]}).")
                     
                 # Aşırı Ban yememek için döngüler arasına dinlenme
                 sleep_minutes = random.randint(15, 30)
@@ -357,6 +450,7 @@ class AmazonSyncBot:
                 
             except KeyboardInterrupt:
                 log("Bot manuel olarak durduruldu.")
+                write_buffer.close()
                 sys.exit(0)
             except Exception as e:
                 import traceback
@@ -0,0 +1,152 @@
+"""
+Amazon liste yükleme şablonuna (xlsx) sabit bellekle ASIN yazan akış üreticisi.
+
+openpyxl ile tüm çalışma kitabını yükleyip hücre hücre yazmak yerine şablonun ZIP içeriği bir kez
+okunur, etkin sayfanın başlık satırları (start_row öncesi) korunur ve ASIN satırları doğrudan
+sayfa XML'ine akıtılır. Stiller, diğer sayfalar ve dosya metadatası olduğu gibi kopyalanır.
+Amazon'un liste başına satır sınırı aşılırsa çıktı birden fazla dosyaya bölünür.
+
+Kullanım:
+    paths = write_asin_lists("assets/amazon_template.xlsx", "temp_uploads/liste.xlsx", asins)
+"""
+import os
+import posixpath
+import re
+import zipfile
+from typing import Iterable, Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+DEFAULT_START_ROW = 14       # Amazon şablonunda ilk veri satırı (1-13 başlık/açıklama)
+DEFAULT_MAX_ROWS = 3000      # Tek listeye yüklenebilecek en fazla ASIN (AMAZON_LIST_MAX_ROWS ile değiştirilebilir)
+
+_ROW_RE = re.compile(r'<row\b[^>]*?\br="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.S)
+_SHEET_DATA_RE = re.compile(r"<sheetData\s*/>|<sheetData\b[^>]*>.*?</sheetData>", re.S)
+
+
+def _is_asin(value: str) -> bool:
+    return len(value) == 10 and value.isalnum()
+
+
+def _active_sheet_path(entries: dict) -> str:
+    """workbook.xml ve ilişkilerinden etkin sayfanın ZIP içindeki yolunu bulur."""
+    workbook = entries["xl/workbook.xml"].decode("utf-8")
+    rels = entries["xl/_rels/workbook.xml.rels"].decode("utf-8")
+
+    active = re.search(r'<workbookView\b[^>]*\bactiveTab="(\d+)"', workbook)
+    index = int(active.group(1)) if active else 0
+    sheets = re.findall(r'<sheet\b[^>]*\br:id="([^"]+)"', workbook)
+    rel_id = sheets[index]
+
+    rel = re.search(rf'<Relationship\b[^>]*\bId="{re.escape(rel_id)}"[^>]*/>', rels).group(0)
+    target = re.search(r'\bTarget="([^"]+)"', rel).group(1)
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join("xl", target))
+
+
+def _drop_calc_chain(entries: dict):
+    """Silinen formül hücrelerine işaret edebileceği için calcChain kaldırılır (Excel onarım uyarısını önler)."""
+    if "xl/calcChain.xml" not in entries:
+        return
+    del entries["xl/calcChain.xml"]
+    entries["[Content_Types].xml"] = re.sub(
+        rb'<Override\b[^>]*PartName="/xl/calcChain.xml"[^>]*/>', b"", entries["[Content_Types].xml"]
+    )
+    entries["xl/_rels/workbook.xml.rels"] = re.sub(
+        rb'<Relationship\b[^>]*Target="[^"]*calcChain.xml"[^>]*/>', b"", entries["xl/_rels/workbook.xml.rels"]
+    )
+
+
+class _SheetTemplate:
+    """Etkin sayfanın XML'ini satır verisinden önce / başlık satırları / sonra olarak parçalar."""
+
+    def __init__(self, sheet_xml: str, start_row: int):
+        match = _SHEET_DATA_RE.search(sheet_xml)
+        if not match:
+            raise ValueError("Şablon sayfasında <sheetData> bulunamadı.")
+        # dimension isteğe bağlıdır; yeni satır sayısıyla çelişmesin diye kaldırılır
+        self.head = re.sub(r"<dimension\b[^>]*/>", "", sheet_xml[:match.start()])
+        self.tail = sheet_xml[match.end():]
+        self.header_rows = "".join(
+            m.group(0) for m in _ROW_RE.finditer(match.group(0)) if int(m.group(1)) < start_row
+        )
+
+
+def _part_path(output_path: str, part: int) -> str:
+    if part == 1:
+        return output_path
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}_{part}{ext}"
+
+
+def _row_xml(row: int, number: Optional[int], asin: str) -> str:
+    cells = f'<c r="A{row}"><v>{number}</v></c>' if number is not None else ""
+    return f'<row r="{row}">{cells}<c r="B{row}" t="inlineStr"><is><t>{escape(asin)}</t></is></c></row>'
+
+
+def write_asin_lists(
+    template_path: str,
+    output_path: str,
+    asins: Iterable[str],
+    start_row: int = DEFAULT_START_ROW,
+    max_rows: int = None,
+    number_rows: bool = True,
+) -> List[str]:
+    """
+    ASIN'leri şablona akıtarak bir veya daha fazla xlsx üretir ve yazılan dosya yollarını döndürür.
+    İlk dosya output_path'e, sonrakiler <isim>_2.xlsx, <isim>_3.xlsx ... olarak yazılır.
+    number_rows açıkken A sütununa satır sırası (her dosyada 1'den başlayarak) yazılır.
+    ASIN yoksa dosya üretilmez ve boş liste döner.
+    """
+    max_rows = max_rows or int(os.getenv("AMAZON_LIST_MAX_ROWS", DEFAULT_MAX_ROWS))
+
+    # Şablon küçük olduğundan tamamen belleğe alınır; böylece şablonun üzerine yazmak da güvenlidir
+    with zipfile.ZipFile(template_path) as zin:
+        infos = zin.infolist()
+        entries = {info.filename: zin.read(info.filename) for info in infos}
+    order = [info.filename for info in infos]
+    sheet_path = _active_sheet_path(entries)
+    sheet = _SheetTemplate(entries[sheet_path].decode("utf-8"), start_row)
+    _drop_calc_chain(entries)
+
+    paths: List[str] = []
+    iterator: Iterator[str] = iter(asins)
+    pending = next(iterator, None)
+    while pending is not None:
+        path = _part_path(output_path, len(paths) + 1)
+        tmp_path = f"{path}.tmp"
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zout:
+            for name in order:
+                if name in entries and name != sheet_path:
+                    zout.writestr(name, entries[name])
+            with zout.open(sheet_path, "w") as out:
+                out.write(sheet.head.encode("utf-8"))
+                out.write(b"<sheetData>")
+                out.write(sheet.header_rows.encode("utf-8"))
+                buffer = []
+                count = 0
+                while pending is not None and count < max_rows:
+                    count += 1
+                    buffer.append(_row_xml(start_row + count - 1, count if number_rows else None, pending))
+                    if len(buffer) >= 1000:
+                        out.write("".join(buffer).encode("utf-8"))
+                        buffer = []
+                    pending = next(iterator, None)
+                out.write("".join(buffer).encode("utf-8"))
+                out.write(b"</sheetData>")
+                out.write(sheet.tail.encode("utf-8"))
+        os.replace(tmp_path, path)
+        paths.append(path)
+    return paths
+
+
+def clean_asins(values: Iterable) -> Iterator[str]:
+    """Değerleri kırpıp büyük harfe çevirir; sadece 10 karakterli ASIN'leri tekrarsız olarak üretir."""
+    seen = set()
+    for value in values:
+        if value is None:
+            continue
+        asin = str(value).strip().upper()
+        if _is_asin(asin) and asin not in seen:
+            seen.add(asin)
+            yield asin
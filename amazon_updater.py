@@ -1,21 +1,18 @@
-import pandas as pd
-import openpyxl
+import csv
 import glob
 import os
 
+from amazon_template_writer import write_asin_lists, clean_asins
+
 def prepare_amazon_file():
     print("ASIN listesi okunuyor...")
     # ASINleri oku ve filtrele (Sadece 10 haneli gerçek Amazon ASIN'leri kalsın, CJ veya TEST kodlarını sil)
-    df_asins = pd.read_csv('tum_aktif_asinler_ebay_api.csv')
-    raw_asins = df_asins['ASIN'].dropna().tolist()
-    
-    asins = []
-    for asin in raw_asins:
-        temp = str(asin).strip().upper()
-        # Amazon ASIN'leri 10 hanelidir. TEST veya CJ ile başlayanları dışla.
-        if len(temp) == 10 and not temp.startswith("TEST") and not temp.startswith("C"):
-            asins.append(temp)
-            
+    with open('tum_aktif_asinler_ebay_api.csv', newline='', encoding='utf-8') as f:
+        raw_asins = [row.get('ASIN') for row in csv.DictReader(f) if row.get('ASIN')]
+
+    # Amazon ASIN'leri 10 hanelidir. TEST veya CJ ile başlayanları dışla.
+    asins = [a for a in clean_asins(raw_asins) if not a.startswith("TEST") and not a.startswith("C")]
+
     print(f"Toplam {len(raw_asins)} üründen {len(asins)} adet saf Amazon ASIN'i filtrelendi.")
 
     # Klasördeki xlsx dosyalarını bul (Eskiler ve açık Excel kilit dosyaları hariç)
@@ -31,17 +28,11 @@ def prepare_amazon_file():
     print(f"Amazon'un orijinal şablonu bulundu: {latest_file}")
     print("Dosya ismine ve metadatasına dokunulmadan sadece ASIN'ler B14'ten aşağıya yapıştırılıyor...")
 
-    wb = openpyxl.load_workbook(latest_file)
-    ws = wb.active
-
-    start_row = 14
-    for idx, asin in enumerate(asins):
-        # Sadece ve sadece B sütununa işlem yapıyoruz, hiçbir şeyi ellemiyoruz.
-        ws.cell(row=start_row + idx, column=2, value=str(asin))
-        
-    wb.save(latest_file)
-    print(f"✅ BAŞARILI! {len(asins)} ASIN '{latest_file}' dosyasına işlendi.")
-    print("Lütfen bu dosyayı Amazon'daki Upload butonuna basarak doğrudan yükleyin.")
+    # Sadece ve sadece B sütununa yazılıyor; başlık satırları, stiller ve metadata şablondan aynen kopyalanır.
+    # Liste sınırı aşılırsa ek dosyalar <isim>_2.xlsx, <isim>_3.xlsx ... olarak yazılır.
+    paths = write_asin_lists(latest_file, latest_file, asins, start_row=14, number_rows=False)
+    print(f"✅ BAŞARILI! {len(asins)} ASIN {len(paths)} dosyaya işlendi: {', '.join(paths)}")
+    print("Lütfen bu dosyaları Amazon'daki Upload butonuna basarak doğrudan yükleyin.")
 
 if __name__ == "__main__":
     prepare_amazon_file()
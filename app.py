@@ -25,11 +25,20 @@ def render_main_table():
         with col_f2:
             selected_stores = st.multiselect("Hedef (Store) Filtresi", options=list(stores_map.values()), default=list(stores_map.values()))
             
-        raw_products = db.get_all_core_products()
-        
-        if not raw_products:
-            st.info("Sistemde henüz ürün bulunmuyor.")
-            return
+        # Politika İsimlendirme Haritası
+        POLICY_NAMES = {
+            "244347500010": "China Shipping",
+            "251361629010": "USDom2Hand5ShipFree",
+            "255820822010": "USDom0Hand3ShipFree",
+            "255820825010": "USDom2Hand5ShipFree Copy",
+            "255821358010": "USDom10Hand10ShipFree",
+            "255824624010": "USDomInt2HandNOFree",
+            "244347391010": "China Return",
+            "251407823010": "30BuyerINtNo",
+            "255822090010": "NOReturn",
+            "255829832010": "RETURN_PROFILE",
+            "244346933010": "Immediate Pay"
+        }
 
         now = datetime.now(timezone.utc)
         table_data = []
@@ -39,41 +48,26 @@ def render_main_table():
             st.session_state.select_all_core = False
         if "core_table_key" not in st.session_state:
             st.session_state.core_table_key = 0
+        if "core_page" not in st.session_state:
+            st.session_state.core_page = 1
 
-        # 1. Hızlı Ön Filtreleme
-        filtered_products = []
-        for p in raw_products:
-            sources = p.get('sources')
-            listings = p.get('listings')
-            supplier_id = sources[0].get('supplier_id') if sources and len(sources) > 0 else None
-            store_id = listings[0].get('store_id') if listings and len(listings) > 0 else None
-            
-            sup_name = suppliers_map.get(supplier_id, "Bilinmeyen Kaynak")
-            channel_sku = listings[0].get('channel_sku', '-') if listings and len(listings) > 0 else "-"
-            
-            if channel_sku and channel_sku.upper().startswith("CJ"):
-                sup_name = "CJ Dropshipping"
-                if "CJ Dropshipping" not in list(suppliers_map.values()):
-                    suppliers_map["temp_cj"] = "CJ Dropshipping"
-                    
-            store_name = stores_map.get(store_id, "Bilinmeyen Hedef")
-            
-            if sup_name in selected_suppliers and store_name in selected_stores:
-                filtered_products.append(p)
+        # 1. Filtreler sunucuda (catalog_rows) uygulanır: SKU'su CJ ile başlayanlar "CJ Dropshipping" kaynağı sayılır
+        supplier_ids = [sid for sid, name in suppliers_map.items() if name in selected_suppliers]
+        store_ids = [sid for sid, name in stores_map.items() if name in selected_stores]
 
         # 2. Sayfalama (Pagination - 50 ürün/sayfa optimizasyonu ile Streamlit Kopma hatasını çözer)
         ITEMS_PER_PAGE = 50
-        total_items = len(filtered_products)
+        page_filters = {
+            "page_size": ITEMS_PER_PAGE,
+            "supplier_ids": supplier_ids,
+            "store_ids": store_ids,
+            "include_cj": "CJ Dropshipping" in selected_suppliers,
+        }
+        page_products, total_items = db.get_catalog_page(page=st.session_state.core_page, **page_filters)
         total_pages = max(1, (total_items + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE)
-        
-        if "core_page" not in st.session_state:
-            st.session_state.core_page = 1
         if st.session_state.core_page > total_pages:
             st.session_state.core_page = total_pages
-            
-        start_idx = (st.session_state.core_page - 1) * ITEMS_PER_PAGE
-        end_idx = start_idx + ITEMS_PER_PAGE
-        page_products = filtered_products[start_idx:end_idx]
+            page_products, total_items = db.get_catalog_page(page=st.session_state.core_page, **page_filters)
 
         st.markdown(f"**📦 Ana Ürün Kataloğu ({total_items} Toplam | Sayfa: {st.session_state.core_page}/{total_pages})**")
         
@@ -99,47 +93,37 @@ def render_main_table():
                 st.session_state.core_page += 1
                 st.rerun()
 
-        # 3. Yalnızca sayfaya özgü ürünleri işle (Ağır hesaplamalar ve DataFrame'in şişmesini engeller)
+        # 3. Sayfadaki düz satırları tabloya dönüştür. Otonom fiyat ilana damgalanmış computed_price'tan
+        #    okunur (repricing_job); damgası olmayan satırlar sayfa için tek vektörel çağrıda hesaplanır.
+        from pricing_engine import PricingEngine
+        unstamped = [p for p in page_products if p.get('computed_price') is None]
+        if unstamped:
+            fallback_prices = PricingEngine.calculate_final_prices(
+                [float(p.get('base_cost') or 0) for p in unstamped], marketplace="ebay", fee_percents=15.0
+            )
+            fallback_by_id = {p['product_id']: float(price) for p, price in zip(unstamped, fallback_prices)}
+        else:
+            fallback_by_id = {}
         for p in page_products:
-            timestamps = [p.get('created_at')]
+            calc_val = float(p['computed_price']) if p.get('computed_price') is not None else fallback_by_id[p['product_id']]
+            title = p.get('title') or 'İsimsiz'
+            asin = p.get('asin') or ''
             
-            content = p.get('product_base_content')
-            if content is None:
-                content = {}
-            elif isinstance(content, list):
-                content = content[0] if len(content) > 0 else {}
-                
-            title = content.get('base_title', 'İsimsiz')
-            asin = p.get('asin', '')
-            timestamps.append(content.get('updated_at'))
-            
-            sources = p.get('sources')
             base_cost = "-"
             amazon_url = "https://www.amazon.com/#p=-"
             calculated_price = "-"
             
-            if sources and isinstance(sources, list) and len(sources) > 0:
-                raw_cost = sources[0].get('base_cost', 0)
+            if p.get('source_id'):
+                raw_cost = p.get('base_cost')
                 if raw_cost:
-                    base_cost = f"${raw_cost:.2f}"
-                    try:
-                        from pricing_engine import PricingEngine
-                        calc_val = PricingEngine.calculate_final_price(
-                            source_price=float(raw_cost),
-                            marketplace="ebay",
-                            override_marketplace_fee=15.0
-                        )
-                        calculated_price = f"${calc_val:.2f}"
-                    except:
-                        pass
+                    base_cost = f"${float(raw_cost):.2f}"
+                    calculated_price = f"${calc_val:.2f}"
                         
                 if asin:
                     amazon_url = f"https://www.amazon.com/dp/{asin}?th=1#p={base_cost}"
                 else:
                     amazon_url = f"https://www.amazon.com/#p={base_cost}"
-                timestamps.append(sources[0].get('updated_at'))
             
-            listings = p.get('listings')
             listed_price_display = "-"
             ebay_url = "https://www.ebay.com/itm/0#p=-"
             quantity = "-"
@@ -148,68 +132,44 @@ def render_main_table():
             channel_item_id = None
             ship_prof, ret_prof, pay_prof = "-", "-", "-"
             
-            if listings and isinstance(listings, list) and len(listings) > 0:
-                raw_price = listings[0].get('listed_price')
+            if p.get('listing_id'):
+                raw_price = p.get('listed_price')
                 
                 if raw_price is not None:
                     listed_price_display = f"${float(raw_price):.2f}"
                 else:
                     listed_price_display = calculated_price # Fallback to AI if live price missing
                     
-                channel_item_id = listings[0].get('channel_item_id')
+                channel_item_id = p.get('channel_item_id')
                 if channel_item_id:
                     ebay_url = f"https://www.ebay.com/itm/{channel_item_id}#p={listed_price_display}"
                 else:
                     ebay_url = f"https://www.ebay.com/itm/0#p={listed_price_display}"
                 
-                # Politika İsimlendirme Haritası
-                POLICY_NAMES = {
-                    "244347500010": "China Shipping",
-                    "251361629010": "USDom2Hand5ShipFree",
-                    "255820822010": "USDom0Hand3ShipFree",
-                    "255820825010": "USDom2Hand5ShipFree Copy",
-                    "255821358010": "USDom10Hand10ShipFree",
-                    "255824624010": "USDomInt2HandNOFree",
-                    "244347391010": "China Return",
-                    "251407823010": "30BuyerINtNo",
-                    "255822090010": "NOReturn",
-                    "255829832010": "RETURN_PROFILE",
-                    "244346933010": "Immediate Pay"
-                }
-                
-                category_id = listings[0].get('category_id', '-') or "-"
-                quantity = listings[0].get('quantity', '-')
-                channel_sku = listings[0].get('channel_sku', '-')
+                category_id = p.get('category_id') or "-"
+                quantity = p.get('quantity') if p.get('quantity') is not None else '-'
+                channel_sku = p.get('channel_sku') or '-'
                 
-                ship_id = str(listings[0].get('shipping_profile_id', '-'))
-                ret_id = str(listings[0].get('return_profile_id', '-'))
-                pay_id = str(listings[0].get('payment_profile_id', '-'))
+                ship_id = str(p.get('shipping_profile_id') or '-')
+                ret_id = str(p.get('return_profile_id') or '-')
+                pay_id = str(p.get('payment_profile_id') or '-')
                 
                 ship_prof = POLICY_NAMES.get(ship_id, ship_id)
                 ret_prof = POLICY_NAMES.get(ret_id, ret_id)
                 pay_prof = POLICY_NAMES.get(pay_id, pay_id)
                 
-                timestamps.append(listings[0].get('updated_at'))
-                
             latest_time = None
-            for ts in timestamps:
-                if ts:
-                    try:
-                        parsed_ts = datetime.fromisoformat(ts.replace('Z', '+00:00'))
-                        if not latest_time or parsed_ts > latest_time:
-                            latest_time = parsed_ts
-                    except:
-                        pass
+            if p.get('last_activity_at'):
+                try:
+                    latest_time = datetime.fromisoformat(p['last_activity_at'].replace('Z', '+00:00'))
+                except:
+                    pass
                         
             is_recent = False
             if latest_time and (now - latest_time) < timedelta(hours=2):
                 is_recent = True
                 
-            # Get Image
-            product_media = p.get('product_media', [])
-            media_url = "https://via.placeholder.com/150?text=G%C3%B6rsel+Yok"
-            if product_media and isinstance(product_media, list) and len(product_media) > 0:
-                media_url = product_media[0].get('media_url') or media_url
+            media_url = p.get('media_url') or "https://via.placeholder.com/150?text=G%C3%B6rsel+Yok"
                 
             formatted_category = categories_map.get(category_id, category_id)
             
@@ -225,7 +185,7 @@ def render_main_table():
                 "İade Politikası": ret_prof,
                 "Kategori": formatted_category,
                 "IID": channel_sku,
-                "ID": p.get('id'),
+                "ID": p.get('product_id'),
                 "Ebay SKU": channel_sku,
                 "itemID": channel_item_id or "-",
                 "_is_recent": is_recent
@@ -303,6 +263,9 @@ def render_main_table():
                             payload["shipping_profile_id"] = REVERSE_POLICY_NAMES.get(edits["Kargo Politikası"], edits["Kargo Politikası"])
                         if "İade Politikası" in edits: 
                             payload["return_profile_id"] = REVERSE_POLICY_NAMES.get(edits["İade Politikası"], edits["İade Politikası"])
+                        # Fiyat/stok dışı alan değiştiyse ilan ReviseFixedPriceItem ile tam revize edilmeli
+                        if payload.keys() & {"category_id", "shipping_profile_id", "return_profile_id"}:
+                            payload["needs_full_revise"] = True
                             
                         if len(payload) > 1: # Sadece needs_sync haricinde bir şey varsa kaydet
                             db.client.table('listings').update(payload).eq('product_id', prod_id).execute()
@@ -348,6 +311,7 @@ def render_main_table():
                         if bulk_ret: payload["return_profile_id"] = bulk_ret
                         if bulk_qty and bulk_qty.isdigit(): payload["quantity"] = int(bulk_qty)
                         if bulk_cat: payload["category_id"] = bulk_cat
+                        if bulk_ship or bulk_ret or bulk_cat: payload["needs_full_revise"] = True
                                 
                         db.client.table('listings').update(payload).in_('product_id', product_ids).execute()
                         
@@ -365,10 +329,9 @@ def render_main_table():
                     with st.spinner("Katmanlı silme işlemi (Listings, Sources, Media) sürüyor..."):
                         try:
                             product_ids = selected_rows["ID"].tolist()
-                            chunck_size = 500
-                            for i in range(0, len(product_ids), chunck_size):
-                                chunk = product_ids[i:i + chunck_size]
-                                db.client.table('core_products').delete().in_('id', chunk).execute()
+                            result = db.purge_products(product_ids=product_ids)
+                            if result["errors"]:
+                                raise RuntimeError(f"{result['errors']} ürün silinemedi.")
                                 
                             st.toast(f"✅ {len(product_ids)} adet ürün tamamen silindi!", icon="🚨")
                             import time
@@ -451,7 +414,7 @@ def render_main_table():
                             try:
                                 df_imp = pd.read_csv(uploaded_easync) if uploaded_easync.name.endswith('.csv') else pd.read_excel(uploaded_easync)
                                 result = db.import_easync_data(df_imp)
-                                st.success(f"Dağıtım Tamam! Başarılı: {result['success']} | Hata: {result['errors']}")
+                                st.success(f"Dağıtım Tamam! Başarılı: {result['success']} | Hata: {result['errors']} | Tekrar (atlandı): {result.get('duplicates', 0)}")
                             except Exception as e:
                                 st.error(f"Dosya Hatası: {e}")
             
@@ -0,0 +1,109 @@
+"""
+Easync içe aktarma hattının ölçeklenme ölçümü (1k / 10k / 50k satır).
+
+Supabase'e gitmez: DatabaseManager sahte bir istemciyle kurulur, RPC çağrıları sadece sayılır.
+Kullanım:
+    python benchmarks/bench_easync_import.py [satır sayıları...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from database import DatabaseManager
+from pricing_engine import PricingEngine, PricingRuleSet
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.payload = None
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def insert(self, payload):
+        self.payload = payload
+        return self
+
+    def execute(self):
+        if self.payload is not None:
+            row = dict(self.payload, id=f"{self.table}-{self.payload.get('name') or self.payload.get('store_name')}")
+            return _Result([row])
+        return _Result(self.client.rows.get(self.table, []))
+
+
+class _Rpc:
+    def __init__(self, client, params):
+        self.client = client
+        self.params = params
+
+    def execute(self):
+        self.client.rpc_calls += 1
+        bundles = self.params["bundles"]
+        return _Result([{"bundle_index": i, "asin": b["asin"]} for i, b in enumerate(bundles)])
+
+
+class StubClient:
+    """import_easync_data'nın kullandığı Supabase yüzeyinin ağsız taklidi."""
+
+    def __init__(self):
+        self.rpc_calls = 0
+        self.rows = {
+            "marketplaces": [{"id": "mp-1", "name": "Amazon", "region": "US"}, {"id": "mp-2", "name": "eBay", "region": "US"}],
+            "suppliers": [{"id": "sup-1", "name": "Amazon US"}],
+            "stores": [{"id": "store-1", "store_name": "eBay US"}],
+        }
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params):
+        return _Rpc(self, params)
+
+
+def make_easync_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Gerçek Easync CSV'sine benzeyen, %10 tekrar eden ASIN içeren sentetik tablo."""
+    rng = np.random.default_rng(seed)
+    asin_ids = rng.integers(0, int(rows * 0.9) + 1, size=rows)
+    return pd.DataFrame({
+        "Source Product Id": [f"B0{i:08d}" for i in asin_ids],
+        "Target Variant": [f"A-B0{i:08d}" if i % 3 else "" for i in asin_ids],
+        "Title": [f"Ürün {i}" for i in asin_ids],
+        "Source Market": rng.choice(["Amazon US", "Walmart US"], size=rows),
+        "Target Market": "eBay US",
+        "Source Price": [f"${p:,.2f}" for p in rng.uniform(1, 400, size=rows)],
+        "Target Product Id": [str(100000000000 + i) for i in asin_ids],
+        "Quantity": rng.integers(0, 10, size=rows).astype(str),
+    })
+
+
+def run(sizes):
+    # Fiyat kuralları DB'ye gitmeden varsayılanlardan gelsin
+    for marketplace in ("ebay", "amazon", "shopify"):
+        PricingEngine.install_rule_set(PricingRuleSet(marketplace, None, []))
+
+    print(f"{'Satır':>8} | {'Süre (s)':>9} | {'µs/satır':>9} | RPC")
+    for rows in sizes:
+        df = make_easync_frame(rows)
+        client = StubClient()
+        manager = DatabaseManager(client=client)
+        start = time.perf_counter()
+        manager.import_easync_data(df)
+        elapsed = time.perf_counter() - start
+        print(f"{rows:>8} | {elapsed:>9.3f} | {elapsed / rows * 1e6:>9.1f} | {client.rpc_calls}")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 50_000]
+    run(sizes)
@@ -0,0 +1,225 @@
+"""
+PricingEngine mikro ölçümleri: skaler / toplu fiyatlama, 5 / 50 / 500 kademede kademe araması ve
+soğuk / sıcak kural önbelleği (1k / 10k / 100k maliyet).
+
+Supabase'e gitmez: pricing_engine içe aktarılmadan önce `database` modülü bellek içi bir taklitle
+değiştirilir (kademeler ve tamponlar oradan okunur, sorgular sayılır).
+Sonuçlar makineye özgü olduğundan depoya girmez: varsayılan olarak git'in yok saydığı
+benchmarks/results/pricing.json dosyasına yazılır. --compare ile aynı makinede daha önce alınmış bir
+taban çizgisine göre yavaşlayan ölçümler raporlanır ve süreç 1 ile çıkar.
+
+Kullanım:
+    python benchmarks/bench_pricing.py --output benchmarks/results/pricing_main.json   # Taban çizgisi al
+    python benchmarks/bench_pricing.py --compare benchmarks/results/pricing_main.json  # Değişiklikten sonra karşılaştır
+    python benchmarks/bench_pricing.py --sizes 1000 10000 --tiers 5 50 --repeat 3
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import types
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "pricing.json")
+DEFAULT_THRESHOLD = 1.25  # Taban çizgisinden bu oranda yavaş ölçümler gerileme sayılır
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.filters = {}
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def execute(self):
+        self.client.queries += 1
+        rows = self.client.rows.get(self.table, [])
+        return _Result([r for r in rows if all(r.get(k) == v for k, v in self.filters.items())])
+
+
+class StubClient:
+    """PricingEngine'in kullandığı Supabase yüzeyinin (table/select/eq/execute) bellek içi taklidi."""
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = {"pricing_rules_version": [], "profit_tiers": [], "pricing_rules": []}
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def set_tiers(self, marketplace: str, tiers: list):
+        self.rows["profit_tiers"] = [dict(t, marketplace=marketplace) for t in tiers]
+
+
+def _install_stub_database() -> StubClient:
+    """pricing_engine'in `from database import db` satırı gerçek Supabase istemcisi yerine taklidi alsın."""
+    client = StubClient()
+    stub = types.ModuleType("database")
+    stub.db = types.SimpleNamespace(client=client)
+    sys.modules["database"] = stub
+    return client
+
+
+CLIENT = _install_stub_database()
+
+from pricing_engine import PricingEngine  # noqa: E402  (taklit database kurulduktan sonra)
+
+
+def make_tiers(count: int, top: float = 500.0) -> list:
+    """0..top aralığını eşit bölen, DB'deki gibi min_price sıralı count kademe."""
+    edges = np.linspace(0.0, top, count + 1)
+    return [
+        {
+            "min_price": round(float(lo), 2),
+            "max_price": round(float(hi), 2) if i < count - 1 else None,
+            "margin_percent": round(1.0 + 9.0 * i / max(1, count - 1), 2),
+            "margin_fixed": 6.0,
+        }
+        for i, (lo, hi) in enumerate(zip(edges[:-1], edges[1:]))
+    ]
+
+
+def make_costs(n: int, seed: int = 7) -> np.ndarray:
+    """Katalog maliyetlerine benzeyen (log-normal, kuruş hassasiyetli) sentetik maliyetler."""
+    rng = np.random.default_rng(seed)
+    return np.round(rng.lognormal(3.0, 0.9, n), 2)
+
+
+def _time(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return min(samples), statistics.median(samples)
+
+
+def run(sizes, tier_counts, repeat):
+    results = {}
+
+    def record(name, n, tiers, fn, reps=repeat):
+        best, median = _time(fn, reps)
+        results[name] = {
+            "n": n,
+            "tiers": tiers,
+            "min_s": round(best, 6),
+            "median_s": round(median, 6),
+            "us_per_item": round(best / n * 1e6, 4),
+        }
+        print(f"{name:<38} | {best:>9.4f} | {median:>9.4f} | {best / n * 1e6:>9.3f}")
+
+    print(f"{'Ölçüm':<38} | {'En iyi(s)':>9} | {'Medyan(s)':>9} | {'µs/öğe':>9}")
+    for tiers in tier_counts:
+        CLIENT.set_tiers("ebay", make_tiers(tiers))
+        PricingEngine.invalidate()
+        warm_set = PricingEngine.get_rule_set("ebay")
+
+        for n in sizes:
+            costs = make_costs(n)
+            cost_list = costs.tolist()
+
+            # Toplu ve skaler yol aynı fiyatları vermeli (ölçüm yanlış şeyi ölçmesin)
+            sample = cost_list[:1000]
+            batch = PricingEngine.calculate_final_prices(sample)
+            assert all(PricingEngine.calculate_final_price(c) == b for c, b in zip(sample, batch)), "toplu/skaler uyumsuz"
+
+            # Skaler döngü 100k'da yavaş olduğundan en fazla 3 tekrar
+            record(f"scalar/tiers={tiers}/n={n}", n, tiers,
+                   lambda: [PricingEngine.calculate_final_price(c) for c in cost_list], reps=min(repeat, 3))
+            record(f"batch_warm/tiers={tiers}/n={n}", n, tiers,
+                   lambda: PricingEngine.calculate_final_prices(costs))
+
+            def batch_cold():
+                # Her tekrar derlenmiş seti düşürür: taklit DB okuması + derleme + NumPy dizileri dahil
+                PricingEngine.invalidate()
+                PricingEngine.calculate_final_prices(costs)
+            record(f"batch_cold/tiers={tiers}/n={n}", n, tiers, batch_cold)
+
+            record(f"tier_lookup_bisect/tiers={tiers}/n={n}", n, tiers,
+                   lambda: [warm_set.margin_for(c) for c in cost_list], reps=min(repeat, 3))
+            record(f"tier_lookup_vector/tiers={tiers}/n={n}", n, tiers,
+                   lambda: warm_set.margins_for(costs))
+
+        record(f"compile/tiers={tiers}", 1, tiers, lambda: (PricingEngine.invalidate(), PricingEngine.get_rule_set("ebay")))
+        # Sonraki kademe sayısında önbellek sıcak başlasın
+        PricingEngine.get_rule_set("ebay")
+
+    return results
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> list:
+    """Taban çizgisine göre threshold katından yavaşlayan ölçümleri (ad, eski, yeni) olarak döndürür."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous and previous["min_s"] > 0 and current["min_s"] > previous["min_s"] * threshold:
+            regressions.append((name, previous["min_s"], current["min_s"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PricingEngine mikro ölçümleri")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--tiers", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Sonuçların yazılacağı JSON")
+    parser.add_argument("--no-save", action="store_true", help="JSON yazma (sadece ölç / karşılaştır)")
+    parser.add_argument("--compare", help="Karşılaştırılacak taban çizgisi JSON'u")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.tiers, args.repeat)
+    print(f"Taklit DB sorgu sayısı: {CLIENT.queries}")
+    # Karşılaştırma yazmadan önce yapılır: --output ile --compare aynı dosya olabilir
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+
+    if not args.no_save:
+        report = {
+            "meta": {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Sonuçlar yazıldı: {args.output}")
+
+    if args.compare:
+        for name, old, new in regressions:
+            print(f"GERİLEME: {name}: {old:.4f}s -> {new:.4f}s (x{new / old:.2f})")
+        if regressions:
+            return 1
+        print(f"Gerileme yok (eşik x{args.threshold}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
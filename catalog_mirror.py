@@ -0,0 +1,302 @@
+"""
+Katalog tablolarının (core_products, product_base_content, sources, listings, product_media)
+yerel SQLite aynası.
+
+Ayna, sunucudaki modified_at damgasından (catalog_mirror.sql tetikleyicileri) artımlı olarak tazelenir:
+her tazelemede yalnızca son filigrandan (watermark) sonra değişen satırlar çekilir. Silinen satırlar
+periyodik tam tazelemede temizlenir. Okuyucular önce ensure_fresh() çağırır; ayna bayatsa ağdan
+tazelenir, tazeleme başarısız olursa False döner ve çağıran taraf doğrudan Supabase'e gider.
+
+Kullanım:
+    from catalog_mirror import mirror
+    if mirror.ensure_fresh():
+        product = mirror.product_by_asin("B0XXXXXXXX")
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from database import db, DatabaseManager
+
+DEFAULT_MIRROR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog_mirror.db")
+DEFAULT_MAX_AGE_SECONDS = 120           # Bu süreden eski ayna bayat sayılır ve artımlı tazelenir
+DEFAULT_FULL_REFRESH_SECONDS = 6 * 3600 # Silinen satırları temizlemek için tam tazeleme aralığı
+WATERMARK_OVERLAP_SECONDS = 120         # Geç commit edilen transaction'ları kaçırmamak için filigran geri payı
+
+# tablo -> (birincil anahtar, yerelde indekslenecek kolonlar)
+MIRRORED_TABLES = {
+    "core_products": ("id", ("asin", "created_at")),
+    "product_base_content": ("product_id", ()),
+    "sources": ("id", ("product_id", "source_code")),
+    "listings": ("id", ("product_id", "store_id", "channel_sku", "channel_item_id")),
+    "product_media": ("id", ("product_id",)),
+}
+
+
+def _parse_ts(value: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+class CatalogMirror:
+    """Supabase katalog tablolarının salt okunur yerel kopyası."""
+
+    def __init__(
+        self,
+        path: str = None,
+        manager: DatabaseManager = None,
+        max_age: float = None,
+        full_refresh_every: float = None,
+    ):
+        self.path = path or os.getenv("CATALOG_MIRROR_PATH", DEFAULT_MIRROR_PATH)
+        self.manager = manager or db
+        self.max_age = max_age if max_age is not None else float(os.getenv("CATALOG_MIRROR_MAX_AGE", DEFAULT_MAX_AGE_SECONDS))
+        self.full_refresh_every = full_refresh_every if full_refresh_every is not None else DEFAULT_FULL_REFRESH_SECONDS
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._schema_ready = False
+
+    # ---------------------------------------------------------
+    # SQLite bağlantısı ve şema
+    # ---------------------------------------------------------
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Her thread kendi bağlantısını kullanır (Streamlit ve bot thread'leri aynı dosyayı paylaşır)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            if not self._schema_ready:
+                self._create_schema(conn)
+                self._schema_ready = True
+        return conn
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS mirror_meta ("
+                "table_name TEXT PRIMARY KEY, watermark TEXT, refreshed_at REAL, full_refreshed_at REAL)"
+            )
+            for table, (_, index_cols) in MIRRORED_TABLES.items():
+                extra = "".join(f", {col} TEXT" for col in index_cols)
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (pk TEXT PRIMARY KEY{extra}, data TEXT NOT NULL)")
+                for col in index_cols:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table}({col})")
+
+    def _meta(self, table: str) -> Dict:
+        row = self.conn.execute("SELECT * FROM mirror_meta WHERE table_name = ?", (table,)).fetchone()
+        return dict(row) if row else {"table_name": table, "watermark": None, "refreshed_at": None, "full_refreshed_at": None}
+
+    # ---------------------------------------------------------
+    # Tazeleme
+    # ---------------------------------------------------------
+    def _store_rows(self, table: str, rows: List[Dict]):
+        pk, index_cols = MIRRORED_TABLES[table]
+        cols = ["pk", *index_cols, "data"]
+        placeholders = ", ".join("?" for _ in cols)
+        values = [
+            (str(r[pk]), *[None if r.get(c) is None else str(r.get(c)) for c in index_cols], json.dumps(r, default=str))
+            for r in rows
+        ]
+        self.conn.executemany(f"INSERT OR REPLACE INTO {table} ({', '.join(cols)}) VALUES ({placeholders})", values)
+
+    def _refresh_table(self, table: str, full: bool) -> int:
+        pk, _ = MIRRORED_TABLES[table]
+        meta = self._meta(table)
+        watermark = _parse_ts(meta["watermark"])
+        filters = None
+        if not full and watermark is not None:
+            since = (watermark - timedelta(seconds=WATERMARK_OVERLAP_SECONDS)).isoformat()
+            filters = lambda q: q.gte("modified_at", since)
+
+        rows = self.manager.iter_rows(table, "*", key="modified_at", tiebreaker=pk, filters=filters)
+        count = 0
+        newest = watermark
+        batch = []
+        conn = self.conn
+        with conn:
+            if full:
+                conn.execute(f"DELETE FROM {table}")
+            for row in rows:
+                batch.append(row)
+                ts = _parse_ts(row.get("modified_at"))
+                if ts is not None and (newest is None or ts > newest):
+                    newest = ts
+                if len(batch) >= 1000:
+                    self._store_rows(table, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self._store_rows(table, batch)
+                count += len(batch)
+
+            now = time.time()
+            conn.execute(
+                "INSERT INTO mirror_meta (table_name, watermark, refreshed_at, full_refreshed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(table_name) DO UPDATE SET watermark = excluded.watermark, refreshed_at = excluded.refreshed_at, "
+                "full_refreshed_at = COALESCE(excluded.full_refreshed_at, mirror_meta.full_refreshed_at)",
+                (table, newest.isoformat() if newest else None, now, now if full else None),
+            )
+        return count
+
+    def refresh(self, full: bool = None, tables: List[str] = None) -> Dict[str, int]:
+        """
+        Aynayı tazeler ve tablo başına çekilen satır sayısını döndürür.
+        full=None ise tam tazeleme yalnızca ilk seferde veya full_refresh_every süresi dolduğunda yapılır.
+        """
+        results = {}
+        with self._refresh_lock:
+            for table in tables or MIRRORED_TABLES:
+                meta = self._meta(table)
+                do_full = full
+                if do_full is None:
+                    last_full = meta["full_refreshed_at"]
+                    do_full = last_full is None or (time.time() - last_full) > self.full_refresh_every
+                results[table] = self._refresh_table(table, do_full)
+        return results
+
+    def age(self) -> float:
+        """En eski tablonun son tazelemeden bu yana geçen süresi (saniye). Hiç tazelenmediyse sonsuz."""
+        oldest = float("inf")
+        for table in MIRRORED_TABLES:
+            refreshed_at = self._meta(table)["refreshed_at"]
+            if refreshed_at is None:
+                return float("inf")
+            oldest = min(oldest, refreshed_at)
+        return time.time() - oldest
+
+    def is_fresh(self, max_age: float = None) -> bool:
+        return self.age() <= (self.max_age if max_age is None else max_age)
+
+    def ensure_fresh(self, max_age: float = None) -> bool:
+        """Ayna bayatsa artımlı tazeler. Ayna kullanılabilir durumdaysa True döner, aksi halde ağa düşülmelidir."""
+        if self.is_fresh(max_age):
+            return True
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"[Catalog Mirror] Tazeleme hatası, doğrudan Supabase kullanılacak: {e}")
+            return False
+        return True
+
+    # ---------------------------------------------------------
+    # İndeksli okumalar
+    # ---------------------------------------------------------
+    def _rows(self, table: str, where: str = "", params: tuple = (), order: str = "rowid") -> List[Dict]:
+        sql = f"SELECT data FROM {table}"
+        if where:
+            sql += f" WHERE {where}"
+        sql += f" ORDER BY {order}"
+        return [json.loads(r["data"]) for r in self.conn.execute(sql, params)]
+
+    def _first(self, table: str, where: str, params: tuple) -> Optional[Dict]:
+        rows = self._rows(table, where, params)
+        return rows[0] if rows else None
+
+    def product(self, product_id: str) -> Optional[Dict]:
+        return self._first("core_products", "pk = ?", (str(product_id),))
+
+    def product_by_asin(self, asin: str) -> Optional[Dict]:
+        return self._first("core_products", "asin = ?", (asin,))
+
+    def products_by_asins(self, asins: List[str]) -> Dict[str, Dict]:
+        found = {}
+        asins = list(asins)
+        for i in range(0, len(asins), 500):
+            chunk = asins[i:i + 500]
+            marks = ", ".join("?" for _ in chunk)
+            for row in self._rows("core_products", f"asin IN ({marks})", tuple(chunk)):
+                found.setdefault(row["asin"], row)
+        return found
+
+    def content_for(self, product_id: str) -> Optional[Dict]:
+        return self._first("product_base_content", "pk = ?", (str(product_id),))
+
+    def sources_for(self, product_id: str) -> List[Dict]:
+        return self._rows("sources", "product_id = ?", (str(product_id),))
+
+    def media_for(self, product_id: str) -> List[Dict]:
+        return self._rows("product_media", "product_id = ?", (str(product_id),))
+
+    def listings_for(self, product_id: str, store_id: str = None) -> List[Dict]:
+        if store_id:
+            return self._rows("listings", "product_id = ? AND store_id = ?", (str(product_id), str(store_id)))
+        return self._rows("listings", "product_id = ?", (str(product_id),))
+
+    def listing_by_sku(self, channel_sku: str) -> Optional[Dict]:
+        return self._first("listings", "channel_sku = ?", (channel_sku,))
+
+    def listing_by_item_id(self, channel_item_id: str) -> Optional[Dict]:
+        return self._first("listings", "channel_item_id = ?", (str(channel_item_id),))
+
+    def iter_asins(self) -> Iterator[str]:
+        """Tüm ASIN'leri indeksli kolondan, JSON çözmeden üretir (Amazon liste dosyası için)."""
+        for r in self.conn.execute("SELECT asin FROM core_products WHERE asin IS NOT NULL ORDER BY rowid"):
+            yield r["asin"]
+
+    def listings_by_sku(self) -> Dict[str, Dict]:
+        """channel_sku -> ilan eşlemesi (CSV içe aktarımı gibi toplu eşleştirmeler için)."""
+        return {r["channel_sku"]: r for r in self._rows("listings", "channel_sku IS NOT NULL AND channel_sku != ''")}
+
+    def iter_core_products(self) -> Iterator[Dict]:
+        """
+        Ürünleri DatabaseManager.iter_core_products ile aynı gömülü yapıda (created_at DESC) üretir:
+        product_base_content, sources, listings ve product_media alt kayıtları ürünün içine yerleştirilir.
+        """
+        def grouped(table: str) -> Dict[str, List[Dict]]:
+            groups = {}
+            for row in self._rows(table):
+                groups.setdefault(str(row.get("product_id")), []).append(row)
+            return groups
+
+        contents = grouped("product_base_content")
+        sources = grouped("sources")
+        listings = grouped("listings")
+        media = grouped("product_media")
+
+        for p in self._rows("core_products", order="created_at DESC, pk DESC"):
+            pid = str(p["id"])
+            content = contents.get(pid)
+            yield {
+                **p,
+                "product_base_content": content[0] if content else None,
+                "sources": sources.get(pid, []),
+                "listings": listings.get(pid, []),
+                "product_media": media.get(pid, []),
+            }
+
+
+_mirror: Optional[CatalogMirror] = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror() -> CatalogMirror:
+    """Süreç genelinde paylaşılan ayna örneği."""
+    global _mirror
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = CatalogMirror()
+    return _mirror
+
+
+class _LazyMirror:
+    """İçe aktarma anında dosya açılmasın diye ilk kullanımda kurulan vekil."""
+
+    def __getattr__(self, name):
+        return getattr(get_mirror(), name)
+
+
+mirror = _LazyMirror()
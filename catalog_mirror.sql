@@ -0,0 +1,30 @@
+-- Yerel katalog aynası (catalog_mirror.py) için artımlı tazeleme damgası.
+-- modified_at, uygulamanın iş anlamında kullandığı updated_at'ten (örn. bot tarama kuyruğu) bağımsızdır:
+-- her INSERT/UPDATE'te sunucu saatine göre tetikleyici tarafından yazılır, böylece istemci saat
+-- kayması veya updated_at göndermeyen yazmalar aynada kaçırılmaz.
+
+CREATE OR REPLACE FUNCTION touch_modified_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.modified_at = NOW();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['core_products', 'product_base_content', 'sources', 'listings', 'product_media']
+    LOOP
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS modified_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()', t);
+        EXECUTE format('CREATE INDEX IF NOT EXISTS idx_%s_modified_at ON %I (modified_at)', t, t);
+        EXECUTE format('DROP TRIGGER IF EXISTS touch_%s_modified_at ON %I', t, t);
+        EXECUTE format(
+            'CREATE TRIGGER touch_%s_modified_at BEFORE INSERT OR UPDATE ON %I FOR EACH ROW EXECUTE FUNCTION touch_modified_at_column()',
+            t, t
+        );
+    END LOOP;
+END $$;
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,162 @@
+-- Portföy ekranı (app.render_main_table) için ürün başına tek düz satır tutan, tetikleyicilerle güncel
+-- tutulan tablo. PostgREST'in her Streamlit yenilemesinde tüm katalog için iç içe JSON üretmesi yerine
+-- ekran bu tablodan sayfa sayfa okur. Python tarafı: DatabaseManager.get_catalog_page()
+-- Önce listing_computed_price.sql çalıştırılmalıdır (listings.computed_price).
+--
+-- "İlk" alt kayıt (kaynak, ilan, görsel) id sırasına göre seçilir.
+-- last_activity_at: ürün, başlık, ilk kaynak ve ilk ilan güncelleme zamanlarının en yenisi.
+
+CREATE TABLE IF NOT EXISTS catalog_rows (
+    product_id UUID PRIMARY KEY REFERENCES core_products(id) ON DELETE CASCADE,
+    asin TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    title TEXT,
+    media_url TEXT,
+    source_id UUID,
+    supplier_id UUID,
+    base_cost NUMERIC,
+    listing_id UUID,
+    store_id UUID,
+    channel_sku TEXT,
+    channel_item_id TEXT,
+    listed_price NUMERIC,
+    computed_price NUMERIC,
+    quantity INTEGER,
+    category_id TEXT,
+    shipping_profile_id TEXT,
+    return_profile_id TEXT,
+    payment_profile_id TEXT,
+    is_cj BOOLEAN GENERATED ALWAYS AS (COALESCE(UPPER(channel_sku) LIKE 'CJ%', FALSE)) STORED,
+    last_activity_at TIMESTAMP WITH TIME ZONE
+);
+
+ALTER TABLE catalog_rows ADD COLUMN IF NOT EXISTS computed_price NUMERIC;
+
+CREATE INDEX IF NOT EXISTS idx_catalog_rows_created_at ON catalog_rows (created_at DESC, product_id DESC);
+CREATE INDEX IF NOT EXISTS idx_catalog_rows_supplier_store ON catalog_rows (supplier_id, store_id);
+
+-- Verilen ürünlerin satırlarını yeniden hesaplar (küme bazlı; toplu yazmalarda tek sorgu)
+CREATE OR REPLACE FUNCTION public.refresh_catalog_rows(ids UUID[])
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO catalog_rows (
+        product_id, asin, created_at, title, media_url,
+        source_id, supplier_id, base_cost,
+        listing_id, store_id, channel_sku, channel_item_id, listed_price, computed_price, quantity, category_id,
+        shipping_profile_id, return_profile_id, payment_profile_id, last_activity_at
+    )
+    SELECT
+        p.id, p.asin, p.created_at, c.base_title, m.media_url,
+        s.id, s.supplier_id, s.base_cost,
+        l.id, l.store_id, l.channel_sku, l.channel_item_id, l.listed_price, l.computed_price, l.quantity, l.category_id,
+        l.shipping_profile_id::TEXT, l.return_profile_id::TEXT, l.payment_profile_id::TEXT,
+        GREATEST(p.created_at, c.updated_at, s.updated_at, l.updated_at)
+    FROM core_products p
+    LEFT JOIN LATERAL (
+        SELECT base_title, updated_at FROM product_base_content WHERE product_id = p.id LIMIT 1
+    ) c ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT media_url FROM product_media WHERE product_id = p.id ORDER BY id LIMIT 1
+    ) m ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT id, supplier_id, base_cost, updated_at FROM sources WHERE product_id = p.id ORDER BY id LIMIT 1
+    ) s ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT * FROM listings WHERE product_id = p.id ORDER BY id LIMIT 1
+    ) l ON TRUE
+    WHERE p.id = ANY(ids)
+    ON CONFLICT (product_id) DO UPDATE SET
+        asin = EXCLUDED.asin,
+        created_at = EXCLUDED.created_at,
+        title = EXCLUDED.title,
+        media_url = EXCLUDED.media_url,
+        source_id = EXCLUDED.source_id,
+        supplier_id = EXCLUDED.supplier_id,
+        base_cost = EXCLUDED.base_cost,
+        listing_id = EXCLUDED.listing_id,
+        store_id = EXCLUDED.store_id,
+        channel_sku = EXCLUDED.channel_sku,
+        channel_item_id = EXCLUDED.channel_item_id,
+        listed_price = EXCLUDED.listed_price,
+        computed_price = EXCLUDED.computed_price,
+        quantity = EXCLUDED.quantity,
+        category_id = EXCLUDED.category_id,
+        shipping_profile_id = EXCLUDED.shipping_profile_id,
+        return_profile_id = EXCLUDED.return_profile_id,
+        payment_profile_id = EXCLUDED.payment_profile_id,
+        last_activity_at = EXCLUDED.last_activity_at;
+END;
+$$;
+
+-- Deyim (statement) seviyesinde tetikleyiciler: 500 satırlık bir upsert tek yenileme çalıştırır.
+-- Geçiş tabloları (transition tables) tek olayla sınırlı olduğundan her olay için ayrı fonksiyon var.
+CREATE OR REPLACE FUNCTION catalog_rows_on_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'core_products' THEN
+        PERFORM refresh_catalog_rows(ARRAY(SELECT DISTINCT id FROM new_rows));
+    ELSE
+        PERFORM refresh_catalog_rows(ARRAY(SELECT DISTINCT product_id FROM new_rows WHERE product_id IS NOT NULL));
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION catalog_rows_on_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'core_products' THEN
+        PERFORM refresh_catalog_rows(ARRAY(SELECT DISTINCT id FROM new_rows));
+    ELSE
+        -- Ürün değiştiren (product_id güncellenen) alt kayıtlar için hem eski hem yeni ürün yenilenir
+        PERFORM refresh_catalog_rows(ARRAY(
+            SELECT product_id FROM new_rows WHERE product_id IS NOT NULL
+            UNION
+            SELECT product_id FROM old_rows WHERE product_id IS NOT NULL
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION catalog_rows_on_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- core_products silmeleri ON DELETE CASCADE ile düşer
+    PERFORM refresh_catalog_rows(ARRAY(SELECT DISTINCT product_id FROM old_rows WHERE product_id IS NOT NULL));
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['core_products', 'product_base_content', 'product_media', 'sources', 'listings']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS catalog_rows_%s_ins ON %I', t, t);
+        EXECUTE format(
+            'CREATE TRIGGER catalog_rows_%s_ins AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION catalog_rows_on_insert()', t, t
+        );
+        EXECUTE format('DROP TRIGGER IF EXISTS catalog_rows_%s_upd ON %I', t, t);
+        EXECUTE format(
+            'CREATE TRIGGER catalog_rows_%s_upd AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION catalog_rows_on_update()', t, t
+        );
+        IF t <> 'core_products' THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS catalog_rows_%s_del ON %I', t, t);
+            EXECUTE format(
+                'CREATE TRIGGER catalog_rows_%s_del AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+                'FOR EACH STATEMENT EXECUTE FUNCTION catalog_rows_on_delete()', t, t
+            );
+        END IF;
+    END LOOP;
+END $$;
+
+-- Mevcut katalog için ilk doldurma
+SELECT refresh_catalog_rows(ARRAY(SELECT id FROM core_products));
+
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,81 @@
+"""
+eBay kanal keşfi: ilanların fiyat/stok güncellemesinin hangi API'ye gideceğini bir kez belirler.
+
+Her gönderimde SKU başına `offer?sku=` araması yapmak (ve legacy ilanlarda ancak başarısız aramadan sonra
+Trading API'ye düşmek) yerine:
+    1. channel_api'si boş (veya --refresh ile tüm) ilanların SKU'ları 25'erli bulk_get_inventory_item ile
+       Inventory API / legacy olarak sınıflanır,
+    2. Inventory API SKU'larının offer ID'si ve ilan (item) ID'si eşzamanlı offer aramalarıyla bulunur,
+    3. sonuç listings.channel_api / channel_offer_id / channel_item_id kolonlarına toplu yazılır.
+
+Sonraki gönderimler (PushEngine, amazon_sync_bot) bu kolonlardan doğrudan ilgili uca gider.
+
+Kullanım:
+    python channel_discovery.py            # Sınıflanmamış ilanları keşfet
+    python channel_discovery.py --refresh  # Tüm ilanları yeniden sınıfla
+    python channel_discovery.py --dry-run  # Sadece kaç ilanın sınıflanacağını göster
+"""
+import asyncio
+import sys
+from typing import Dict
+
+from database import db, DatabaseManager
+from ebay_core import CHANNEL_API_INVENTORY, channel_cache
+from sync_engine import STORE_ID
+from write_buffer import write_buffer
+
+
+class ChannelDiscoveryJob:
+    """Mağazanın ilanlarını Inventory API / Trading API olarak sınıflar ve kaydeder."""
+
+    def __init__(self, store_id: str = STORE_ID, manager: DatabaseManager = None):
+        self.store_id = store_id
+        self.manager = manager or db
+
+    def load(self, refresh: bool = False) -> list:
+        """Sınıflanacak SKU'lar (refresh=False ise sadece channel_api'si boş olanlar)."""
+        def filters(q):
+            q = q.eq("store_id", self.store_id).not_.is_("channel_sku", "null")
+            return q if refresh else q.is_("channel_api", "null")
+
+        skus = [row["channel_sku"] for row in self.manager.iter_rows("listings", "id, channel_sku", filters=filters)]
+        return list(dict.fromkeys(skus))
+
+    async def _classify(self, skus) -> dict:
+        from ebay_async import AsyncEbayManager
+
+        async with AsyncEbayManager(self.store_id) as ebay:
+            return await ebay.classify_skus(skus)
+
+    def run(self, refresh: bool = False, dry_run: bool = False) -> Dict[str, int]:
+        skus = self.load(refresh)
+        summary = {"pending": len(skus), "inventory": 0, "trading": 0, "unresolved": 0, "write_failed": 0}
+        if dry_run or not skus:
+            return summary
+
+        # Kayıtlar channel_cache üzerinden yazılır (ilan ID'leri oradan); eşleme olay döngüsü dışında tazelenir
+        channel_cache.reload(self.store_id)
+        found = asyncio.run(self._classify(skus))
+        failed = write_buffer.flush()["failed"]
+
+        summary["inventory"] = sum(1 for info in found.values() if info["api"] == CHANNEL_API_INVENTORY)
+        summary["trading"] = len(found) - summary["inventory"]
+        summary["unresolved"] = len(skus) - len(found)
+        summary["write_failed"] = len(failed)
+        return summary
+
+
+def run_discovery(refresh: bool = False, dry_run: bool = False) -> Dict[str, int]:
+    summary = ChannelDiscoveryJob().run(refresh=refresh, dry_run=dry_run)
+    mode = "KURU ÇALIŞTIRMA" if dry_run else "TAMAMLANDI"
+    print(
+        f"🔎 Kanal keşfi {mode}: {summary['pending']} SKU tarandı, {summary['inventory']} Inventory API, "
+        f"{summary['trading']} Trading API, {summary['unresolved']} belirsiz (sonraki çalışmada tekrar denenir)."
+    )
+    if summary["write_failed"]:
+        print(f"⚠️ {summary['write_failed']} kanal kaydı yazılamadı; sonraki çalışmada tekrar denenecek.")
+    return summary
+
+
+if __name__ == "__main__":
+    run_discovery(refresh="--refresh" in sys.argv[1:], dry_run="--dry-run" in sys.argv[1:])
@@ -3,6 +3,7 @@ import uuid
 import re
 from typing import List, Dict, Any, Tuple
 from database import db
+from query_tracer import tracer
 
 # Standartlaştırılmış Veri Modelleri
 class ContactAddress:
@@ -287,6 +288,7 @@ class ContactDBManager:
     """Veritabanına (Supabase) Contacts kayıtlarını upsert yapan yönetici sınıf."""
     
     @staticmethod
+    @tracer.job("contacts.save_records")
     def save_records(records: List[ContactRecord]) -> Dict[str, int]:
         success_contacts = 0
         success_addresses = 0
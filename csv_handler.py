@@ -2,6 +2,7 @@ import pandas as pd
 import streamlit as st
 import datetime
 from database import db
+from catalog_mirror import mirror
 import requests
 import io
 import os
@@ -69,11 +70,12 @@ class CSVHandler:
         if not sku_col or not price_col:
             raise ValueError("eBay CSV format is missing required columns (SKU or Price).")
 
-        # Fetch current listings from DB to know the IDs for upserting
-        list_data = db.client.table('listings').select('id, product_id, store_id, channel_sku').execute().data
-        
-        # Create a mapping of channel_sku -> listing db ID
-        sku_to_listing = {l['channel_sku']: l for l in list_data if l['channel_sku']}
+        # Create a mapping of channel_sku -> listing db ID (local catalog mirror when fresh, otherwise Supabase)
+        if mirror.ensure_fresh():
+            sku_to_listing = mirror.listings_by_sku()
+        else:
+            list_data = db.iter_rows('listings', 'id, product_id, store_id, channel_sku')
+            sku_to_listing = {l['channel_sku']: l for l in list_data if l['channel_sku']}
         
         updates = []
         now_str = datetime.datetime.now(datetime.timezone.utc).isoformat()
@@ -3,6 +3,7 @@ import json
 from dotenv import load_dotenv
 import google.generativeai as genai
 from database import db
+from product_resolver import resolver
 
 # Load environment variables
 load_dotenv()
@@ -110,11 +111,11 @@ Keep the message concise but extremely professional.
             
             if detected_intent != "EXPIRATION_DATE":
                 # 2.A - ISKU'dan Product ID'yi bul
-                listing_res = db.client.table("listings").select("product_id").eq("channel_sku", isku).execute()
-                if not listing_res.data:
+                listing = resolver.resolve_sku(isku)
+                if not listing:
                     raise ValueError(f"Sistemde {isku} ISKU koduna ait bir ürün bulunamadı.")
                     
-                product_id = listing_res.data[0]["product_id"]
+                product_id = listing["product_id"]
                 
                 # 2.B - Belgeyi (document_type = detected_intent) DB'de ara
                 docs = db.get_product_documents(product_id=product_id, document_type=detected_intent)
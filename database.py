@@ -1,56 +1,280 @@
+import contextvars
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import streamlit as st
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Callable, Any
+
+# Bağlantı havuzu ayarları (.env üzerinden değiştirilebilir)
+DEFAULT_POOL_SIZE = 20        # Aynı anda açık tutulacak maksimum HTTP bağlantısı
+DEFAULT_KEEPALIVE_SECONDS = 60 # Boşta kalan bağlantının kapatılmadan önce bekleme süresi
+DEFAULT_TIMEOUT_SECONDS = 30  # PostgREST istek zaman aşımı
+DEFAULT_PAGE_SIZE = 1000      # Supabase'in varsayılan max_rows sınırı
+
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
+
+
+def _env_number(name: str, default, cast=int):
+    try:
+        return cast(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_pool_settings() -> Dict:
+    """Havuz boyutu ve zaman aşımı ayarlarını .env'den (yoksa varsayılanlardan) okur."""
+    return {
+        "pool_size": _env_number("SUPABASE_POOL_SIZE", DEFAULT_POOL_SIZE),
+        "keepalive": _env_number("SUPABASE_KEEPALIVE_SECONDS", DEFAULT_KEEPALIVE_SECONDS, float),
+        "timeout": _env_number("SUPABASE_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS, float),
+    }
+
+
+def load_credentials() -> tuple:
+    """SUPABASE_URL/KEY bilgisini okur.
+    Streamlit sadece uygulama zaten Streamlit içinde çalışıyorsa (modül yüklüyse) sorgulanır,
+    böylece CLI botları database'i import ederken Streamlit'i yüklemez."""
+    url, key = None, None
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        try:
+            url = st.secrets["SUPABASE_URL"]
+            key = st.secrets["SUPABASE_KEY"]
+        except Exception:
+            url, key = None, None
+
+    if not url or not key:
+        load_dotenv()
+        url = os.environ.get("SUPABASE_URL")
+        key = os.environ.get("SUPABASE_KEY")
+
+    if not url or not key:
+        raise ValueError("SUPABASE_URL ve SUPABASE_KEY bulunamadı!")
+    return url, key
+
+
+def _build_http_pool(settings: Dict):
+    """Keep-alive destekli, boyutu ayarlanabilir httpx bağlantı havuzu oluşturur."""
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=settings["pool_size"],
+        max_keepalive_connections=settings["pool_size"],
+        keepalive_expiry=settings["keepalive"],
+    )
+    kwargs = {"limits": limits, "timeout": settings["timeout"]}
+    from query_tracer import tracer
+    if tracer.enabled:
+        kwargs["event_hooks"] = tracer.httpx_event_hooks()
+    try:
+        return httpx.Client(http2=True, **kwargs)
+    except ImportError:
+        # h2 paketi kurulu değilse HTTP/1.1 keep-alive ile devam et
+        return httpx.Client(**kwargs)
+
+
+def _create_pooled_client(url: str, key: str) -> Client:
+    settings = get_pool_settings()
+    http_pool = _build_http_pool(settings)
+
+    try:
+        from supabase import ClientOptions
+    except ImportError:
+        from supabase.lib.client_options import ClientOptions
+
+    try:
+        options = ClientOptions(postgrest_client_timeout=settings["timeout"], httpx_client=http_pool)
+        return create_client(url, key, options=options)
+    except TypeError:
+        # Eski supabase sürümleri httpx_client parametresini tanımaz:
+        # PostgREST oturumunu aynı ayarlarla havuzlu bir istemciyle değiştiriyoruz.
+        http_pool.close()
+        options = ClientOptions(postgrest_client_timeout=settings["timeout"])
+        client = create_client(url, key, options=options)
+        postgrest = client.postgrest
+        old_session = postgrest.session
+        pooled = _build_http_pool(settings)
+        pooled.base_url = old_session.base_url
+        pooled.headers.update(old_session.headers)
+        postgrest.session = pooled
+        old_session.close()
+        return client
+
+
+def get_client() -> Client:
+    """Süreç genelinde paylaşılan Supabase istemcisini döndürür (ilk çağrıda tembel olarak kurulur)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                url, key = load_credentials()
+                client = _create_pooled_client(url, key)
+                from query_tracer import tracer
+                client = tracer.wrap_client(client)
+                _client = client
+    return _client
+
+
+def create_async_session(**connector_kwargs):
+    """Ham PostgREST çağrıları için keep-alive havuzlu aiohttp oturumu açar.
+    aiohttp oturumları event loop'a bağlı olduğundan her asyncio.run() içinde bir kez açılmalıdır."""
+    import aiohttp
+
+    settings = get_pool_settings()
+    connector_kwargs.setdefault("limit", settings["pool_size"])
+    connector_kwargs.setdefault("keepalive_timeout", settings["keepalive"])
+    connector = aiohttp.TCPConnector(**connector_kwargs)
+    trace_configs = []
+    from query_tracer import tracer
+    if tracer.enabled:
+        trace_configs.append(tracer.aiohttp_trace_config())
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=settings["timeout"]),
+        trace_configs=trace_configs,
+    )
+
 
 class DatabaseManager:
-    def __init__(self):
+    """Supabase veri erişim katmanı. İstemci ilk kullanımda kurulur ve tüm modüllerce paylaşılır."""
+
+    def __init__(self, client: Client = None):
+        self._client = client
+
+    @property
+    def client(self) -> Client:
+        if self._client is not None:
+            return self._client
+        return get_client()
+
+    def rest_url(self, table: str) -> str:
+        """Ham (aiohttp) PostgREST çağrıları için tablo uç noktası."""
+        url, _ = load_credentials()
+        return f"{url}/rest/v1/{table}"
+
+    def rest_headers(self, prefer: str = "return=minimal") -> Dict[str, str]:
+        _, key = load_credentials()
+        headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+        }
+        if prefer:
+            headers["Prefer"] = prefer
+        return headers
+
+    @staticmethod
+    def _top_level_columns(columns: str) -> List[str]:
+        """select() metnindeki en üst seviye kolon adlarını döndürür (gömülü ilişkilerin içini atlar)."""
+        names, depth, current = [], 0, ""
+        for ch in columns:
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+            if ch == "," and depth == 0:
+                names.append(current.strip())
+                current = ""
+            else:
+                current += ch
+        if current.strip():
+            names.append(current.strip())
+        return names
+
+    @staticmethod
+    def _keyset_literal(value: Any) -> str:
+        """PostgREST or=() filtresi için değeri çift tırnakla güvenli hale getirir."""
+        text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        return f'"{text}"'
+
+    def iter_rows(
+        self,
+        table: str,
+        columns: str = "*",
+        key: str = "id",
+        tiebreaker: str = None,
+        desc: bool = False,
+        filters: Callable = None,
+        after: tuple = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        prefetch: bool = True,
+    ) -> Iterator[Dict]:
+        """
+        Tabloyu keyset (imleç) sayfalama ile akış halinde okur.
+        OFFSET yerine son satırın (key, tiebreaker) değerinden devam edildiği için her sayfa
+        indeks üzerinden O(sayfa) maliyetle gelir; toplam okuma doğrusaldır ve bellekte tek sayfa tutulur.
+
+        key benzersiz değilse (örn. created_at) eşitlik durumları için tiebreaker (örn. id) verilmelidir.
+        filters, sorguya ek filtre uygulayan bir fonksiyondur: lambda q: q.is_("category_id", "null")
+        after, (key, tiebreaker) değerleriyle verilen imleçten sonrasını okumaya başlar.
+        prefetch açıkken bir sonraki sayfa, çağıran taraf mevcut sayfayı işlerken arka planda çekilir.
+        """
+        if columns != "*":
+            selected = self._top_level_columns(columns)
+            for needed in (key, tiebreaker):
+                if needed and needed not in selected:
+                    columns = f"{columns}, {needed}"
+
+        def fetch_page(cursor):
+            query = self.client.table(table).select(columns)
+            if filters:
+                query = filters(query)
+            if cursor is not None:
+                op = "lt" if desc else "gt"
+                if tiebreaker:
+                    key_val = self._keyset_literal(cursor[0])
+                    tie_val = self._keyset_literal(cursor[1])
+                    query = query.or_(f"{key}.{op}.{key_val},and({key}.eq.{key_val},{tiebreaker}.{op}.{tie_val})")
+                else:
+                    query = query.lt(key, cursor[0]) if desc else query.gt(key, cursor[0])
+            query = query.order(key, desc=desc)
+            if tiebreaker:
+                query = query.order(tiebreaker, desc=desc)
+            return query.limit(page_size).execute().data or []
+
+        def cursor_of(row):
+            return (row.get(key), row.get(tiebreaker)) if tiebreaker else (row.get(key),)
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
         try:
-            url: str = st.secrets["SUPABASE_URL"]
-            key: str = st.secrets["SUPABASE_KEY"]
-        except (FileNotFoundError, KeyError):
-            load_dotenv()
-            url: str = os.environ.get("SUPABASE_URL")
-            key: str = os.environ.get("SUPABASE_KEY")
-            
-        if not url or not key:
-            raise ValueError("SUPABASE_URL ve SUPABASE_KEY bulunamadı!")
-        
-        self.client: Client = create_client(url, key)
+            page = fetch_page(after)
+            while page:
+                next_cursor = cursor_of(page[-1])
+                # Ön yükleme thread'i de aynı izleme işine (query_tracer job) sayılsın diye bağlam kopyalanır
+                pending = executor.submit(contextvars.copy_context().run, fetch_page, next_cursor) if executor else None
+                for row in page:
+                    yield row
+                # Sunucu max_rows sınırı page_size'dan küçük olabilir; bu yüzden boş sayfa gelene kadar devam ediyoruz.
+                page = pending.result() if pending else fetch_page(next_cursor)
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
 
     def create_core_product(self, base_title: str, isku: str, asin: str = None, upc: str = None, requires_expiration: bool = False) -> Dict:
-        prod_data = {
-            "asin": asin, 
-            "upc": upc, 
-            "requires_expiration": requires_expiration
+        bundle = {
+            "asin": asin,
+            "upc": upc,
+            "requires_expiration": requires_expiration,
+            "base_title": base_title,
+            "with_logistics": True
         }
-        prod_data = {k: v for k, v in prod_data.items() if v is not None} 
-        
-        new_prod = self.client.table("core_products").insert(prod_data).execute()
-        product_id = new_prod.data[0]['id']
-        
-        self.client.table("product_base_content").insert({
-            "product_id": product_id,
-            "base_title": base_title
-        }).execute()
-        
-        self.client.table("product_logistics").insert({
-            "product_id": product_id
-        }).execute()
         
         # ISKU'yu listings tablosuna ekle
         if isku:
             STORE_ID = "197bd215-3bec-4f43-aa40-f2fb4d204eee"
-            self.client.table("listings").insert({
-                "product_id": product_id,
+            bundle.update({
                 "store_id": STORE_ID,
                 "channel_sku": isku,
                 "is_active": False,
                 "needs_sync": False
-            }).execute()
+            })
         
-        return new_prod.data[0]
+        # Ürün, başlık, lojistik ve ilan tek RPC ile tek transaction'da yazılır
+        row = self.upsert_product_bundles([bundle])[0]
+        return {"id": row["product_id"], "asin": asin, "upc": upc, "requires_expiration": requires_expiration}
 
     def get_product_by_asin(self, asin: str) -> Optional[Dict]:
         response = self.client.table("core_products").select(
@@ -61,40 +285,61 @@ class DatabaseManager:
             return response.data[0]
         return None
 
+    CORE_PRODUCT_COLUMNS = (
+        "id, asin, upc, created_at, product_media(media_url), product_base_content(base_title, updated_at), requires_expiration, "
+        "sources(base_cost, supplier_id, updated_at), listings(channel_item_id, listed_price, quantity, channel_sku, category_id, store_id, shipping_profile_id, return_profile_id, payment_profile_id, updated_at), "
+        "product_documents(document_type, document_url)"
+    )
+
+    def iter_core_products(self) -> Iterator[Dict]:
+        """Ana ürünleri en yeniden eskiye (created_at, id imleciyle) akış halinde getirir."""
+        return self.iter_rows("core_products", self.CORE_PRODUCT_COLUMNS, key="created_at", tiebreaker="id", desc=True)
+
     def get_all_core_products(self) -> List[Dict]:
         """Ana ürünleri listeleme ekranı için temel bilgilerle getirir."""
-        all_products = []
-        offset = 0
-        limit = 1000  # Supabase default max_rows is 1000
-        while True:
-            response = self.client.table("core_products").select(
-                "id, asin, upc, created_at, product_media(media_url), product_base_content(base_title, updated_at), requires_expiration, "
-                "sources(base_cost, supplier_id, updated_at), listings(channel_item_id, listed_price, quantity, channel_sku, category_id, store_id, shipping_profile_id, return_profile_id, payment_profile_id, updated_at), "
-                "product_documents(document_type, document_url)"
-            ).order("created_at", desc=True).range(offset, offset + limit - 1).execute()
-            
-            data = response.data
-            if data is None:
-                break # in case of error
-                
-            all_products.extend(data)
-            if len(data) < limit:
-                break
-            offset += limit
-            
-        return all_products
-        
+        return list(self.iter_core_products())
+
+    def get_catalog_page(
+        self,
+        page: int = 1,
+        page_size: int = 50,
+        supplier_ids: List[str] = None,
+        store_ids: List[str] = None,
+        include_cj: bool = False,
+    ) -> tuple:
+        """
+        Portföy ekranı için catalog_rows tablosundan (ürün başına tek düz satır) bir sayfa okur.
+        supplier_ids verilirse sadece bu kaynaklara ait ürünler gelir; SKU'su CJ ile başlayan ürünler
+        kaynağından bağımsız olarak "CJ Dropshipping" sayılır ve yalnızca include_cj açıkken gelir.
+        store_ids verilirse ilk ilanı bu mağazalarda olan ürünler gelir. None filtre uygulanmaz demektir.
+        Dönüş: (satırlar, filtreye uyan toplam satır sayısı). Sıralama created_at DESC.
+        """
+        if (supplier_ids is not None and not supplier_ids and not include_cj) or (store_ids is not None and not store_ids):
+            return [], 0
+
+        query = self.client.table("catalog_rows").select("*", count="exact")
+        if supplier_ids is not None:
+            conditions = []
+            if supplier_ids:
+                conditions.append(f"and(is_cj.is.false,supplier_id.in.({','.join(supplier_ids)}))")
+            if include_cj:
+                conditions.append("is_cj.is.true")
+            query = query.or_(",".join(conditions))
+        if store_ids is not None:
+            query = query.in_("store_id", store_ids)
+
+        start = (max(page, 1) - 1) * page_size
+        res = (
+            query.order("created_at", desc=True)
+            .order("product_id", desc=True)
+            .range(start, start + page_size - 1)
+            .execute()
+        )
+        return res.data or [], res.count or 0
+
     def get_all_categories(self) -> Dict[str, str]:
-        all_cats = []
-        offset = 0
-        limit = 1000
-        while True:
-            res = self.client.table("marketplace_categories").select("category_id, category_name").range(offset, offset+limit-1).execute()
-            if not res.data: break
-            all_cats.extend(res.data)
-            if len(res.data) < limit: break
-            offset += limit
-        return {c['category_id']: c['category_name'] for c in all_cats}
+        rows = self.iter_rows("marketplace_categories", "category_id, category_name", key="category_id", tiebreaker="marketplace")
+        return {c['category_id']: c['category_name'] for c in rows}
 
     def get_all_stores(self) -> Dict[str, str]:
         res = self.client.table("stores").select("id, store_name").execute()
@@ -104,222 +349,140 @@ class DatabaseManager:
         res = self.client.table("suppliers").select("id, name").execute()
         return {s['id']: s['name'] for s in res.data} if res.data else {}
 
+    def upsert_product_bundles(self, bundles: List[Dict], chunk_size: int = 500) -> List[Dict]:
+        """
+        Ürün paketlerini (core_products, product_base_content, product_logistics, sources, listings)
+        upsert_product_bundles RPC'si ile sunucu tarafında tek transaction'da yazar.
+        Her parça (chunk) için tek ağ çağrısı yapılır. Dönen satırlar gönderilen sırayla
+        {bundle_index, asin, product_id, source_id, listing_id} içerir.
+        """
+        results = []
+        for i in range(0, len(bundles), chunk_size):
+            res = self.client.rpc("upsert_product_bundles", {"bundles": bundles[i:i + chunk_size]}).execute()
+            for row in res.data or []:
+                row["bundle_index"] += i
+                results.append(row)
+        return results
+
+    @staticmethod
+    def _normalize_easync_frame(df):
+        """
+        Easync CSV'sini sütun bazında tek geçişte normalize eder (satır döngüsü yok).
+        Dönen tablo: asin, channel_sku, base_title, source_market, target_market,
+        marketplace, base_cost, quantity, channel_item_id
+        """
+        import numpy as np
+        import pandas as pd
+
+        df = df.fillna('')
+
+        def text(name, default):
+            if name in df.columns:
+                return df[name].astype(str)
+            return pd.Series(default, index=df.index, dtype=object)
+
+        out = pd.DataFrame(index=df.index)
+
+        source_id = text('Source Product Id', '').str.strip()
+        unknown = 'UNKNOWN-' + pd.Series(df.index.astype(str), index=df.index)
+        out['asin'] = source_id.where(source_id != '', unknown)
+
+        # Kullanıcının iç SSKU'su (ISKU) AASIN formatıdır
+        # Vitrinde (eBay) Target Variant sütunu görünen marka ismidir ama iç sistemdeki kayıtlı ismi AASIN'dir
+        variant = text('Target Variant', '').str.strip()
+        out['channel_sku'] = variant.where(variant != '', 'A' + out['asin'])
+
+        out['base_title'] = text('Title', 'İsimsiz Ürün').str.slice(0, 200)
+        out['source_market'] = text('Source Market', 'Amazon US')
+        out['target_market'] = text('Target Market', 'eBay US')
+
+        target_lower = out['target_market'].str.lower()
+        out['marketplace'] = np.select(
+            [target_lower.str.contains('amazon', regex=False), target_lower.str.contains('shopify', regex=False)],
+            ['amazon', 'shopify'],
+            default='ebay'
+        )
+
+        price_raw = text('Source Price', '0').str.replace('$', '', regex=False).str.replace(',', '', regex=False).str.strip()
+        out['base_cost'] = pd.to_numeric(price_raw, errors='coerce').fillna(0.0).astype(float)
+
+        # Easync Quantity yoksa veya tam sayı değilse 1 kabul edelim
+        qty = pd.to_numeric(text('Quantity', '1').str.strip(), errors='coerce')
+        out['quantity'] = qty.where(np.isfinite(qty) & (qty == qty.round()), 1).astype(int)
+
+        out['channel_item_id'] = text('Target Product Id', '').str.strip()
+        return out
+
+    def _resolve_easync_accounts(self, names, cache: Dict[str, str], table: str, payload_of: Callable[[str, Optional[str]], Dict]) -> Dict[str, str]:
+        """CSV'deki benzersiz tedarikçi/mağaza adlarından önbellekte olmayanları bir kez oluşturur."""
+        missing = [n for n in names if n not in cache]
+        if missing:
+            mp_data = self.client.table('marketplaces').select('id, name, region').execute().data
+            mp_cache = {f"{m['name']}_{m['region']}": m['id'] for m in mp_data}
+            for name in missing:
+                mp_id = mp_cache.get(f"{name.split()[0]}_US", list(mp_cache.values())[0] if mp_cache else None)
+                res = self.client.table(table).insert(payload_of(name, mp_id)).execute()
+                cache[name] = res.data[0]['id']
+        return cache
+
+    @staticmethod
+    def _build_easync_bundles(frame) -> List[Dict]:
+        """Normalize edilmiş, ID'leri ve fiyatı çözülmüş tabloyu upsert_product_bundles paketlerine çevirir."""
+        bundles = frame[[
+            'asin', 'base_title', 'supplier_id', 'base_cost', 'store_id',
+            'channel_item_id', 'channel_sku', 'listed_price', 'quantity'
+        ]].copy()
+        bundles['source_code'] = bundles['asin']
+        bundles['is_active'] = True
+        bundles['needs_sync'] = False
+        return bundles.to_dict('records')
+
     def import_easync_data(self, df) -> dict:
-        """Toplu işlem (Bulk Insert) mimarisi ile sıfır ağ gecikmesi."""
+        """Sütun bazlı (vektörel) toplu işlem: normalize et, eşleştir, fiyatla, her 500 satır için tek RPC."""
+        import streamlit as st
+        from pricing_engine import PricingEngine
         st.info("🚀 Veriler paketleniyor (Bulk İşlem)...")
-        df = df.fillna('')
-        
-        # --- 1. MEVCUT VERİYİ RAM'E ÇEK (Sayfalama ile 1000 sınırını aşarak) ---
-        mp_data = self.client.table('marketplaces').select('id, name, region').execute().data
-        mp_cache = {f"{m['name']}_{m['region']}": m['id'] for m in mp_data}
-        
+
+        # --- 1. NORMALİZE ET + TEKRARLARI AYIKLA ---
+        # Aynı ASIN + kaynak + hedef pazar üçlüsü tamamen aynı paketi üretir; ilk satır geçerlidir.
+        frame = self._normalize_easync_frame(df)
+        frame = frame.drop_duplicates(subset=['asin', 'source_market', 'target_market'], keep='first')
+        duplicates = len(df) - len(frame)
+
+        # --- 2. TEDARİKÇİ / MAĞAZA ID'LERİ (Benzersiz ad başına bir kez) ---
         sup_data = self.client.table('suppliers').select('id, name').execute().data
-        supplier_cache = {s['name']: s['id'] for s in sup_data}
-        
+        supplier_cache = self._resolve_easync_accounts(
+            frame['source_market'].unique(), {s['name']: s['id'] for s in sup_data}, 'suppliers',
+            lambda name, mp_id: {'marketplace_id': mp_id, 'supplier_type': 'Marketplace_Account', 'name': name}
+        )
         store_data = self.client.table('stores').select('id, store_name').execute().data
-        store_cache = {s['store_name']: s['id'] for s in store_data}
-        
-        # core_products için 1000 sınırını aşacak şekilde tek tek ID'leri çekelim veya CSV'den ASIN'leri bulup sadece onları IN ile çekelim
-        # Daha temizi, Supabase'in sayfalama (limit/offset veya range) özelliğini kullanmak
-        source_ids_in_csv = df['Source Product Id'].dropna().astype(str).unique().tolist()
-        
-        prod_data = []
-        chunk_sz = 200
-        for i in range(0, len(source_ids_in_csv), chunk_sz):
-            chunk_asins = source_ids_in_csv[i:i+chunk_sz]
-            res = self.client.table('core_products').select('id, asin').in_('asin', chunk_asins).execute()
-            prod_data.extend(res.data)
-            
-        prod_cache = {p['asin']: p['id'] for p in prod_data} # asin üzerinden ID eşleştir
-        
-        # Şimdilik listing ve source cache'lerini çok büyük olmaması için sadece DB'de olan product'lar için alalım
-        existing_p_ids = [p['id'] for p in prod_data]
-        list_data = []
-        src_data = []
-        if existing_p_ids:
-            for i in range(0, len(existing_p_ids), chunk_sz):
-                p_chunk = existing_p_ids[i:i+chunk_sz]
-                l_res = self.client.table('listings').select('id, product_id, store_id').in_('product_id', p_chunk).execute()
-                list_data.extend(l_res.data)
-                
-                s_res = self.client.table('sources').select('id, product_id, supplier_id').in_('product_id', p_chunk).execute()
-                src_data.extend(s_res.data)
-
-        # Cache'de ID'leri tutuyoruz böylece upsert esnasında Primary Key çakışmasını sorunsuz UPDATE edebilelim
-        listing_cache = {f"{l['product_id']}_{l['store_id']}": l['id'] for l in list_data}
-        source_cache = {f"{s['product_id']}_{s['supplier_id']}": s['id'] for s in src_data}
-
-        # --- PAKET LİSTELERİ (Veritabanına gidecek toplu kargolar) ---
-        new_products_payload = []
-        new_contents_payload = []
-        new_sources_payload = []
-        new_listings_payload = []
-        
-        # --- 2. BİRİNCİ TUR: SADECE YENİ ÜRÜNLERİ TESPİT ET ---
-        for index, row in df.iterrows():
-            source_id = str(row.get('Source Product Id', '')).strip()
-            if not source_id:
-                source_id = f"UNKNOWN-{index}"
-                
-            # Kullanıcının iç SSKU'su (ISKU) AASIN formatıdır
-            # Vitrinde (eBay) Target Variant sütunu görünen marka ismidir ama iç sistemdeki kayıtlı ismi AASIN'dir
-            true_isku = f"A{source_id}"
-            target_variant = str(row.get('Target Variant', '')).strip()
-            
-            title = str(row.get('Title', 'İsimsiz Ürün'))[:200]
+        store_cache = self._resolve_easync_accounts(
+            frame['target_market'].unique(), {s['store_name']: s['id'] for s in store_data}, 'stores',
+            lambda name, mp_id: {'marketplace_id': mp_id, 'store_name': name}
+        )
+        frame['supplier_id'] = frame['source_market'].map(supplier_cache)
+        frame['store_id'] = frame['target_market'].map(store_cache)
 
-            # Eğer prod_cache'de ASIN yoksa eklenecekler listesine koy
-            if source_id not in prod_cache and not any(p['asin'] == source_id for p in new_products_payload):
-                new_products_payload.append({'asin': source_id})
-                
-            # Var olan veya yeni olan TÜM ürünler için ismi de güncelleyelim (Ayrı bir listede biriktiriyoruz)
-            # Ancak ID'yi cache'den almalıyız. Eğer yeni eklenecekse, ID'si insert'ten sonra oluşacak.
-            # Bu yüzden var olanların başlığını ayrı güncelleyip, yenilerin başlığını insert sonrasına bırakmalıyız.
-
-        # --- 3. TOPLU KAYIT: ÜRÜNLER ---
-        if new_products_payload:
-            chunk_size = 500
-            for i in range(0, len(new_products_payload), chunk_size):
-                chunk = new_products_payload[i:i+chunk_size]
-                # ASIN kullanarak upsert
-                res = self.client.table('core_products').upsert(chunk, on_conflict='asin').execute()
-                
-                for p in res.data:
-                    prod_cache[p['asin']] = p['id']
+        # --- 3. YENİ ERP FİYATLANDIRMA MANTIĞI ---
+        # Easync'in bize dayattığı statik 'Target Price' sütununu çöpe atıyoruz, kendi Pricing Engine'imizi kullanıyoruz.
+        # Pazar yeri başına tek vektörel çağrı. CSV'de kategori olmadığı için global %15 komisyon.
+        frame['listed_price'] = 0.0
+        for marketplace, costs in frame.groupby('marketplace')['base_cost']:
+            frame.loc[costs.index, 'listed_price'] = PricingEngine.calculate_final_prices(costs, marketplace=marketplace, fee_percents=15.0)
 
-        # Tüm ID'ler cache'e doldu. Şimdi hepsinin ismini topluca güncelleyelim (İsimsiz Ürün sorununu çözer)
-        for index, row in df.iterrows():
-            source_id = str(row.get('Source Product Id', '')).strip()
-            if not source_id:
-                source_id = f"UNKNOWN-{index}"
-            
-            product_id = prod_cache.get(source_id)
-            if product_id:
-                title = str(row.get('Title', 'İsimsiz Ürün'))[:200]
-                if not any(c['product_id'] == product_id for c in new_contents_payload):
-                    new_contents_payload.append({'product_id': product_id, 'base_title': title})
-        
-        if new_contents_payload:
-            chunk_size = 500
-            for i in range(0, len(new_contents_payload), chunk_size):
-                self.client.table('product_base_content').upsert(new_contents_payload[i:i+chunk_size], on_conflict='product_id').execute()
-
-        # --- 4. İKİNCİ TUR: İLİŞKİLERİ (KAYNAK VE İLAN) PAKETLE ---
-        for index, row in df.iterrows():
-            source_id = str(row.get('Source Product Id', '')).strip()
-            if not source_id:
-                source_id = f"UNKNOWN-{index}"
-            
-            marketplace_sku = str(row.get('Target Variant', '')).strip()
-            if not marketplace_sku:
-                marketplace_sku = f"A{source_id}"
-            
-            source_market_raw = str(row.get('Source Market', 'Amazon US'))
-            target_market_raw = str(row.get('Target Market', 'eBay US'))
-            
-            supplier_id = supplier_cache.get(source_market_raw)
-            if not supplier_id:
-                mp_id = mp_cache.get(f"{source_market_raw.split()[0]}_US", list(mp_cache.values())[0] if mp_cache else None)
-                res = self.client.table('suppliers').insert({'marketplace_id': mp_id, 'supplier_type': 'Marketplace_Account', 'name': source_market_raw}).execute()
-                supplier_id = res.data[0]['id']
-                supplier_cache[source_market_raw] = supplier_id
-
-            store_id = store_cache.get(target_market_raw)
-            if not store_id:
-                mp_id = mp_cache.get(f"{target_market_raw.split()[0]}_US", list(mp_cache.values())[0] if mp_cache else None)
-                res = self.client.table('stores').insert({'marketplace_id': mp_id, 'store_name': target_market_raw}).execute()
-                store_id = res.data[0]['id']
-                store_cache[target_market_raw] = store_id
-
-            product_id = prod_cache.get(source_id)
-            if not product_id:
-                continue # Eklendiğine emin olmak için
-            
-            s_price_raw = str(row.get('Source Price', '0')).replace('$', '').replace(',', '').strip()
-            base_cost = float(s_price_raw) if s_price_raw else 0.0
-            
-            # --- YENİ ERP FİYATLANDIRMA MANTILIĞI ---
-            # Easync'in bize dayattığı statik 'Target Price' sütununu çöpe atıyoruz.
-            # Sistemi kendi Otonom Pricing Engine'imize bağlıyoruz.
-            target_marketplace = 'ebay'
-            if 'amazon' in target_market_raw.lower():
-                target_marketplace = 'amazon'
-            elif 'shopify' in target_market_raw.lower():
-                target_marketplace = 'shopify'
-                
-            from pricing_engine import PricingEngine
-            calculated_listed_price = PricingEngine.calculate_final_price(
-                source_price=base_cost,
-                marketplace=target_marketplace,
-                override_marketplace_fee=15.0 # CSV'de kategori olmadığı için şimdilik global %15 fallback
-            )
-            
-            # Easync Quantity yoksa 1 kabul edelim, eğer varsa alalım
-            qty_raw = str(row.get('Quantity', '1')).strip()
+        # --- 4. TOPLU KAYIT: Parça başına tek RPC, tek transaction ---
+        bundles = self._build_easync_bundles(frame)
+        errors = 0
+        chunk_size = 500
+        for i in range(0, len(bundles), chunk_size):
+            chunk = bundles[i:i+chunk_size]
             try:
-                qty = int(qty_raw)
-            except:
-                qty = 1
-            
-            src_key = f"{product_id}_{supplier_id}"
-            if not any(s['product_id'] == product_id and s['supplier_id'] == supplier_id for s in new_sources_payload):
-                s_payload = {
-                    'product_id': product_id, 'supplier_id': supplier_id, 
-                    'source_code': source_id, 'base_cost': base_cost
-                }
-                # Eğer db'de varsa id'sini ekle ki upsert doğrudan update yapsın!
-                if src_key in source_cache:
-                    s_payload['id'] = source_cache[src_key]
-                new_sources_payload.append(s_payload)
-
-            lst_key = f"{product_id}_{store_id}"
-            if not any(l['product_id'] == product_id and l['store_id'] == store_id for l in new_listings_payload):
-                l_payload = {
-                    'product_id': product_id, 'store_id': store_id, 
-                    'channel_item_id': str(row.get('Target Product Id', '')).strip(), 
-                    'channel_sku': marketplace_sku, 
-                    'listed_price': calculated_listed_price, # Easync Fiyatı Yerine Yapay Zeka Fiyatı
-                    'quantity': qty,
-                    'is_active': True,
-                    'needs_sync': False
-                }
-                # Eğer db'de varsa id'sini ekle ki upsert UPDATE yapsın (böylece var olanların isku'su null olarak kalmaz!)
-                if lst_key in listing_cache:
-                    l_payload['id'] = listing_cache[lst_key]
-                new_listings_payload.append(l_payload)
-
-        # --- 5. TOPLU KAYIT: İLİŞKİLER (UPSERT) ---
-        chunk_size = 1000
-        
-        # Sources
-        if new_sources_payload:
-            sources_with_id = [item for item in new_sources_payload if 'id' in item]
-            sources_without_id = [item for item in new_sources_payload if 'id' not in item]
-            
-            for sublist in [sources_with_id, sources_without_id]:
-                if not sublist:
-                    continue
-                for i in range(0, len(sublist), chunk_size):
-                    try:
-                        self.client.table('sources').upsert(sublist[i:i+chunk_size]).execute()
-                    except Exception as e:
-                        print(f"Source upsert hatası (Length: {len(sublist)}): {e}")
-                
-        # Listings
-        if new_listings_payload:
-            listings_with_id = [item for item in new_listings_payload if 'id' in item]
-            listings_without_id = [item for item in new_listings_payload if 'id' not in item]
-            
-            for sublist in [listings_with_id, listings_without_id]:
-                if not sublist:
-                    continue
-                for i in range(0, len(sublist), chunk_size):
-                    try:
-                        self.client.table('listings').upsert(sublist[i:i+chunk_size]).execute()
-                    except Exception as e:
-                        print(f"Listings upsert hatası (Length: {len(sublist)}): {e}")
+                self.upsert_product_bundles(chunk, chunk_size=chunk_size)
+            except Exception as e:
+                errors += len(chunk)
+                print(f"Paket upsert hatası (Length: {len(chunk)}): {e}")
 
-        return {"success": len(df), "errors": 0}
+        return {"success": len(bundles) - errors, "errors": errors, "duplicates": duplicates}
 
     def get_unapproved_drafts(self) -> List[Dict]:
         """Taslak (draft) tablosundaki incelenmeyi bekleyen kayıtları getirir."""
@@ -478,15 +641,61 @@ class DatabaseManager:
 
         return {"success": success, "errors": errors}
 
+    def purge_products(
+        self,
+        product_ids: List[str] = None,
+        asins: List[str] = None,
+        where: Callable = None,
+        dry_run: bool = False,
+        batch_size: int = 500,
+        max_workers: int = 4,
+        progress: Callable = None,
+    ) -> Dict[str, int]:
+        """
+        Ürünleri tüm alt kayıtlarıyla birlikte purge_products RPC'si ile sunucu tarafında siler.
+        Hedefler product_ids, asins ve/veya where (core_products üzerinde iter_rows filtresi,
+        örn. lambda q: q.is_("upc", "null")) ile verilir. Parçalar max_workers thread ile paralel gönderilir;
+        her parça kendi transaction'ındadır. dry_run açıkken hiçbir şey silinmez, sadece sayılır.
+        progress(biten_parça, toplam_parça) verilirse her parça sonunda çağrılır.
+        Dönüş: tablo başına satır sayısı + "errors" (başarısız parçalardaki hedef sayısı).
+        """
+        product_ids = list(dict.fromkeys(p for p in (product_ids or []) if p))
+        asins = list(dict.fromkeys(a for a in (asins or []) if a))
+        if where is not None:
+            seen = set(product_ids)
+            product_ids += [r["id"] for r in self.iter_rows("core_products", "id", filters=where) if r["id"] not in seen]
+
+        batches = [{"product_ids": product_ids[i:i + batch_size], "asins": None} for i in range(0, len(product_ids), batch_size)]
+        batches += [{"product_ids": None, "asins": asins[i:i + batch_size]} for i in range(0, len(asins), batch_size)]
+
+        totals: Dict[str, int] = {"errors": 0}
+        if not batches:
+            return totals
+
+        def run(batch):
+            res = self.client.rpc("purge_products", {**batch, "dry_run": dry_run}).execute()
+            return res.data or []
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(contextvars.copy_context().run, run, batch): batch for batch in batches}
+            for done, future in enumerate(as_completed(futures), start=1):
+                batch = futures[future]
+                try:
+                    for row in future.result():
+                        totals[row["table_name"]] = totals.get(row["table_name"], 0) + int(row["row_count"] or 0)
+                except Exception as e:
+                    print(f"Purge error: {e}")
+                    totals["errors"] += len(batch["product_ids"] or batch["asins"])
+                if progress:
+                    progress(done, len(batches))
+        return totals
+
     def purge_amazon_discard_list(self, df):
         """
         Parses Amazon's error/discard list (which contains duplicates or inactive ASINs),
         extracts the ASINs (usually found in the B column / index 1), and completely removes 
         them from the core_products table to keep the export list pristine.
         """
-        success = 0
-        errors = 0
-        
         # In Amazon's error reports, ASIN is typically in the second column (index 1) after 13 rows of headers.
         # But to be safe if the user uploads a raw list of ASINs, we'll scan the first few columns.
         # CRITICAL FIX: Amazon's report includes ALL ASINs, but only marks bad ones with "Failed" in the Status column.
@@ -516,55 +725,37 @@ class DatabaseManager:
         if len(asins_to_delete) > 500:
             raise ValueError(f"CRITICAL SAFETY LOCK: Trying to delete {len(asins_to_delete)} ASINs at once. This looks like you accidentally uploaded the main export list instead of the Amazon Error/Discard list! Deletion cancelled.")
             
-        # Batch delete from core_products
-        chunk_size = 200
-        for i in range(0, len(asins_to_delete), chunk_size):
-            chunk = asins_to_delete[i:i+chunk_size]
-            try:
-                self.client.table('core_products').delete().in_('asin', chunk).execute()
-                success += len(chunk)
-            except Exception as e:
-                print(f"Purge error: {e}")
-                errors += len(chunk)
-                
+        # Alt kayıtlarıyla birlikte sunucu tarafında sil
+        result = self.purge_products(asins=asins_to_delete)
+        errors = result["errors"]
+        success = len(asins_to_delete) - errors
+
         return {"success": success, "errors": errors, "deleted_asins": asins_to_delete}
 
     def generate_amazon_export_file(self, output_path):
         """
-        Gathers all 10-character ASINs from core_products and formats them into
-        the Amazon bulk upload template.
+        Gathers all 10-character ASINs from core_products and streams them into
+        the Amazon bulk upload template. Splits into several files when the list
+        cap (AMAZON_LIST_MAX_ROWS) is exceeded; returns the written file paths.
         """
-        import openpyxl
         import os
-        
-        asins = []
-        offset = 0
-        chunk = 1000
-        while True:
-            res = self.client.table("core_products").select("asin").not_.is_("asin", "null").range(offset, offset + chunk - 1).execute()
-            data = res.data
-            chunk_asins = [str(d['asin']).strip() for d in data if d.get('asin') and len(str(d['asin']).strip()) == 10]
-            asins.extend(chunk_asins)
-            if len(data) < chunk:
-                break
-            offset += chunk
-            
-        if asins:
-            template_path = os.path.join(os.path.dirname(__file__), "assets", "amazon_template.xlsx")
-            wb = openpyxl.load_workbook(template_path)
-            ws = wb.active
-            
-            for i, a in enumerate(asins, start=1):
-                row_idx = 13 + i
-                ws.cell(row=row_idx, column=1, value=i)
-                ws.cell(row=row_idx, column=2, value=a)
-                
-            wb.save(output_path)
-            print(f"✅ Amazon listesi oluşturuldu: {output_path} ({len(asins)} ASIN)")
-            return True
+        from amazon_template_writer import write_asin_lists, clean_asins
+        from catalog_mirror import mirror
+
+        if mirror.ensure_fresh():
+            raw_asins = mirror.iter_asins()
+        else:
+            raw_asins = (d['asin'] for d in self.iter_rows("core_products", "id, asin", filters=lambda q: q.not_.is_("asin", "null")))
+
+        template_path = os.path.join(os.path.dirname(__file__), "assets", "amazon_template.xlsx")
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        paths = write_asin_lists(template_path, output_path, clean_asins(raw_asins))
+
+        if paths:
+            print(f"✅ Amazon listesi oluşturuldu: {', '.join(paths)}")
         else:
             print("❌ Geçerli 10 karakterli ASIN bulunamadı!")
-            return False
+        return paths
 
     def add_product_document(self, product_id: str, document_type: str, document_url: str, listing_id: str = None, language: str = 'en'):
         """Belirtilen ürüne yeni bir döküman (Örn: SDS) ekler."""
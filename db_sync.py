@@ -1,15 +1,6 @@
 import csv
-import os
-from dotenv import load_dotenv
-from supabase import create_client
-
-load_dotenv()
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL or SUPABASE_KEY is missing in .env")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+from database import db
+from write_buffer import write_buffer
 
 # eBay Mağaza ID'n
 STORE_ID = "197bd215-3bec-4f43-aa40-f2fb4d204eee"
@@ -29,7 +20,10 @@ def defteri_tamamen_esitle():
     liste_guncellenen = 0
     liste_eklenen = 0
     toplam = 0
+    chunk_size = 200
     
+    # 1. CSV'yi oku (satır satır DB'ye gitmek yerine önce hepsini topla)
+    rows = []
     with open(file_path, mode='r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         
@@ -43,64 +37,76 @@ def defteri_tamamen_esitle():
             if not item_id or not ebay_sku:
                 continue
                 
-            price_val = float(price_str) if price_str else 0.0
-            qty_val = int(qty_str) if qty_str else 0
-            
-            # eBay'deki vitrin SKU'sundan gerçek core ID'yi türet
-            true_isku = extract_true_asin(ebay_sku)
-            
-            # 1. Product ID'yi bul
-            res_prod = supabase.table("core_products").select("id").eq("isku", true_isku).execute()
-            
-            if not res_prod.data:
-                # Ürün merkezde yok, asıl kimlikle (ASIN) oluştur.
-                try:
-                    yeni_urun = supabase.table("core_products").insert({
-                        "isku": true_isku,
-                        "asin": true_isku
-                    }).execute()
-                    
-                    if yeni_urun.data:
-                        product_id = yeni_urun.data[0]['id']
-                        core_eklenen += 1
-                    else:
-                        continue 
-                except Exception:
-                    continue 
-            else:
-                product_id = res_prod.data[0]['id']
-                
-            # 2. Ürün artık merkezde var, şimdi Listings tablosunu GÜNCELLE veya EKLE
-            res_upd = supabase.table("listings").update({
-                "channel_item_id": item_id,
-                "channel_sku": ebay_sku,
-                "listed_price": price_val,
-                "quantity": qty_val,
-                "is_active": True,
-                "needs_sync": False
-            }).eq("product_id", product_id).eq("store_id", STORE_ID).execute()
-            
-            if res_upd.data:
-                liste_guncellenen += 1
-            else:
+            rows.append({
+                # eBay'deki vitrin SKU'sundan gerçek core ID'yi türet
+                "true_isku": extract_true_asin(ebay_sku),
+                "fields": {
+                    "channel_item_id": item_id,
+                    "channel_sku": ebay_sku,
+                    "listed_price": float(price_str) if price_str else 0.0,
+                    "quantity": int(qty_str) if qty_str else 0,
+                    "is_active": True,
+                    "needs_sync": False
+                }
+            })
+    
+    iskus = list(dict.fromkeys(r["true_isku"] for r in rows))
+    
+    # 2. Product ID'leri toplu bul
+    prod_map = {}
+    for i in range(0, len(iskus), chunk_size):
+        res_prod = db.client.table("core_products").select("id, isku").in_("isku", iskus[i:i+chunk_size]).execute()
+        prod_map.update({p["isku"]: p["id"] for p in res_prod.data or []})
+    
+    # 3. Merkezde olmayan ürünleri asıl kimlikle (ASIN) toplu oluştur
+    missing = [isku for isku in iskus if isku not in prod_map]
+    for i in range(0, len(missing), chunk_size):
+        chunk = missing[i:i+chunk_size]
+        try:
+            yeni_urunler = db.client.table("core_products").insert([{"isku": isku, "asin": isku} for isku in chunk]).execute()
+            created = yeni_urunler.data or []
+        except Exception:
+            # Parçadaki tek bir hatalı kayıt tümünü düşürmesin, tek tek dene
+            created = []
+            for isku in chunk:
                 try:
-                    supabase.table("listings").insert({
-                        "product_id": product_id,
-                        "store_id": STORE_ID,
-                        "channel_item_id": item_id,
-                        "channel_sku": ebay_sku,
-                        "listed_price": price_val,
-                        "quantity": qty_val,
-                        "is_active": True,
-                        "needs_sync": False
-                    }).execute()
-                    liste_eklenen += 1
+                    created.extend(db.client.table("core_products").insert({"isku": isku, "asin": isku}).execute().data or [])
                 except Exception:
-                    pass
-
-            if toplam % 100 == 0:
-                print(f"İşlenen: {toplam} | Core Yeni: {core_eklenen} | Liste Güncel: {liste_guncellenen} | Liste Yeni: {liste_eklenen}", end="\r")
+                    continue
+        prod_map.update({p["isku"]: p["id"] for p in created})
+        core_eklenen += len(created)
+    
+    # 4. Bu mağazadaki mevcut ilanları toplu çek
+    product_ids = list(dict.fromkeys(prod_map.values()))
+    listing_map = {}
+    for i in range(0, len(product_ids), chunk_size):
+        res_list = db.client.table("listings").select("id, product_id").eq("store_id", STORE_ID).in_("product_id", product_ids[i:i+chunk_size]).execute()
+        for l in res_list.data or []:
+            listing_map.setdefault(l["product_id"], []).append(l["id"])
+    
+    # 5. Listings tablosunu GÜNCELLE (write-behind tampon) veya EKLE (toplu insert)
+    new_listings = {}
+    for r in rows:
+        product_id = prod_map.get(r["true_isku"])
+        if not product_id:
+            continue
+        if product_id in listing_map:
+            for listing_id in listing_map[product_id]:
+                write_buffer.update("listings", listing_id, r["fields"])
+            liste_guncellenen += 1
+        else:
+            new_listings[product_id] = {"product_id": product_id, "store_id": STORE_ID, **r["fields"]}
+    liste_yazilamayan = len(write_buffer.flush()["failed"])
+    
+    new_payload = list(new_listings.values())
+    for i in range(0, len(new_payload), chunk_size):
+        try:
+            db.client.table("listings").insert(new_payload[i:i+chunk_size]).execute()
+            liste_eklenen += len(new_payload[i:i+chunk_size])
+        except Exception as e:
+            print(f"Listings insert hatası: {e}")
 
+    print(f"İşlenen: {toplam} | Core Yeni: {core_eklenen} | Liste Güncel: {liste_guncellenen} | Liste Yeni: {liste_eklenen} | Yazılamayan: {liste_yazilamayan}")
     print(f"\n\nSİSTEM TAMAMEN ONARILDI VE EŞİTLENDİ!")
     print(f"- Merkez (Core) Tabloya Eklenen Kayıp Ürün: {core_eklenen}")
     print(f"- Fiyatı/Satusu/Stoğu Güncellenen Mevcut İlan: {liste_guncellenen}")
@@ -4,20 +4,9 @@ from database import db
 def delete_ghost_products():
     print("Hayalet (Ebay'de olmayan) ürünler tespit ediliyor...")
     
-    # 1. Start fetching listings where category_id is null
-    ghost_product_ids = []
-    offset = 0
-    limit = 1000
-    
-    while True:
-        res = db.client.table('listings').select('product_id').is_('category_id', 'null').range(offset, offset+limit-1).execute()
-        data = res.data
-        if not data: break
-        
-        ghost_product_ids.extend([item['product_id'] for item in data if item.get('product_id')])
-        
-        if len(data) < limit: break
-        offset += limit
+    # 1. category_id'si boş olan listing'leri keyset sayfalama ile akış halinde tara
+    rows = db.iter_rows('listings', 'id, product_id', filters=lambda q: q.is_('category_id', 'null'))
+    ghost_product_ids = [item['product_id'] for item in rows if item.get('product_id')]
 
     ghost_product_ids = list(set(ghost_product_ids))
     total_ghosts = len(ghost_product_ids)
@@ -27,26 +16,20 @@ def delete_ghost_products():
         print("Silinecek ürün yok.")
         return
         
-    print("Silme işlemi başlıyor (Foreign Key kısıtlamalarına karşı tüm alt tablolar temizlenecek)...")
-    
-    # Supabase limits 'in_' filter arrays to a reasonable size (e.g. 200)
-    batch_size = 200
-    for i in range(0, total_ghosts, batch_size):
-        batch_ids = ghost_product_ids[i:i+batch_size]
-        print(f"Batch {i//batch_size + 1}/{(total_ghosts // batch_size) + 1} siliniyor...")
-        
-        # We must ignore errors if table is empty or constraints act up, but usually it works.
-        try:
-            db.client.table('listings').delete().in_('product_id', batch_ids).execute()
-            db.client.table('sources').delete().in_('product_id', batch_ids).execute()
-            db.client.table('product_base_content').delete().in_('product_id', batch_ids).execute()
-            db.client.table('product_logistics').delete().in_('product_id', batch_ids).execute()
-            
-            # Finally delete the core product
-            db.client.table('core_products').delete().in_('id', batch_ids).execute()
-        except Exception as e:
-            print(f"Hata oluştu Batch {i}: {e}")
-            
+    # Önce kuru çalıştırma: hangi tablodan kaç satır gideceğini göster
+    plan = db.purge_products(product_ids=ghost_product_ids, dry_run=True)
+    print("Silinecek satırlar: " + ", ".join(f"{t}={n}" for t, n in plan.items() if t != "errors"))
+
+    print("Silme işlemi başlıyor (alt tablolar sunucu tarafında aynı transaction içinde temizlenecek)...")
+    start = time.time()
+    result = db.purge_products(
+        product_ids=ghost_product_ids,
+        progress=lambda done, total: print(f"Batch {done}/{total} silindi..."),
+    )
+    if result["errors"]:
+        print(f"Hata oluştu: {result['errors']} ürün silinemedi.")
+    print(f"Silinen ürün: {result.get('core_products', 0)} ({time.time() - start:.1f} sn)")
+
     print("✅ Temizlik başarıyla tamamlandı!")
 
 if __name__ == "__main__":
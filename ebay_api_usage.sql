@@ -0,0 +1,46 @@
+-- eBay API ailesi (trading / inventory) başına günlük çağrı sayacı.
+-- eBay limitleri uygulama geneli ve Pasifik saatiyle günlüktür; bu yüzden sayaç tüm süreçlerin
+-- (senkron EbayManager ve ebay_async.AsyncEbayManager) ortak kullandığı bu tabloda tutulur.
+-- Süreçler her çağrıda değil, reserve_ebay_calls ile bloklar halinde pay ayırır.
+-- Python tarafı: ebay_core.DailyCallBudget
+
+CREATE TABLE IF NOT EXISTS ebay_api_usage (
+    family TEXT NOT NULL,
+    day DATE NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (family, day)
+);
+
+-- Günlük limiti aşmadan en fazla p_calls çağrılık pay ayırır; ayrılan sayıyı döndürür (0 = bütçe doldu).
+CREATE OR REPLACE FUNCTION public.reserve_ebay_calls(p_family TEXT, p_day DATE, p_calls INT, p_limit INT)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_used INT;
+    v_granted INT;
+BEGIN
+    INSERT INTO ebay_api_usage (family, day, calls)
+    VALUES (p_family, p_day, 0)
+    ON CONFLICT (family, day) DO NOTHING;
+
+    -- Satır kilidi: eşzamanlı süreçler aynı payı iki kez alamaz
+    SELECT calls INTO v_used
+    FROM ebay_api_usage
+    WHERE family = p_family AND day = p_day
+    FOR UPDATE;
+
+    v_granted := GREATEST(0, LEAST(p_calls, p_limit - v_used));
+    IF v_granted > 0 THEN
+        UPDATE ebay_api_usage
+        SET calls = calls + v_granted,
+            updated_at = NOW()
+        WHERE family = p_family AND day = p_day;
+    END IF;
+    RETURN v_granted;
+END;
+$$;
+
+-- PostgREST şema önbelleğini yenile ki RPC hemen görünsün
+NOTIFY pgrst, 'reload schema';
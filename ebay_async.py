@@ -0,0 +1,309 @@
+"""
+eBay API'nin asyncio istemcisi (AsyncEbayManager).
+
+Senkron EbayManager ile aynı işlemleri (revize, stok/fiyat, offer sorgusu, GetSellerList, görsel yükleme)
+aiohttp üzerinden eşzamanlı yapar:
+    - aynı anda en fazla EBAY_ASYNC_CONCURRENCY istek (keep-alive havuzu da bu boyutta),
+    - API ailesi başına token bucket: saniyelik hız + patlama kapasitesi,
+    - günlük çağrı bütçesi senkron EbayManager ve diğer süreçlerle ortaktır (ebay_core.DailyCallBudget,
+      ebay_api_usage tablosu; eBay günlük limitleri Pasifik saatiyle gece yarısı sıfırlanır),
+    - 429/5xx ve bağlantı hatalarında EbayManager ile aynı idempotency kurallarıyla jitter'lı tekrar,
+    - OAuth token'ı ebay_core.token_cache'ten (single-flight) alınır.
+
+Kullanım:
+    async with AsyncEbayManager(store_id) as ebay:
+        results = await asyncio.gather(*(ebay.revise_item(i, p) for i, p in work))
+"""
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Optional
+
+import aiohttp
+
+from ebay_core import (
+    EbayManager, TRADING_API_URL, RETRY_STATUSES, IDEMPOTENT_METHODS, MAX_INVENTORY_STATUS_PER_CALL, MAX_BULK_INVENTORY_PER_CALL,
+    CallBudgetExceeded, DailyCallBudget, get_call_budget, rate_limits,
+    build_bulk_price_quantity_request, parse_bulk_price_quantity_response, parse_bulk_get_inventory_response, parse_offers_response,
+    CHANNEL_API_INVENTORY, CHANNEL_API_TRADING, channel_cache, apply_channel_info, merge_channel_info, classification,
+    token_cache, auth_token_from_headers, with_auth_token,
+    trading_headers, trading_ack_ok, build_revise_item_xml, build_revise_inventory_status_xml,
+    build_revise_inventory_status_batch_xml, parse_revise_inventory_status_response, build_get_seller_list_xml, build_upload_picture_xml, parse_upload_picture_response,
+)
+
+DEFAULT_CONCURRENCY = 16
+
+EbayResponse = namedtuple("EbayResponse", ["status", "text", "headers"])
+
+
+class TokenBucket:
+    """
+    Saniyede rate token dolan, en fazla capacity token biriktiren kova; budget verilirse her token ortak
+    günlük bütçeden de bir çağrı düşer. Durum threading.Lock ile korunur (event loop'a bağlı değildir;
+    ardışık asyncio.run çağrıları ve thread'ler aynı kovayı paylaşabilir). Bekleme kilit dışında
+    asyncio.sleep ile, bütçe payının DB'den ayrılması event loop'u tutmamak için bir thread'de yapılır.
+    """
+
+    def __init__(self, rate: float, capacity: int, budget: Optional[DailyCallBudget] = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.budget = budget
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take(self) -> float:
+        """Token alınabildiyse 0, alınamadıysa beklenecek süre (saniye)."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        if self.budget is not None and not self.budget.take_nowait():
+            await asyncio.to_thread(self.budget.take)  # Bütçe dolduysa CallBudgetExceeded
+        while True:
+            wait = self._try_take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(family: str) -> TokenBucket:
+    """Süreç genelinde API ailesi başına tek kova (limitler uygulama başınadır, manager başına değil)."""
+    with _buckets_lock:
+        bucket = _buckets.get(family)
+        if bucket is None:
+            rate, capacity, _ = rate_limits(family)
+            bucket = _buckets[family] = TokenBucket(rate, capacity, get_call_budget(family))
+        return bucket
+
+
+class AsyncEbayManager:
+    def __init__(self, store_id, concurrency: int = None):
+        self.store_id = store_id
+        # Token önbelleği, retry ayarları ve uç noktalar senkron manager'dan gelir (requests oturumu tembeldir, açılmaz)
+        self.sync = EbayManager(store_id)
+        self.base_url = self.sync.base_url
+        self.concurrency = concurrency or int(os.getenv("EBAY_ASYNC_CONCURRENCY", DEFAULT_CONCURRENCY))
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        # aiohttp oturumu event loop'a bağlıdır: her asyncio.run() içinde yeniden açılır
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(sock_connect=self.sync.timeout[0], sock_read=self.sync.timeout[1]),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+        self._session = None
+
+    async def _request(self, family: str, method: str, url: str, idempotent: bool = None, **kwargs) -> EbayResponse:
+        """
+        EbayManager._request'in async hali; her deneme önce ailenin kovasından token alır.
+        data_factory verilirse gövde her denemede yeniden üretilir (aiohttp FormData tek kullanımlıktır).
+        """
+        method = method.upper()
+        data_factory = kwargs.pop("data_factory", None)
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        bucket = get_bucket(family)
+        retries = self.sync.max_retries
+        auth_retried = False
+
+        for attempt in range(retries + 1):
+            last_attempt = attempt == retries
+            await bucket.acquire()
+            if data_factory is not None:
+                kwargs["data"] = data_factory()
+            try:
+                async with self._semaphore:
+                    async with self._session.request(method, url, **kwargs) as resp:
+                        response = EbayResponse(resp.status, await resp.text(), resp.headers.copy())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Bağlantı kurulamadıysa istek sunucuya ulaşmamıştır: her metod için güvenle tekrarlanır
+                sent = not isinstance(e, aiohttp.ClientConnectorError)
+                if last_attempt or (sent and not idempotent):
+                    raise
+                await asyncio.sleep(self.sync._backoff_delay(attempt))
+                continue
+
+            # 401: EbayManager._request ile aynı; bir kez yeni token'la tekrar denenir
+            rejected = auth_token_from_headers(kwargs.get("headers")) if response.status == 401 and not auth_retried else None
+            if rejected and not last_attempt:
+                auth_retried = True
+                fresh = await asyncio.to_thread(token_cache.on_unauthorized, self.sync, rejected)
+                if fresh and fresh != rejected:
+                    kwargs["headers"] = with_auth_token(kwargs["headers"], fresh)
+                    continue
+
+            retryable = response.status == 429 or (idempotent and response.status in RETRY_STATUSES)
+            if not retryable or last_attempt:
+                return response
+            await asyncio.sleep(self.sync._backoff_delay(attempt, response))
+
+    async def _trading(self, call_name: str, xml_payload: str, idempotent: bool = True, compatibility_level: str = "1311") -> EbayResponse:
+        token = await self.sync.get_valid_token_async()
+        headers = trading_headers(call_name, token, compatibility_level)
+        return await self._request("trading", "POST", TRADING_API_URL, idempotent=idempotent, headers=headers, data=xml_payload.encode("utf-8"))
+
+    async def _rest_headers(self) -> dict:
+        token = await self.sync.get_valid_token_async()
+        return {"Authorization": f"Bearer {token}", "Content-Language": "en-US", "Content-Type": "application/json"}
+
+    # ---------------------------------------------------------
+    # İşlemler (EbayManager ile aynı dönüş biçimleri)
+    # ---------------------------------------------------------
+    async def revise_item(self, item_id, payload: dict) -> dict:
+        """ReviseFixedPriceItem (EbayManager.revise_item_xml)."""
+        response = await self._trading("ReviseFixedPriceItem", build_revise_item_xml(item_id, payload))
+        if trading_ack_ok(response.text):
+            return {"success": True, "message": f"[{item_id}] başarıyla güncellendi."}
+        return {"success": False, "message": f"[{item_id}] Güncelleme Hatası: {response.text}"}
+
+    async def revise_inventory_status(self, sku, item_id, new_price, new_qty) -> dict:
+        """ReviseInventoryStatus ile tek ilanın fiyat ve stoğu."""
+        response = await self._trading("ReviseInventoryStatus", build_revise_inventory_status_xml(sku, item_id, new_price, new_qty))
+        if trading_ack_ok(response.text):
+            return {"success": True, "message": f"[{sku}] Fiyat=${new_price}, Stok={new_qty}"}
+        return {"success": False, "message": f"[{sku}] Trading API Hatası: {response.text}"}
+
+    async def revise_inventory_status_batch(self, entries) -> list:
+        """EbayManager.revise_inventory_status_batch'in eşzamanlı hali: 4'erli gruplar paralel gönderilir."""
+        async def send(chunk):
+            try:
+                response = await self._trading("ReviseInventoryStatus", build_revise_inventory_status_batch_xml(chunk))
+                return parse_revise_inventory_status_response(response.text, chunk)
+            except Exception as e:
+                return [{"sku": c.get("sku"), "item_id": c.get("item_id"), "success": False, "message": f"{type(e).__name__}: {e}"} for c in chunk]
+
+        chunks = [entries[i:i + MAX_INVENTORY_STATUS_PER_CALL] for i in range(0, len(entries), MAX_INVENTORY_STATUS_PER_CALL)]
+        grouped = await asyncio.gather(*(send(chunk) for chunk in chunks))
+        return [result for results in grouped for result in results]
+
+    async def get_offer(self, sku):
+        """EbayManager.get_offer: (offer_id, item_id); offer yoksa (None, None), belirsiz hatada None."""
+        response = await self._request("inventory", "GET", f"{self.base_url}/offer", headers=await self._rest_headers(), params={"sku": sku})
+        return parse_offers_response(response.status, json.loads(response.text) if response.status == 200 else None)
+
+    async def bulk_get_inventory_skus(self, skus) -> dict:
+        """EbayManager.bulk_get_inventory_skus: 25'erli gruplar paralel sorgulanır."""
+        async def send(chunk):
+            body = json.dumps({"requests": [{"sku": sku} for sku in chunk]})
+            response = await self._request("inventory", "POST", f"{self.base_url}/bulk_get_inventory_item", idempotent=True,
+                                           headers=await self._rest_headers(), data=body)
+            if response.status in (200, 207):
+                return parse_bulk_get_inventory_response(json.loads(response.text))
+            print(f"bulk_get_inventory_item Hatası ({response.status}): {response.text[:300]}")
+            return {}
+
+        skus = list(skus)
+        chunks = [skus[i:i + MAX_BULK_INVENTORY_PER_CALL] for i in range(0, len(skus), MAX_BULK_INVENTORY_PER_CALL)]
+        managed = {}
+        for part in await asyncio.gather(*(send(chunk) for chunk in chunks)):
+            managed.update(part)
+        return managed
+
+    async def classify_skus(self, skus) -> dict:
+        """EbayManager.classify_skus: offer aramaları eşzamanlı yapılır, sonuç channel_cache'e yazılır."""
+        managed = await self.bulk_get_inventory_skus(skus)
+        lookups = [sku for sku, is_managed in managed.items() if is_managed]
+        offers = dict(zip(lookups, await asyncio.gather(*(self.get_offer(sku) for sku in lookups))))
+
+        found = {}
+        for sku, is_managed in managed.items():
+            offer = offers[sku] if is_managed else (None, None)
+            if offer is None:
+                continue
+            found[sku] = classification(is_managed, offer)
+            channel_cache.record(self.store_id, sku, **found[sku])
+        return found
+
+    async def bulk_update_price_quantity(self, entries) -> list:
+        """EbayManager.bulk_update_price_quantity: 25'erli gruplar paralel gönderilir."""
+        async def send(chunk):
+            try:
+                body = json.dumps(build_bulk_price_quantity_request(chunk))
+                response = await self._request("inventory", "POST", f"{self.base_url}/bulk_update_price_quantity", idempotent=True,
+                                               headers=await self._rest_headers(), data=body)
+                data = json.loads(response.text) if response.text else None
+                return parse_bulk_price_quantity_response(response.status, data, chunk)
+            except Exception as e:
+                return [{"sku": c["sku"], "item_id": c.get("item_id"), "success": False, "legacy": False, "message": f"{type(e).__name__}: {e}"} for c in chunk]
+
+        chunks = [entries[i:i + MAX_BULK_INVENTORY_PER_CALL] for i in range(0, len(entries), MAX_BULK_INVENTORY_PER_CALL)]
+        grouped = await asyncio.gather(*(send(chunk) for chunk in chunks))
+        return [result for results in grouped for result in results]
+
+    async def update_prices_and_quantities(self, entries) -> list:
+        """EbayManager.update_prices_and_quantities ile aynı akış (kayıtlı kanal bilgisi, Inventory API bulk, legacy SKU'lar Trading API)."""
+        # channel_cache ilk kullanımda DB'den yüklenir: olay döngüsünü bloklamasın
+        entries = await asyncio.to_thread(apply_channel_info, self.store_id, entries)
+        unknown = [e["sku"] for e in entries if e.get("sku") and not e.get("api") and not e.get("offer_id")]
+        if unknown:
+            merge_channel_info(entries, await self.classify_skus(unknown))
+
+        rest = [i for i, e in enumerate(entries) if e.get("offer_id") and e.get("api") != CHANNEL_API_TRADING]
+        results = [None] * len(entries)
+        for i, result in zip(rest, await self.bulk_update_price_quantity([entries[i] for i in rest])):
+            if result.pop("legacy"):
+                channel_cache.record(self.store_id, entries[i]["sku"], None)
+            else:
+                results[i] = dict(result, path=CHANNEL_API_INVENTORY)
+
+        trading = [i for i, r in enumerate(results) if r is None]
+        for i, result in zip(trading, await self.revise_inventory_status_batch([entries[i] for i in trading])):
+            results[i] = dict(result, path=CHANNEL_API_TRADING)
+        return results
+
+    async def update_price_and_quantity(self, sku, new_price, new_qty, item_id=None) -> dict:
+        """Tek ilan için update_prices_and_quantities."""
+        return (await self.update_prices_and_quantities([{"sku": sku, "item_id": item_id, "price": new_price, "quantity": new_qty}]))[0]
+
+    async def get_seller_list(self, page, output_selectors, entries_per_page=100) -> Optional[str]:
+        """GetSellerList'in bir sayfasının ham XML'i (HTTP hatasında None)."""
+        xml_payload = build_get_seller_list_xml(page, output_selectors, entries_per_page)
+        response = await self._trading("GetSellerList", xml_payload, compatibility_level="1199")
+        if response.status == 200:
+            return response.text
+        print(f"HTTP Error {response.status}: {response.text[:500]}")
+        return None
+
+    async def upload_site_hosted_picture(self, base64_img, extension="jpg", pic_name="image") -> dict:
+        """UploadSiteHostedPictures (EbayManager.upload_site_hosted_picture)."""
+        token = await self.sync.get_valid_token_async()
+        headers = trading_headers("UploadSiteHostedPictures", token)
+        del headers["Content-Type"]  # multipart sınırını aiohttp belirler
+
+        xml_payload = build_upload_picture_xml(pic_name)
+        image = base64.b64decode(base64_img)
+
+        def make_form():
+            form = aiohttp.FormData()
+            form.add_field("XML Payload", xml_payload, content_type="text/xml")
+            form.add_field("image", image, filename=f"{pic_name}.{extension}", content_type="application/octet-stream")
+            return form
+
+        try:
+            response = await self._request("trading", "POST", TRADING_API_URL, idempotent=True, headers=headers, data_factory=make_form)
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+        return parse_upload_picture_response(response.text)
@@ -1,17 +1,708 @@
+import asyncio
+import os
+import queue
+import random
+import re
+import threading
+import time
 import requests
 import base64
-from datetime import datetime, timedelta
-import os
-from dotenv import load_dotenv
-from supabase import create_client
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
+from database import db
+from write_buffer import write_buffer
+
+TRADING_API_URL = "https://api.ebay.com/ws/api.dll"
+TRADING_NS = "{urn:ebay:apis:eBLBaseComponents}"
+MAX_INVENTORY_STATUS_PER_CALL = 4  # Trading API tek ReviseInventoryStatus isteğinde en fazla 4 ilan kabul eder
+MAX_BULK_INVENTORY_PER_CALL = 25   # Inventory API bulk_get_inventory_item / bulk_update_price_quantity üst sınırı
+# Bu hatalar SKU'nun Inventory API'de yönetilmediğini gösterir (Easync/legacy ilan): Trading API'ye düşülür.
+# 25702: SKU sistemde yok, 25710: kaynak bulunamadı, 25713: offer geçerli değil
+INVENTORY_LEGACY_ERROR_IDS = frozenset({25702, 25710, 25713})
+
+# listings.channel_api değerleri: ilanın fiyat/stoğu hangi API ile güncellenir
+CHANNEL_API_INVENTORY = "inventory"  # Sell Inventory API (offer'ı olan SKU)
+CHANNEL_API_TRADING = "trading"      # Trading API (Easync/legacy ilan)
+CHANNEL_COLUMNS = "id, channel_sku, channel_item_id, channel_offer_id, channel_api"
+
+# HTTP bağlantı havuzu ve yeniden deneme ayarları (EBAY_HTTP_* ortam değişkenleriyle değiştirilebilir)
+DEFAULT_POOL_SIZE = 20      # api.ebay.com'a açık tutulan keep-alive bağlantı sayısı
+DEFAULT_RETRIES = 4         # İlk denemeden sonra en fazla kaç kez tekrar denenir
+DEFAULT_BACKOFF = 0.5       # Üstel bekleme tabanı (saniye): 0.5, 1, 2, 4 ... (tam jitter ile)
+DEFAULT_BACKOFF_MAX = 30.0  # Tek beklemenin üst sınırı (saniye)
+DEFAULT_TIMEOUT = 60.0      # Okuma zaman aşımı (saniye); bağlantı kurma için 10 sn
+GET_SELLER_EVENTS_MAX_ITEMS = 3000  # GetSellerEvents sayfalama yapmaz; bu kadar ilan dönerse pencere daraltılmalı
+DEFAULT_SELLER_LIST_WORKERS = 6  # GetSellerList sayfalarını eşzamanlı çeken iş parçacığı (EBAY_SELLER_LIST_WORKERS)
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# API ailesi -> (saniyelik hız, patlama kapasitesi, günlük bütçe). EBAY_RATE_<AİLE>="hız,kapasite,günlük" ile değişir.
+# Trading: yeni uygulamaların varsayılan günlük limiti 5.000 (Application Growth Check sonrası 1.5M'ye kadar).
+# Inventory (Sell REST): 2.000.000 çağrı/gün. Hız/kapasite ebay_async'in token bucket'ında uygulanır;
+# günlük bütçe tüm süreçlerde ortaktır (DailyCallBudget, ebay_api_usage tablosu).
+DEFAULT_RATE_LIMITS = {
+    "trading": (10.0, 20, 5_000),
+    "inventory": (25.0, 50, 2_000_000),
+}
+DEFAULT_BUDGET_BLOCK = 50   # Günlük bütçeden tek DB rezervasyonunda ayrılan çağrı sayısı
+
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)  # Bu kadar süre kala token geçersiz sayılır, çağıran yenilemeyi bekler
+TOKEN_REFRESH_AHEAD = timedelta(seconds=int(os.getenv("EBAY_TOKEN_REFRESH_AHEAD", 900)))  # Arka plan yenileme penceresi
+TOKEN_REFRESH_RETRY = float(os.getenv("EBAY_TOKEN_REFRESH_RETRY", 60))  # Başarısız arka plan yenilemesinden sonra bekleme (saniye)
+
+
+def _is_connect_failure(error: Exception) -> bool:
+    """urllib3'ün NewConnectionError / DNS hatası gibi, istek gönderilmeden oluşan bağlantı hataları."""
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, "reason", reason)
+    return type(reason).__name__ in ("NewConnectionError", "NameResolutionError", "ConnectTimeoutError")
+
+
+# ---------------------------------------------------------
+# Trading API istek gövdeleri (senkron EbayManager ve ebay_async.AsyncEbayManager ortak kullanır)
+# ---------------------------------------------------------
+def auth_token_from_headers(headers):
+    """İstek başlıklarındaki kullanıcı token'ı (REST Bearer veya Trading IAF), yoksa None."""
+    if not headers:
+        return None
+    bearer = headers.get("Authorization") or ""
+    if bearer.startswith("Bearer "):
+        return bearer[len("Bearer "):]
+    return headers.get("X-EBAY-API-IAF-TOKEN")
+
+
+def with_auth_token(headers, token) -> dict:
+    headers = dict(headers)
+    if (headers.get("Authorization") or "").startswith("Bearer "):
+        headers["Authorization"] = f"Bearer {token}"
+    if "X-EBAY-API-IAF-TOKEN" in headers:
+        headers["X-EBAY-API-IAF-TOKEN"] = token
+    return headers
+
+
+def trading_headers(call_name: str, token: str, compatibility_level: str = "1311") -> dict:
+    return {
+        "Content-Type": "text/xml",
+        "X-EBAY-API-SITEID": "0", # 0 = ABD (US)
+        "X-EBAY-API-COMPATIBILITY-LEVEL": compatibility_level,
+        "X-EBAY-API-CALL-NAME": call_name,
+        "X-EBAY-API-IAF-TOKEN": token
+    }
+
+
+def trading_ack_ok(content: str) -> bool:
+    return "<Ack>Success</Ack>" in content or "<Ack>Warning</Ack>" in content
+
+
+def build_revise_inventory_status_xml(sku, item_id, new_price, new_qty) -> str:
+    return build_revise_inventory_status_batch_xml([{"sku": sku, "item_id": item_id, "price": new_price, "quantity": new_qty}])
+
+
+def build_revise_inventory_status_batch_xml(entries) -> str:
+    """
+    En fazla MAX_INVENTORY_STATUS_PER_CALL ilan için tek ReviseInventoryStatus isteği.
+    entries: {"sku", "item_id", "price", "quantity"} sözlükleri; price veya quantity None ise o alan gönderilmez.
+    """
+    blocks = []
+    for entry in entries:
+        item_identifier = f"<ItemID>{entry['item_id']}</ItemID>" if entry.get("item_id") else f"<SKU>{entry['sku']}</SKU>"
+        fields = ""
+        if entry.get("price") is not None:
+            fields += f"<StartPrice>{entry['price']}</StartPrice>"
+        if entry.get("quantity") is not None:
+            fields += f"<Quantity>{entry['quantity']}</Quantity>"
+        blocks.append(f"""  <InventoryStatus>
+    {item_identifier}
+    {fields}
+  </InventoryStatus>""")
+    inventory_status = "\n".join(blocks)
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<ReviseInventoryStatusRequest xmlns="urn:ebay:apis:eBLBaseComponents">
+  <ErrorLanguage>en_US</ErrorLanguage>
+  <WarningLevel>High</WarningLevel>
+{inventory_status}
+</ReviseInventoryStatusRequest>
+"""
+
+
+def parse_revise_inventory_status_response(content: str, entries) -> list:
+    """
+    Toplu ReviseInventoryStatus yanıtını ilan bazında sonuca çevirir (entries ile aynı sırada):
+    {"sku", "item_id", "success", "message"}. Yanıtta InventoryStatus olarak dönen ilanlar başarılıdır;
+    diğerlerine ErrorParameters'ında ItemID/SKU'su geçen hatalar, yoksa isteğin genel hataları yazılır.
+    Yanıt bazı ilanları yansıtıyor (veya Error seviyeli hata içeriyor) ama bir ilanı yansıtmıyorsa o ilan
+    başarısız sayılır.
+    """
+    def result(entry, success, message):
+        return {"sku": entry.get("sku"), "item_id": entry.get("item_id"), "success": success, "message": message}
+
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return [result(e, False, f"Geçersiz yanıt: {content[:500]}") for e in entries]
+
+    revised = set()
+    for status in root.iter(f"{TRADING_NS}InventoryStatus"):
+        revised.update(filter(None, (status.findtext(f"{TRADING_NS}ItemID"), status.findtext(f"{TRADING_NS}SKU"))))
+
+    errors = []
+    for error in root.iter(f"{TRADING_NS}Errors"):
+        if error.findtext(f"{TRADING_NS}SeverityCode") != "Error":
+            continue
+        text = error.findtext(f"{TRADING_NS}LongMessage") or error.findtext(f"{TRADING_NS}ShortMessage") or ""
+        params = {p.findtext(f"{TRADING_NS}Value") for p in error.iter(f"{TRADING_NS}ErrorParameters")}
+        errors.append((f"{error.findtext(f'{TRADING_NS}ErrorCode')}: {text}", params))
+
+    ack = root.findtext(f"{TRADING_NS}Ack")
+    results = []
+    for entry in entries:
+        ids = {str(v) for v in (entry.get("item_id"), entry.get("sku")) if v}
+        if ids & revised:
+            results.append(result(entry, True, "OK"))
+            continue
+        own_errors = [message for message, params in errors if ids & params]
+        if own_errors:
+            results.append(result(entry, False, " | ".join(own_errors)))
+        elif ack in ("Success", "Warning") and not revised and not errors:
+            # eBay hiçbir ilanı yansıtmadıysa ve hata yoksa istek bütünüyle başarılıdır
+            results.append(result(entry, True, "OK"))
+        elif ack in ("Success", "Warning"):
+            # Diğer ilanlar yansıtıldı (veya Error seviyeli hata var) ama bu ilan yok: güncellendiği kesin değil,
+            # başarısız sayılır ki needs_sync kuyrukta kalsın
+            general = [m for m, params in errors if not params]
+            results.append(result(entry, False, " | ".join(general) or "Yanıtta InventoryStatus yok"))
+        else:
+            results.append(result(entry, False, " | ".join(m for m, _ in errors) or f"Ack={ack}"))
+    return results
+
+
+def build_revise_item_xml(item_id, payload: dict) -> str:
+    """ReviseFixedPriceItem: sadece payload içinde gelen alanlar değiştirilir (kısmi güncelleme)."""
+    dynamic_fields = ""
+    
+    if payload.get("StartPrice") is not None:
+        dynamic_fields += f"<StartPrice currencyID=\"USD\">{payload['StartPrice']}</StartPrice>\n"
+        
+    if payload.get("Quantity") is not None:
+        dynamic_fields += f"<Quantity>{payload['Quantity']}</Quantity>\n"
+        
+    if payload.get("CategoryID"):
+        dynamic_fields += f"<PrimaryCategory><CategoryID>{payload['CategoryID']}</CategoryID></PrimaryCategory>\n"
+        
+    # Politikalar (Profiles) geliyorsa
+    profiles = payload.get("SellerProfiles", {})
+    if profiles:
+        dynamic_fields += "<SellerProfiles>\n"
+        if profiles.get('PaymentProfileID'):
+            dynamic_fields += f"  <SellerPaymentProfile><PaymentProfileID>{profiles['PaymentProfileID']}</PaymentProfileID></SellerPaymentProfile>\n"
+        if profiles.get('ReturnProfileID'):
+            dynamic_fields += f"  <SellerReturnProfile><ReturnProfileID>{profiles['ReturnProfileID']}</ReturnProfileID></SellerReturnProfile>\n"
+        if profiles.get('ShippingProfileID'):
+            dynamic_fields += f"  <SellerShippingProfile><ShippingProfileID>{profiles['ShippingProfileID']}</ShippingProfileID></SellerShippingProfile>\n"
+        dynamic_fields += "</SellerProfiles>\n"
+
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<ReviseFixedPriceItemRequest xmlns="urn:ebay:apis:eBLBaseComponents">
+  <ErrorLanguage>en_US</ErrorLanguage>
+  <WarningLevel>High</WarningLevel>
+  <Item>
+    <ItemID>{item_id}</ItemID>
+    {dynamic_fields}
+  </Item>
+</ReviseFixedPriceItemRequest>"""
+
+
+def build_bulk_price_quantity_request(entries) -> dict:
+    """
+    bulk_update_price_quantity gövdesi (en fazla 25 SKU). offer_id bilinen girdilerde fiyat (ve offer stoğu)
+    offer üzerinden, stok ayrıca SKU'nun shipToLocationAvailability'si üzerinden yazılır.
+    """
+    requests_ = []
+    for entry in entries:
+        request = {"sku": entry["sku"]}
+        if entry.get("quantity") is not None:
+            request["shipToLocationAvailability"] = {"quantity": int(entry["quantity"])}
+        if entry.get("offer_id"):
+            offer = {"offerId": entry["offer_id"]}
+            if entry.get("price") is not None:
+                offer["price"] = {"value": f"{float(entry['price']):.2f}", "currency": "USD"}
+            if entry.get("quantity") is not None:
+                offer["availableQuantity"] = int(entry["quantity"])
+            request["offers"] = [offer]
+        requests_.append(request)
+    return {"requests": requests_}
+
+
+def parse_bulk_price_quantity_response(status_code: int, data, entries) -> list:
+    """
+    bulk_update_price_quantity yanıtını SKU bazında sonuca çevirir (entries sırasıyla):
+    {"sku", "item_id", "success", "message", "legacy"}. legacy=True olanlar Trading API ile tekrar denenmeli.
+    Yanıtta aynı SKU için birden fazla satır (SKU + offer) olabilir; biri bile hatalıysa SKU başarısız sayılır.
+    """
+    by_sku = {}
+    for response in (data or {}).get("responses", []) if isinstance(data, dict) else []:
+        by_sku.setdefault(response.get("sku"), []).append(response)
+
+    results = []
+    for entry in entries:
+        responses = by_sku.get(entry["sku"])
+        base = {"sku": entry["sku"], "item_id": entry.get("item_id")}
+        if not responses:
+            results.append(dict(base, success=False, legacy=False, message=f"HTTP {status_code}: SKU yanıtta yok"))
+            continue
+        errors = [e for r in responses if r.get("statusCode") not in (200, 204) for e in (r.get("errors") or [{}])]
+        if not errors:
+            results.append(dict(base, success=True, legacy=False, message="OK"))
+            continue
+        legacy = all(e.get("errorId") in INVENTORY_LEGACY_ERROR_IDS for e in errors)
+        message = " | ".join(f"{e.get('errorId')}: {e.get('message')}" for e in errors)
+        results.append(dict(base, success=False, legacy=legacy, message=message))
+    return results
+
+
+def parse_bulk_get_inventory_response(data) -> dict:
+    """
+    bulk_get_inventory_item yanıtı -> {sku: Inventory API'de kayıtlı mı}. Sadece kesin yanıtlar (200 / 404)
+    döner; diğer hatalardaki SKU'lar sınıflanmamış kalır.
+    """
+    responses = (data or {}).get("responses", []) if isinstance(data, dict) else []
+    return {r.get("sku"): r.get("statusCode") == 200 for r in responses if r.get("statusCode") in (200, 404)}
+
+
+def parse_offers_response(status_code: int, data):
+    """GET offer?sku= yanıtı -> (offer_id, item_id); offer yoksa (None, None), belirsiz hatada None."""
+    if status_code == 404:
+        return None, None
+    if status_code != 200:
+        return None
+    offers = (data or {}).get("offers") or []
+    if not offers:
+        return None, None
+    return offers[0].get("offerId"), (offers[0].get("listing") or {}).get("listingId")
+
+
+def build_get_seller_list_xml(page: int, output_selectors, entries_per_page: int = 100, days_ahead: int = 119) -> str:
+    """Önümüzdeki days_ahead gün içinde bitecek (yani aktif GTC) ilanların bir sayfası."""
+    now = datetime.utcnow()
+    end_from = now.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    end_to = (now + timedelta(days=days_ahead)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    selectors = "\n".join(f"  <OutputSelector>{s}</OutputSelector>" for s in output_selectors)
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<GetSellerListRequest xmlns="urn:ebay:apis:eBLBaseComponents">
+  <ErrorLanguage>en_US</ErrorLanguage>
+  <DetailLevel>ItemReturnDescription</DetailLevel>
+  <Pagination>
+    <EntriesPerPage>{entries_per_page}</EntriesPerPage>
+    <PageNumber>{page}</PageNumber>
+  </Pagination>
+  <EndTimeFrom>{end_from}</EndTimeFrom>
+  <EndTimeTo>{end_to}</EndTimeTo>
+{selectors}
+</GetSellerListRequest>
+"""
 
-load_dotenv()
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL or SUPABASE_KEY is missing in .env")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+def build_get_seller_events_xml(mod_time_from: datetime, mod_time_to: datetime, output_selectors) -> str:
+    """[mod_time_from, mod_time_to) aralığında değişen (fiyat, stok, revize, biten) ilanlar; zamanlar UTC."""
+    selectors = "\n".join(f"  <OutputSelector>{s}</OutputSelector>" for s in output_selectors)
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<GetSellerEventsRequest xmlns="urn:ebay:apis:eBLBaseComponents">
+  <ErrorLanguage>en_US</ErrorLanguage>
+  <DetailLevel>ReturnAll</DetailLevel>
+  <ModTimeFrom>{mod_time_from.strftime("%Y-%m-%dT%H:%M:%S.000Z")}</ModTimeFrom>
+  <ModTimeTo>{mod_time_to.strftime("%Y-%m-%dT%H:%M:%S.000Z")}</ModTimeTo>
+{selectors}
+</GetSellerEventsRequest>
+"""
+
+
+class SellerListPageError(Exception):
+    """GetSellerList sayfası tekrar denemelerden sonra da alınamadı (HTTP hatası veya Ack=Failure)."""
+
+    def __init__(self, page: int, message: str):
+        super().__init__(f"GetSellerList sayfa {page}: {message}")
+        self.page = page
+
+
+class SellerListStream:
+    """
+    GetSellerList yanıtının artımlı ayrıştırıcısı (XMLPullParser): yanıt parçaları geldikçe feed() ile verilir,
+    tamamlanan her ItemArray/Item elemanı hemen döner ve ağaçtan koparılır (bellekte sayfanın tamamı tutulmaz).
+    PaginationResult, Ack ve hata mesajları okundukça alanlara yazılır (eBay bunları ItemArray'den önce gönderir).
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack = []
+        self.total_pages = None
+        self.total_entries = None
+        self.ack = None
+        self.errors = []
+
+    def feed(self, chunk: bytes) -> list:
+        self._parser.feed(chunk)
+        return self._drain()
+
+    def close(self) -> list:
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> list:
+        items = []
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._stack.append(elem)
+                continue
+            self._stack.pop()
+            parent = self._stack[-1] if self._stack else None
+            tag = elem.tag
+            if tag == f"{TRADING_NS}Item" and parent is not None and parent.tag == f"{TRADING_NS}ItemArray":
+                parent.remove(elem)
+                items.append(elem)
+            elif tag == f"{TRADING_NS}TotalNumberOfPages":
+                self.total_pages = int(elem.text or 0)
+            elif tag == f"{TRADING_NS}TotalNumberOfEntries":
+                self.total_entries = int(elem.text or 0)
+            elif tag == f"{TRADING_NS}Ack" and len(self._stack) == 1:
+                self.ack = elem.text
+            elif tag == f"{TRADING_NS}LongMessage":
+                self.errors.append(elem.text)
+        return items
+
+
+def build_upload_picture_xml(pic_name: str) -> str:
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<UploadSiteHostedPicturesRequest xmlns="urn:ebay:apis:eBLBaseComponents">
+  <ErrorLanguage>en_US</ErrorLanguage>
+  <WarningLevel>High</WarningLevel>
+  <PictureName>{pic_name}</PictureName>
+  <PictureSet>Supersize</PictureSet>
+  <ExtensionInDays>30</ExtensionInDays>
+</UploadSiteHostedPicturesRequest>"""
+
+
+def parse_upload_picture_response(content: str) -> dict:
+    """UploadSiteHostedPictures yanıtı -> {"success", "url"} veya {"success": False, "message"}."""
+    if trading_ack_ok(content):
+        match = re.search(r"<FullURL>(.*?)</FullURL>", content)
+        if match:
+            return {"success": True, "url": match.group(1)}
+    return {"success": False, "message": content[:1000]}
+
+
+class _TokenCache:
+    """
+    Süreç içi, mağaza başına OAuth access token önbelleği.
+    stores tablosu sadece ilk kullanımda okunur; token bellekte son kullanma zamanıyla tutulur.
+    Süresine TOKEN_REFRESH_AHEAD kala ilk erişim arka planda tek bir yenileme başlatır (çağıranlar mevcut
+    token'la devam eder); başarısız olursa TOKEN_REFRESH_RETRY saniye yeniden denenmez. Süresi dolmuşsa yenileme mağaza kilidi altında yapılır: aynı anda bekleyen
+    thread'lerden (ve asyncio görevlerinden, get_valid_token_async ile) sadece biri eBay'e gider (single-flight).
+    """
+
+    def __init__(self):
+        self._entries: dict = {}
+        self._locks: dict = {}
+        self._refreshing: set = set()
+        self._failed_at: dict = {}  # store_id -> son başarısız arka plan yenilemesi (monotonic)
+        self._guard = threading.Lock()
+
+    def _lock_for(self, store_id) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(store_id, threading.Lock())
+
+    def _put(self, store_id, config: dict) -> dict:
+        entry = {
+            "token": config.get("access_token"),
+            "expires_at": datetime.fromisoformat(config.get("expires_at", "2000-01-01T00:00:00")),
+            "config": config,
+        }
+        self._entries[store_id] = entry
+        return entry
+
+    def peek(self, manager: "EbayManager"):
+        """Geçerli token bellekteyse döndürür (gerekirse arka plan yenilemesini tetikler), değilse None. G/Ç yapmaz."""
+        entry = self._entries.get(manager.store_id)
+        if entry is None:
+            return None
+        now = datetime.now()
+        if now >= entry["expires_at"] - TOKEN_EXPIRY_MARGIN:
+            return None
+        if now >= entry["expires_at"] - TOKEN_REFRESH_AHEAD:
+            self._refresh_in_background(manager)
+        return entry["token"]
+
+    def get(self, manager: "EbayManager") -> str:
+        token = self.peek(manager)
+        if token is not None:
+            return token
+        with self._lock_for(manager.store_id):
+            # Kilidi beklerken başka bir thread yenilemiş olabilir
+            entry = self._entries.get(manager.store_id)
+            if entry is None:
+                entry = self._put(manager.store_id, manager._load_api_config())
+            if datetime.now() >= entry["expires_at"] - TOKEN_EXPIRY_MARGIN:
+                print("Access Token süresi dolmuş veya dolmak üzere, yenileniyor...")
+                entry = self._refresh(manager, entry)
+            return entry["token"]
+
+    def _refresh(self, manager: "EbayManager", entry: dict) -> dict:
+        """Mağaza kilidi altında çağrılır. _refresh_token config'i günceller ve DB'ye yazar."""
+        config = dict(entry["config"])
+        manager._refresh_token(config)
+        return self._put(manager.store_id, config)
+
+    def _refresh_in_background(self, manager: "EbayManager"):
+        store_id = manager.store_id
+        with self._guard:
+            if store_id in self._refreshing:
+                return
+            failed_at = self._failed_at.get(store_id)
+            if failed_at is not None and time.monotonic() - failed_at < TOKEN_REFRESH_RETRY:
+                return
+            self._refreshing.add(store_id)
+
+        def work():
+            try:
+                with self._lock_for(store_id):
+                    entry = self._entries.get(store_id)
+                    if entry is not None and datetime.now() >= entry["expires_at"] - TOKEN_REFRESH_AHEAD:
+                        self._refresh(manager, entry)
+                self._failed_at.pop(store_id, None)
+            except Exception as e:
+                self._failed_at[store_id] = time.monotonic()
+                print(f"[eBay Token] Arka plan yenileme hatası ({TOKEN_REFRESH_RETRY:g} sn sonra tekrar denenecek): {e}")
+            finally:
+                with self._guard:
+                    self._refreshing.discard(store_id)
+
+        threading.Thread(target=work, name=f"ebay-token-{store_id}", daemon=True).start()
+
+    def on_unauthorized(self, manager: "EbayManager", rejected_token: str) -> str:
+        """
+        eBay token'ı 401 ile reddetti: yeni token döndürür (single-flight). Başka bir thread zaten
+        değiştirdiyse o kullanılır; değilse DB'den yeniden okunur (başka süreç yenilemiş olabilir),
+        DB'deki de reddedilen token ise yenilenir.
+        """
+        with self._lock_for(manager.store_id):
+            entry = self._entries.get(manager.store_id)
+            if entry is not None and entry["token"] != rejected_token:
+                return entry["token"]
+            self.invalidate(manager.store_id)
+            entry = self._put(manager.store_id, manager._load_api_config())
+            if entry["token"] == rejected_token:
+                print("[eBay Token] Token reddedildi (401), yenileniyor...")
+                entry = self._refresh(manager, entry)
+            return entry["token"]
+
+    def invalidate(self, store_id=None):
+        """Bellekteki token'ı düşürür; sonraki erişim DB'den yeniden okur (on_unauthorized kullanır)."""
+        with self._guard:
+            if store_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(store_id, None)
+
+
+token_cache = _TokenCache()
+
+
+try:
+    from zoneinfo import ZoneInfo
+    _EBAY_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:  # tzdata olmayan sistemler: yaz saati farkı göz ardı edilir
+    _EBAY_TZ = timezone(timedelta(hours=-8))
+
+
+def _ebay_day():
+    """eBay günlük limitleri Pasifik saatiyle gece yarısı sıfırlanır."""
+    return datetime.now(_EBAY_TZ).date()
+
+
+def rate_limits(family: str) -> tuple:
+    """API ailesinin (hız, kapasite, günlük bütçe) ayarı; EBAY_RATE_<AİLE> varsayılanları ezer."""
+    rate, capacity, daily = DEFAULT_RATE_LIMITS[family]
+    override = os.getenv(f"EBAY_RATE_{family.upper()}")
+    if override:
+        parts = [p.strip() for p in override.split(",")]
+        rate = float(parts[0])
+        capacity = int(parts[1]) if len(parts) > 1 and parts[1] else capacity
+        daily = int(parts[2]) if len(parts) > 2 and parts[2] else daily
+    return rate, capacity, daily
+
+
+class CallBudgetExceeded(Exception):
+    """API ailesinin günlük çağrı bütçesi (tüm süreçler toplamında) tükendi."""
+
+
+class DailyCallBudget:
+    """
+    API ailesinin uygulama genelindeki günlük çağrı bütçesi.
+    Sayaç ebay_api_usage tablosundadır: tüm süreçler, senkron EbayManager ve AsyncEbayManager aynı satırı
+    artırır. Her çağrıda DB'ye gitmemek için reserve_ebay_calls RPC'siyle block_size'lık pay ayrılır ve
+    süreç içinde tüketilir (süreç kapanırken kullanılmayan pay sayaçta kalır; hata güvenli tarafa düşer).
+    RPC'ye ulaşılamazsa süreç içi sayaçla aynı limite kadar devam edilir.
+    """
+
+    def __init__(self, family: str, daily_limit: int, block_size: int = DEFAULT_BUDGET_BLOCK):
+        self.family = family
+        self.daily_limit = daily_limit
+        self.block_size = block_size
+        self.used_today = 0  # Bu sürecin bugünkü çağrıları
+        self._granted = 0    # Ayrılmış ama henüz kullanılmamış pay
+        self._day = _ebay_day()
+        self._lock = threading.Lock()
+
+    def _roll_day(self):
+        day = _ebay_day()
+        if day != self._day:
+            self._day, self.used_today, self._granted = day, 0, 0
+
+    def take_nowait(self) -> bool:
+        """Ayrılmış paydan bir çağrı düşer; pay bittiyse (DB'ye gitmeden) False döner."""
+        with self._lock:
+            self._roll_day()
+            if not self._granted:
+                return False
+            self._granted -= 1
+            self.used_today += 1
+            return True
+
+    def take(self):
+        """Bir çağrılık bütçe alır; pay bittiyse DB'den yeni blok ayırır. Bütçe dolduysa CallBudgetExceeded."""
+        with self._lock:
+            self._roll_day()
+            if not self._granted:
+                self._granted = self._reserve()
+                if not self._granted:
+                    raise CallBudgetExceeded(f"Günlük eBay {self.family} çağrı bütçesi doldu ({self.daily_limit}).")
+            self._granted -= 1
+            self.used_today += 1
+
+    def _reserve(self) -> int:
+        try:
+            res = db.client.rpc("reserve_ebay_calls", {
+                "p_family": self.family,
+                "p_day": self._day.isoformat(),
+                "p_calls": self.block_size,
+                "p_limit": self.daily_limit,
+            }).execute()
+            return int(res.data or 0)
+        except Exception as e:
+            print(f"[eBay Bütçe] {self.family} payı ayrılamadı, süreç içi sayaçla devam: {e}")
+            return max(0, min(self.block_size, self.daily_limit - self.used_today))
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def get_call_budget(family: str):
+    """Süreç genelinde API ailesi başına tek bütçe nesnesi (günlük limit yoksa None)."""
+    with _budgets_lock:
+        if family not in _budgets:
+            daily = rate_limits(family)[2]
+            _budgets[family] = DailyCallBudget(family, daily) if daily else None
+        return _budgets[family]
+
+class _ChannelCache:
+    """
+    Mağaza başına SKU -> {listing_id, api, offer_id, item_id} eşlemesi (listings.channel_api / channel_offer_id /
+    channel_item_id). İlk kullanımda DB'den bir kez yüklenir; böylece fiyat/stok gönderimi her SKU için offer
+    araması yapmadan doğru uca gider. Yeni öğrenilen (veya değişen) sınıflama write_buffer ile ilana yazılır.
+    """
+
+    def __init__(self):
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def _store(self, store_id) -> dict:
+        with self._lock:
+            if store_id not in self._stores:
+                rows = db.iter_rows(
+                    "listings", CHANNEL_COLUMNS,
+                    filters=lambda q: q.eq("store_id", store_id).not_.is_("channel_sku", "null"),
+                )
+                self._stores[store_id] = {
+                    r["channel_sku"]: {
+                        "listing_id": r["id"],
+                        "api": r.get("channel_api"),
+                        "offer_id": r.get("channel_offer_id"),
+                        "item_id": r.get("channel_item_id"),
+                    }
+                    for r in rows
+                }
+            return self._stores[store_id]
+
+    def get(self, store_id, sku) -> dict:
+        """SKU'nun bilinen kanal bilgisi (bilinmiyorsa boş sözlük)."""
+        return dict(self._store(store_id).get(sku) or {})
+
+    def record(self, store_id, sku, api, offer_id=None, item_id=None):
+        """Sınıflamayı belleğe alır; değiştiyse ve SKU'nun ilanı biliniyorsa listings'e yazar (flush çağıranda)."""
+        store = self._store(store_id)
+        with self._lock:
+            entry = store.setdefault(sku, {"listing_id": None, "api": None, "offer_id": None, "item_id": None})
+            fields = {}
+            if entry["api"] != api:
+                fields["channel_api"] = api
+            if entry["offer_id"] != offer_id:
+                fields["channel_offer_id"] = offer_id
+            if item_id and entry["item_id"] != item_id:
+                fields["channel_item_id"] = item_id
+            entry.update(api=api, offer_id=offer_id, item_id=item_id or entry["item_id"])
+            listing_id = entry["listing_id"]
+        if fields and listing_id:
+            fields["channel_checked_at"] = datetime.now(timezone.utc).isoformat()
+            write_buffer.update("listings", listing_id, fields)
+
+    def reload(self, store_id):
+        """Mağazanın eşlemesini DB'den hemen yeniden yükler (başka süreçlerin yazdıkları dahil)."""
+        self.invalidate(store_id)
+        self._store(store_id)
+
+    def invalidate(self, store_id=None):
+        """Bellekteki eşlemeyi düşürür; sonraki erişim DB'den yeniden yükler."""
+        with self._lock:
+            if store_id is None:
+                self._stores.clear()
+            else:
+                self._stores.pop(store_id, None)
+
+
+channel_cache = _ChannelCache()
+
+
+def apply_channel_info(store_id, entries) -> list:
+    """
+    Gönderim girdilerinin kopyalarını channel_cache'teki api / offer_id / item_id ile tamamlar
+    (girdide açıkça verilen değerler korunur).
+    """
+    prepared = []
+    for entry in entries:
+        entry = dict(entry)
+        known = channel_cache.get(store_id, entry.get("sku")) if entry.get("sku") else {}
+        for field in ("api", "offer_id", "item_id"):
+            if not entry.get(field):
+                entry[field] = known.get(field)
+        prepared.append(entry)
+    return prepared
+
+
+def merge_channel_info(entries, found: dict):
+    """classify_skus sonucunu (SKU -> kanal bilgisi) henüz sınıflanmamış girdilere işler."""
+    for entry in entries:
+        info = found.get(entry.get("sku"))
+        if info and not entry.get("api"):
+            entry.update(api=info["api"], offer_id=info["offer_id"], item_id=entry.get("item_id") or info["item_id"])
+
+
+def classification(managed: bool, offer) -> dict:
+    """bulk_get_inventory_item + offer araması sonucunu kanal bilgisine çevirir (offer'sız SKU Trading API'ye gider)."""
+    offer_id, item_id = offer if managed and offer else (None, None)
+    return {"api": CHANNEL_API_INVENTORY if offer_id else CHANNEL_API_TRADING, "offer_id": offer_id, "item_id": item_id}
+
 
 class EbayManager:
     def __init__(self, store_id):
@@ -19,20 +710,117 @@ class EbayManager:
         self.base_url = "https://api.ebay.com/sell/inventory/v1"
         self.auth_url = "https://api.ebay.com/identity/v1/oauth2/token"
 
+        self.max_retries = int(os.getenv("EBAY_HTTP_RETRIES", DEFAULT_RETRIES))
+        self.backoff = float(os.getenv("EBAY_HTTP_BACKOFF", DEFAULT_BACKOFF))
+        self.backoff_max = float(os.getenv("EBAY_HTTP_BACKOFF_MAX", DEFAULT_BACKOFF_MAX))
+        self.timeout = (10.0, float(os.getenv("EBAY_HTTP_TIMEOUT", DEFAULT_TIMEOUT)))
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """HTTP oturumu ilk istekte kurulur (AsyncEbayManager gibi sadece ayar/token için kullananlar kurmaz)."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._build_session(int(os.getenv("EBAY_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE)))
+        return self._session
+
+    def api_family(self, url: str):
+        """URL'nin günlük bütçesine sayıldığı API ailesi (OAuth gibi bütçesiz uç noktalar için None)."""
+        if url.startswith(TRADING_API_URL):
+            return "trading"
+        if url.startswith(self.base_url):
+            return "inventory"
+        return None
+
+    @staticmethod
+    def _build_session(pool_size: int) -> requests.Session:
+        """Manager başına tek oturum: TCP+TLS bağlantıları çağrılar arasında yeniden kullanılır."""
+        session = requests.Session()
+        # Yeniden deneme _request'te (jitter ve idempotency kontrolüyle) yapılır; adaptör denemez
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        return session
+
+    def _backoff_delay(self, attempt: int, response=None) -> float:
+        """Retry-After başlığı varsa ona uyar, yoksa tam jitter'lı üstel bekleme."""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _request(self, method: str, url: str, idempotent: bool = None, **kwargs) -> requests.Response:
+        """
+        Paylaşılan oturum üzerinden istek atar; 429/5xx ve bağlantı hatalarında jitter'lı bekleme ile tekrar dener.
+        idempotent verilmezse HTTP metodundan çıkarılır (GET/PUT/DELETE evet, POST hayır). İdempotent olmayan
+        istekler sadece sunucunun işlemediği kesin olan durumlarda tekrarlanır: 429 ve bağlantı kurulamaması.
+        Denemeler tükenirse son yanıt döner (veya son bağlantı hatası fırlatılır).
+        Trading / Inventory çağrıları ailenin ortak günlük bütçesinden düşülür (bütçe dolduysa CallBudgetExceeded).
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        family = self.api_family(url)
+        budget = get_call_budget(family) if family else None
+        auth_retried = False
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            if budget is not None:
+                budget.take()  # Her deneme eBay'de bir çağrı sayılır
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # ConnectTimeout / bağlantı kurulamadı: istek sunucuya ulaşmadı, her metod için güvenli
+                sent = not isinstance(e, requests.ConnectTimeout) and not _is_connect_failure(e)
+                if last_attempt or (sent and not idempotent):
+                    raise
+                delay = self._backoff_delay(attempt)
+                print(f"[eBay HTTP] {method} {url} bağlantı hatası ({type(e).__name__}), {delay:.1f} sn sonra tekrar ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                continue
+
+            # 401: token iptal edilmiş / başka süreç yenilemiş olabilir; bir kez yeni token'la tekrar denenir
+            rejected = auth_token_from_headers(kwargs.get("headers")) if response.status_code == 401 and not auth_retried else None
+            if rejected and not last_attempt:
+                auth_retried = True
+                fresh = token_cache.on_unauthorized(self, rejected)
+                if fresh and fresh != rejected:
+                    response.close()
+                    kwargs["headers"] = with_auth_token(kwargs["headers"], fresh)
+                    continue
+
+            retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+            if not retryable or last_attempt:
+                return response
+            delay = self._backoff_delay(attempt, response)
+            print(f"[eBay HTTP] {method} {url} -> {response.status_code}, {delay:.1f} sn sonra tekrar ({attempt + 1}/{self.max_retries})")
+            response.close()  # stream=True yanıtlarda bağlantı havuza dönsün
+            time.sleep(delay)
+
     def get_valid_token(self):
-        response = supabase.table("stores").select("api_config").eq("id", self.store_id).execute()
+        """Geçerli access token (süreç içi önbellekten; DB sadece ilk kullanımda okunur)."""
+        return token_cache.get(self)
+
+    async def get_valid_token_async(self):
+        """asyncio görevleri için: token bellekteyse beklemeden döner, yoksa yükleme/yenileme bir thread'de yapılır."""
+        token = token_cache.peek(self)
+        if token is not None:
+            return token
+        return await asyncio.to_thread(token_cache.get, self)
+
+    def _load_api_config(self) -> dict:
+        response = db.client.table("stores").select("api_config").eq("id", self.store_id).execute()
         
         if not response.data:
             raise ValueError(f"ID'si {self.store_id} olan mağaza bulunamadı.")
             
-        config = response.data[0]['api_config']
-        expires_at = datetime.fromisoformat(config.get('expires_at', '2000-01-01T00:00:00'))
-        
-        if datetime.now() > (expires_at - timedelta(minutes=5)):
-            print("Access Token süresi dolmuş veya dolmak üzere, yenileniyor...")
-            return self._refresh_token(config)
-        
-        return config['access_token']
+        return response.data[0]['api_config']
 
     def _refresh_token(self, config):
         auth_str = f"{config['ebay_app_id']}:{config['ebay_cert_id']}"
@@ -47,7 +835,8 @@ class EbayManager:
             "refresh_token": config['refresh_token']
         }
 
-        res = requests.post(self.auth_url, headers=headers, data=payload)
+        # Refresh token ile yeni access token almak tekrarlanabilir bir işlemdir
+        res = self._request("POST", self.auth_url, idempotent=True, headers=headers, data=payload)
         
         if res.status_code == 200:
             data = res.json()
@@ -57,7 +846,7 @@ class EbayManager:
             config['access_token'] = new_token
             config['expires_at'] = new_expiry
             
-            supabase.table("stores").update({"api_config": config}).eq("id", self.store_id).execute()
+            db.client.table("stores").update({"api_config": config}).eq("id", self.store_id).execute()
             print("Token başarıyla yenilendi ve veritabanına kaydedildi.")
             return new_token
         else:
@@ -90,7 +879,7 @@ class EbayManager:
         }
         
         # Hata buradaydı: PUT yerine POST olmalı
-        loc_res = requests.post(loc_url, headers=headers, json=loc_payload)
+        loc_res = self._request("POST", loc_url, idempotent=True, headers=headers, json=loc_payload)
         
         if loc_res.status_code not in [200, 201, 204] and "already exists" not in loc_res.text:
             return f"Lokasyon Oluşturma Hatası ({loc_res.status_code}): {loc_res.text}"
@@ -116,7 +905,7 @@ class EbayManager:
             }
         }
         
-        offer_res = requests.post(offer_url, headers=headers, json=offer_payload)
+        offer_res = self._request("POST", offer_url, headers=headers, json=offer_payload)
         
         if offer_res.status_code not in [200, 201]:
             return f"Offer Oluşturma Hatası ({offer_res.status_code}): {offer_res.text}"
@@ -125,7 +914,7 @@ class EbayManager:
         print(f"Offer oluşturuldu. ID: {offer_id}\n3. Ürün canlı yayına alınıyor...")
         
         publish_url = f"{self.base_url}/offer/{offer_id}/publish"
-        pub_res = requests.post(publish_url, headers=headers)
+        pub_res = self._request("POST", publish_url, headers=headers)
         
         if pub_res.status_code in [200, 201]:
             listing_id = pub_res.json().get('listingId')
@@ -133,96 +922,119 @@ class EbayManager:
         else:
             return f"Yayınlama Hatası ({pub_res.status_code}): {pub_res.text}"
 
-    def update_price_and_quantity(self, sku, new_price, new_qty, item_id=None):
-        """Sadece belirli bir ISKU'nun fiyatını ve stoğunu API ile anında günceller.
-        REST API başarısız olursa (Örn: Easync legacy ilanları) Trading API'ye fallback yapar."""
-        token = self.get_valid_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
+    def _rest_headers(self):
+        return {
+            "Authorization": f"Bearer {self.get_valid_token()}",
             "Content-Language": "en-US",
             "Content-Type": "application/json"
         }
-        
-        # 1. Önce ürünün Inventory Item bilgilerini çekmemiz/güncellememiz lazım
-        item_url = f"{self.base_url}/inventory_item/{sku}"
-        
-        # Ürünün sadece stoğunu güncelliyoruz (Availability)
-        item_payload = {
-            "availability": {
-                "shipToLocationAvailability": {"quantity": new_qty}
-            },
-            "condition": "NEW" 
-        }
-        
-        print(f"{sku} için stok güncelleniyor -> Yeni Stok: {new_qty}")
-        res_item = requests.put(item_url, headers=headers, json=item_payload)
-        
-        if res_item.status_code not in [200, 204]:
-            print(f"Stok Güncelleme Hatası ({res_item.status_code}): {res_item.text}")
-            # Eğer Legacy (eski) ilan henüz Inventory API'ye tam göç etmediyse hata verebilir
-        else:
-            print("Stok başarıyla güncellendi.")
 
-        # 2. Ürünün fiyatı Offer (Teklif) üzerinden güncellenir
-        # eBay'de bir SKU'nun birden fazla teklifi olabilir, önce aktif offer ID'yi bulmalıyız
-        offers_url = f"{self.base_url}/offer?sku={sku}"
-        res_offers = requests.get(offers_url, headers=headers)
-        
-        if res_offers.status_code == 200 and res_offers.json().get('offers'):
-            offer_id = res_offers.json()['offers'][0]['offerId']
-            
-            # Bulunan Offer ID'nin sadece fiyatını güncelleyen uç nokta (Endpoint)
-            price_url = f"{self.base_url}/offer/{offer_id}"
-            
-            # Sadece fiyat bilgisini gönderiyoruz (Patch mantığıyla)
-            price_payload = {
-                "pricingSummary": {
-                    "price": {"value": str(new_price), "currency": "USD"}
-                }
-            }
-            
-            print(f"{sku} için fiyat güncelleniyor -> Yeni Fiyat: ${new_price}")
-            # Fiyat güncellemesi genelde mevcut offer'ı okuyup revize etmeyi gerektirir.
-            # Not: eBay'de tam Offer güncellemesi tüm alanları zorunlu tutabilir, 
-            # bu basit fiyat enjeksiyonu çalışmazsa bir sonraki adımda dinamik get-and-put yaparız.
-            # Şimdilik eBay'in sağladığı hızlı fiyat güncelleme objesini test ediyoruz.
-        else:
-            print(f"Offer bulunamadı veya REST Fiyat API Hatası: {res_offers.text}")
-            print(f"[{sku}] TRADING API (ReviseInventoryStatus) Fallback deneniyor...")
-            self._fallback_revise_inventory_status(sku, item_id, new_price, new_qty, token)
+    def bulk_get_inventory_skus(self, skus) -> dict:
+        """{sku: Inventory API'de kayıtlı mı} (25'erli bulk_get_inventory_item çağrıları; belirsiz SKU'lar dönmez)."""
+        managed = {}
+        skus = list(skus)
+        for i in range(0, len(skus), MAX_BULK_INVENTORY_PER_CALL):
+            chunk = skus[i:i + MAX_BULK_INVENTORY_PER_CALL]
+            res = self._request("POST", f"{self.base_url}/bulk_get_inventory_item", idempotent=True,
+                                headers=self._rest_headers(), json={"requests": [{"sku": sku} for sku in chunk]})
+            if res.status_code in (200, 207):
+                managed.update(parse_bulk_get_inventory_response(res.json()))
+            else:
+                print(f"bulk_get_inventory_item Hatası ({res.status_code}): {res.text[:300]}")
+        return managed
 
-    def _fallback_revise_inventory_status(self, sku, item_id, new_price, new_qty, token):
-        """Eski Easync ilanları gibi REST API'de Offer kaydı olmayan ürünleri Trading API üzerinden günceller."""
-        xml_url = "https://api.ebay.com/ws/api.dll"
-        headers = {
-            "Content-Type": "text/xml",
-            "X-EBAY-API-SITEID": "0", 
-            "X-EBAY-API-COMPATIBILITY-LEVEL": "1311",
-            "X-EBAY-API-CALL-NAME": "ReviseInventoryStatus",
-            "X-EBAY-API-IAF-TOKEN": token
-        }
-        
-        item_identifier = f"<ItemID>{item_id}</ItemID>" if item_id else f"<SKU>{sku}</SKU>"
-        
-        xml_payload = f"""<?xml version="1.0" encoding="utf-8"?>
-<ReviseInventoryStatusRequest xmlns="urn:ebay:apis:eBLBaseComponents">
-  <ErrorLanguage>en_US</ErrorLanguage>
-  <WarningLevel>High</WarningLevel>
-  <InventoryStatus>
-    {item_identifier}
-    <StartPrice>{new_price}</StartPrice>
-    <Quantity>{new_qty}</Quantity>
-  </InventoryStatus>
-</ReviseInventoryStatusRequest>
-"""
-        try:
-            res = requests.post(xml_url, headers=headers, data=xml_payload.encode('utf-8'))
-            if "Success" in res.text or "Warning" in res.text:
-                print(f"[{sku}] Trading API Fallback BAŞARILI: Fiyat=${new_price}, Stok={new_qty}")
+    def get_offer(self, sku):
+        """SKU'nun ilk offer'ı: (offer_id, item_id); offer yoksa (None, None), belirsiz hatada None."""
+        res = self._request("GET", f"{self.base_url}/offer", headers=self._rest_headers(), params={"sku": sku})
+        return parse_offers_response(res.status_code, res.json() if res.status_code == 200 else None)
+
+    def classify_skus(self, skus) -> dict:
+        """
+        SKU -> {"api", "offer_id", "item_id"}: 25'erli bulk_get_inventory_item ile sınıflar, Inventory API
+        SKU'larının offer'ını bulur ve sonucu channel_cache'e (listings kolonlarına) yazar.
+        Yanıtı belirsiz kalan SKU'lar sonuçta yer almaz.
+        """
+        found = {}
+        for sku, managed in self.bulk_get_inventory_skus(skus).items():
+            offer = self.get_offer(sku) if managed else (None, None)
+            if offer is None:
+                continue
+            found[sku] = classification(managed, offer)
+            channel_cache.record(self.store_id, sku, **found[sku])
+        return found
+
+    def bulk_update_price_quantity(self, entries) -> list:
+        """25'erli bulk_update_price_quantity çağrıları; SKU bazında sonuç (legacy bayrağıyla)."""
+        results = []
+        for i in range(0, len(entries), MAX_BULK_INVENTORY_PER_CALL):
+            chunk = entries[i:i + MAX_BULK_INVENTORY_PER_CALL]
+            try:
+                # Mutlak fiyat/stok yazımı: tekrar göndermek güvenli
+                res = self._request("POST", f"{self.base_url}/bulk_update_price_quantity", idempotent=True,
+                                    headers=self._rest_headers(), json=build_bulk_price_quantity_request(chunk))
+                data = res.json() if res.text else None
+                results.extend(parse_bulk_price_quantity_response(res.status_code, data, chunk))
+            except Exception as e:
+                results.extend({"sku": c["sku"], "item_id": c.get("item_id"), "success": False, "legacy": False, "message": str(e)} for c in chunk)
+        return results
+
+    def update_prices_and_quantities(self, entries) -> list:
+        """
+        Fiyat/stok değişikliklerini en az çağrıyla gönderir (entries: {"sku", "item_id", "price", "quantity"},
+        isteğe bağlı "api" / "offer_id"):
+            1. kanal bilgisi girdide veya channel_cache'te (listings.channel_api) olan SKU'lar doğrudan ilgili
+               uca gider; bilinmeyenler bir kez classify_skus ile sınıflanıp kaydedilir,
+            2. Inventory API SKU'ları 25'erli bulk_update_price_quantity ile yazılır,
+            3. legacy SKU'lar ve legacy hatası alanlar 4'erli ReviseInventoryStatus ile gönderilir; legacy hatası
+               alanların kayıtlı sınıflaması (eskimiş offer) silinir, sonraki gönderimde yeniden sınıflanır.
+        Dönüş entries sırasıyla {"sku", "item_id", "success", "message", "path"} sonuçlarıdır.
+        """
+        entries = apply_channel_info(self.store_id, entries)
+        unknown = [e["sku"] for e in entries if e.get("sku") and not e.get("api") and not e.get("offer_id")]
+        if unknown:
+            merge_channel_info(entries, self.classify_skus(unknown))
+
+        rest = [i for i, e in enumerate(entries) if e.get("offer_id") and e.get("api") != CHANNEL_API_TRADING]
+        results = [None] * len(entries)
+        for i, result in zip(rest, self.bulk_update_price_quantity([entries[i] for i in rest])):
+            if result.pop("legacy"):
+                channel_cache.record(self.store_id, entries[i]["sku"], None)
             else:
-                print(f"[{sku}] Trading API Fallback Hatası: {res.text}")
-        except Exception as e:
-            print(f"[{sku}] Trading API Fallback İstisna Hatası: {e}")
+                results[i] = dict(result, path=CHANNEL_API_INVENTORY)
+
+        trading = [i for i, r in enumerate(results) if r is None]
+        for i, result in zip(trading, self.revise_inventory_status_batch([entries[i] for i in trading])):
+            results[i] = dict(result, path=CHANNEL_API_TRADING)
+        return results
+
+    def update_price_and_quantity(self, sku, new_price, new_qty, item_id=None):
+        """Sadece belirli bir ISKU'nun fiyatını ve stoğunu API ile anında günceller.
+        Inventory API'de yönetilen SKU'lar bulk_update_price_quantity ile, REST'te kaydı olmayanlar
+        (Örn: Easync legacy ilanları) Trading API (ReviseInventoryStatus) ile güncellenir."""
+        result = self.update_prices_and_quantities([{"sku": sku, "item_id": item_id, "price": new_price, "quantity": new_qty}])[0]
+        if result["success"]:
+            print(f"[{sku}] Fiyat=${new_price}, Stok={new_qty} güncellendi ({result['path']}).")
+        else:
+            print(f"[{sku}] Fiyat/Stok güncelleme hatası ({result['path']}): {result['message']}")
+        return result
+
+    def revise_inventory_status_batch(self, entries) -> list:
+        """
+        Fiyat/stok değişikliklerini 4'erli ReviseInventoryStatus çağrılarıyla gönderir (ilan başına bir çağrı yerine).
+        entries: {"sku", "item_id", "price", "quantity"}; dönüş aynı sırada ilan bazında sonuçlar
+        ({"sku", "item_id", "success", "message"}), kısmi hatalar ilan ilan raporlanır.
+        """
+        results = []
+        for i in range(0, len(entries), MAX_INVENTORY_STATUS_PER_CALL):
+            chunk = entries[i:i + MAX_INVENTORY_STATUS_PER_CALL]
+            headers = trading_headers("ReviseInventoryStatus", self.get_valid_token())
+            xml_payload = build_revise_inventory_status_batch_xml(chunk)
+            try:
+                res = self._request("POST", TRADING_API_URL, idempotent=True, headers=headers, data=xml_payload.encode('utf-8'))
+                results.extend(parse_revise_inventory_status_response(res.text, chunk))
+            except Exception as e:
+                results.extend({"sku": c.get("sku"), "item_id": c.get("item_id"), "success": False, "message": str(e)} for c in chunk)
+        return results
 
     def create_and_publish_offer_xml_fallback(self, sku, title, description_html, price, quantity, policies, category_id, image_urls):
         """
@@ -232,15 +1044,9 @@ class EbayManager:
         token = self.get_valid_token()
         
         # Trading API Endpoint
-        xml_url = "https://api.ebay.com/ws/api.dll"
+        xml_url = TRADING_API_URL
         
-        headers = {
-            "Content-Type": "text/xml",
-            "X-EBAY-API-SITEID": "0", # 0 = ABD (US)
-            "X-EBAY-API-COMPATIBILITY-LEVEL": "1311",
-            "X-EBAY-API-CALL-NAME": "AddFixedPriceItem",
-            "X-EBAY-API-IAF-TOKEN": token
-        }
+        headers = trading_headers("AddFixedPriceItem", token)
         
         # Resim XML tag'lerini oluşturalım
         pictures_xml = ""
@@ -296,12 +1102,12 @@ class EbayManager:
 </AddFixedPriceItemRequest>"""
 
         print(f"[{sku}] XML (AddFixedPriceItem) Fallback çağrısı yapılıyor...")
-        response = requests.post(xml_url, headers=headers, data=xml_payload.encode('utf-8'))
+        # Yeni ilan açar: çift ilan riskine karşı sadece sunucunun işlemediği durumlarda tekrarlanır
+        response = self._request("POST", xml_url, headers=headers, data=xml_payload.encode('utf-8'))
         
         content = response.text
-        if "<Ack>Success</Ack>" in content or "<Ack>Warning</Ack>" in content:
+        if trading_ack_ok(content):
             # ItemID çıkarımı
-            import re
             item_id_match = re.search(r"<ItemID>(.*?)</ItemID>", content)
             item_id = item_id_match.group(1) if item_id_match else "UNKNOWN_ID"
             return f"BAŞARILI (XML Fallback)! Ürün eBay'de satışta. Listing ID: {item_id}"
@@ -314,58 +1120,160 @@ class EbayManager:
         Sadece payload içinde gelen alanlar değiştirilir (Kısmi güncelleme).
         """
         token = self.get_valid_token()
-        xml_url = "https://api.ebay.com/ws/api.dll"
-        
-        headers = {
-            "Content-Type": "text/xml",
-            "X-EBAY-API-SITEID": "0", # 0 = ABD (US)
-            "X-EBAY-API-COMPATIBILITY-LEVEL": "1311",
-            "X-EBAY-API-CALL-NAME": "ReviseFixedPriceItem",
-            "X-EBAY-API-IAF-TOKEN": token
-        }
-
-        # Sadece güncellenecek alanları içeren dinamik XML bloğu
-        dynamic_fields = ""
-        
-        if payload.get("StartPrice") is not None:
-            dynamic_fields += f"<StartPrice currencyID=\"USD\">{payload['StartPrice']}</StartPrice>\n"
-            
-        if payload.get("Quantity") is not None:
-            dynamic_fields += f"<Quantity>{payload['Quantity']}</Quantity>\n"
-            
-        if payload.get("CategoryID"):
-            dynamic_fields += f"<PrimaryCategory><CategoryID>{payload['CategoryID']}</CategoryID></PrimaryCategory>\n"
-            
-        # Politikalar (Profiles) geliyorsa
-        profiles = payload.get("SellerProfiles", {})
-        if profiles:
-            dynamic_fields += "<SellerProfiles>\n"
-            if profiles.get('PaymentProfileID'):
-                dynamic_fields += f"  <SellerPaymentProfile><PaymentProfileID>{profiles['PaymentProfileID']}</PaymentProfileID></SellerPaymentProfile>\n"
-            if profiles.get('ReturnProfileID'):
-                dynamic_fields += f"  <SellerReturnProfile><ReturnProfileID>{profiles['ReturnProfileID']}</ReturnProfileID></SellerReturnProfile>\n"
-            if profiles.get('ShippingProfileID'):
-                dynamic_fields += f"  <SellerShippingProfile><ShippingProfileID>{profiles['ShippingProfileID']}</ShippingProfileID></SellerShippingProfile>\n"
-            dynamic_fields += "</SellerProfiles>\n"
-
-        xml_payload = f"""<?xml version="1.0" encoding="utf-8"?>
-<ReviseFixedPriceItemRequest xmlns="urn:ebay:apis:eBLBaseComponents">
-  <ErrorLanguage>en_US</ErrorLanguage>
-  <WarningLevel>High</WarningLevel>
-  <Item>
-    <ItemID>{item_id}</ItemID>
-    {dynamic_fields}
-  </Item>
-</ReviseFixedPriceItemRequest>"""
+        headers = trading_headers("ReviseFixedPriceItem", token)
+        xml_payload = build_revise_item_xml(item_id, payload)
 
-        response = requests.post(xml_url, headers=headers, data=xml_payload.encode('utf-8'))
+        response = self._request("POST", TRADING_API_URL, idempotent=True, headers=headers, data=xml_payload.encode('utf-8'))
         content = response.text
         
-        if "<Ack>Success</Ack>" in content or "<Ack>Warning</Ack>" in content:
+        if trading_ack_ok(content):
             return {"success": True, "message": f"[{item_id}] başarıyla güncellendi."}
         else:
             return {"success": False, "message": f"[{item_id}] Güncelleme Hatası: {content}"}
 
+    def get_seller_list(self, page, output_selectors, entries_per_page=100):
+        """GetSellerList'in bir sayfasının ham XML'i (HTTP hatasında None)."""
+        token = self.get_valid_token()
+        headers = trading_headers("GetSellerList", token, compatibility_level="1199")
+        xml_payload = build_get_seller_list_xml(page, output_selectors, entries_per_page)
+        res = self._request("POST", TRADING_API_URL, idempotent=True, headers=headers, data=xml_payload.encode('utf-8'))
+        if res.status_code == 200:
+            return res.text
+        print(f"HTTP Error {res.status_code}: {res.text[:500]}")
+        return None
+
+    def _stream_seller_list_page(self, page, output_selectors, entries_per_page):
+        """
+        GetSellerList'in bir sayfasını akış halinde çeker ve Item elemanlarını geldikçe verir.
+        Üreteç dönüş değeri SellerListStream'dir (toplam sayfa / ilan sayısı). _request'in tekrar denemeleri
+        tükendikten sonra HTTP hatası veya Ack=Failure SellerListPageError fırlatır.
+        """
+        headers = trading_headers("GetSellerList", self.get_valid_token(), compatibility_level="1199")
+        xml_payload = build_get_seller_list_xml(page, output_selectors, entries_per_page)
+        res = self._request("POST", TRADING_API_URL, idempotent=True, headers=headers, data=xml_payload.encode('utf-8'), stream=True)
+        try:
+            if res.status_code != 200:
+                raise SellerListPageError(page, f"HTTP {res.status_code}: {res.text[:500]}")
+            stream = SellerListStream()
+            for chunk in res.iter_content(chunk_size=64 * 1024):
+                yield from stream.feed(chunk)
+            yield from stream.close()
+        finally:
+            res.close()
+        if stream.ack == "Failure":
+            raise SellerListPageError(page, " | ".join(filter(None, stream.errors)) or "Ack=Failure")
+        return stream
+
+    def get_seller_events(self, mod_time_from, mod_time_to, output_selectors):
+        """
+        GetSellerEvents: aralıkta değişen ilanların Item elemanları (yanıt akış halinde ayrıştırılır).
+        HTTP / API hatasında None döner. Liste GET_SELLER_EVENTS_MAX_ITEMS'a ulaştıysa sonuç kesilmiş olabilir.
+        """
+        headers = trading_headers("GetSellerEvents", self.get_valid_token(), compatibility_level="1199")
+        xml_payload = build_get_seller_events_xml(mod_time_from, mod_time_to, output_selectors)
+        res = self._request("POST", TRADING_API_URL, idempotent=True, headers=headers, data=xml_payload.encode('utf-8'), stream=True)
+        try:
+            if res.status_code != 200:
+                print(f"HTTP Error {res.status_code}: {res.text[:500]}")
+                return None
+            stream = SellerListStream()
+            items = []
+            for chunk in res.iter_content(chunk_size=64 * 1024):
+                items.extend(stream.feed(chunk))
+            items.extend(stream.close())
+        finally:
+            res.close()
+        if stream.ack == "Failure":
+            print(f"GetSellerEvents hatası: {' | '.join(filter(None, stream.errors))}")
+            return None
+        return items
+
+    def iter_seller_list(self, output_selectors, entries_per_page=100, workers=None, max_pages=None, stats=None):
+        """
+        Aktif ilanların tamamını GetSellerList Item elemanları (ElementTree) olarak akış halinde verir.
+        1. sayfa önce çekilir (PaginationResult/TotalNumberOfPages); kalan sayfalar en fazla workers iş
+        parçacığıyla eşzamanlı çekilir. Her yanıt geldikçe ayrıştırılır, ilanlar sayfa sırası beklenmeden verilir.
+        max_pages verilirse en fazla o kadar sayfa okunur.
+        Alınamayan bir sayfa (tekrar denemelerden sonra) SellerListPageError olarak tüketiciye fırlatılır:
+        akış sessizce eksik bir katalogla bitmez.
+        stats sözlüğü verilirse total_pages / total_entries (eBay'in bildirdiği) ve pages_fetched
+        (tamamı okunan sayfa sayısı) ile doldurulur; çağıran taramanın eksiksiz olduğunu buradan doğrular.
+        """
+        output_selectors = tuple(output_selectors)
+        if "PaginationResult" not in output_selectors:
+            output_selectors += ("PaginationResult",)
+        workers = workers or int(os.getenv("EBAY_SELLER_LIST_WORKERS", DEFAULT_SELLER_LIST_WORKERS))
+
+        stats = {} if stats is None else stats
+        first = yield from self._stream_seller_list_page(1, output_selectors, entries_per_page)
+        total_pages = first.total_pages
+        stats.update(total_pages=total_pages, total_entries=first.total_entries, pages_fetched=1)
+        last_page = min(total_pages or 1, max_pages or total_pages or 1)
+        if last_page < 2:
+            return
+
+        # İş parçacıkları ilanları sınırlı bir kuyruğa koyar; tüketici yavaşsa okuma da yavaşlar
+        items = queue.Queue(maxsize=entries_per_page * workers)
+        stop = threading.Event()
+        done = object()
+
+        def put(obj) -> bool:
+            while not stop.is_set():
+                try:
+                    items.put(obj, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch(page):
+            try:
+                for item in self._stream_seller_list_page(page, output_selectors, entries_per_page):
+                    if not put(item):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        pages = range(2, last_page + 1)
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ebay-seller-list")
+        try:
+            for page in pages:
+                pool.submit(fetch, page)
+            remaining = len(pages)
+            while remaining:
+                obj = items.get()
+                if obj is done:
+                    # Hatalı sayfa done'dan önce istisnasını koyar (yukarıda fırlatılır): buraya sadece tam sayfalar düşer
+                    remaining -= 1
+                    stats["pages_fetched"] += 1
+                elif isinstance(obj, Exception):
+                    raise obj
+                else:
+                    yield obj
+        finally:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def upload_site_hosted_picture(self, base64_img, extension="jpg", pic_name="image"):
+        """
+        Görseli eBay Picture Services'e (EPS) yükler; UploadSiteHostedPictures çok parçalı (XML + ikili) istek.
+        Dönüş: {"success": True, "url": FullURL} veya {"success": False, "message": ...}
+        """
+        token = self.get_valid_token()
+        headers = trading_headers("UploadSiteHostedPictures", token)
+        del headers["Content-Type"]  # multipart sınırını requests belirler
+        files = {
+            "XML Payload": (None, build_upload_picture_xml(pic_name), "text/xml"),
+            "image": (f"{pic_name}.{extension}", base64.b64decode(base64_img), "application/octet-stream"),
+        }
+        try:
+            res = self._request("POST", TRADING_API_URL, idempotent=True, headers=headers, files=files)
+        except Exception as e:
+            return {"success": False, "message": str(e)}
+        return parse_upload_picture_response(res.text)
+
 if __name__ == "__main__":
     STORE_ID = "197bd215-3bec-4f43-aa40-f2fb4d204eee" 
     
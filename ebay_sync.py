@@ -1,8 +1,5 @@
 import requests
-from ebay_core import EbayManager, SUPABASE_URL, SUPABASE_KEY
-from supabase import create_client
-
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+from ebay_core import EbayManager
 
 def sync_ebay_inventory(store_id):
     manager = EbayManager(store_id=store_id)
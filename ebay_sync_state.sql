@@ -0,0 +1,14 @@
+-- Mağaza başına eBay katalog senkron durumu.
+-- mod_time_watermark: bu ana kadar değişen ilanlar DB'ye yazıldı; import_ebay_natively.py --incremental
+-- sonraki çalışmada GetSellerEvents'i buradan (küçük bir örtüşmeyle) başlatır.
+-- last_full_scan_at: son eksiksiz GetSellerList taraması; EBAY_FULL_SCAN_DAYS'ten eskiyse sapma
+-- düzeltmesi için artımlı yerine tam tarama yapılır.
+
+CREATE TABLE IF NOT EXISTS ebay_sync_state (
+    store_id UUID PRIMARY KEY REFERENCES stores(id) ON DELETE CASCADE,
+    mod_time_watermark TIMESTAMP WITH TIME ZONE,
+    last_full_scan_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+NOTIFY pgrst, 'reload schema';
@@ -1,7 +1,15 @@
+import os
 import sys
-import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
 from database import db
-from ebay_api_integrator import EbayApiIntegrator
+from ebay_api_integrator import EbayApiIntegrator, SELLER_LIST_SELECTORS, STORE_ID
+from ebay_core import EbayManager, GET_SELLER_EVENTS_MAX_ITEMS, SellerListPageError, TRADING_NS
+
+# Artımlı senkron (GetSellerEvents) ayarları
+DEFAULT_FULL_SCAN_DAYS = 7              # Bu kadar gün tam tarama yapılmadıysa artımlı yerine tam tarama (sapma düzeltmesi)
+EVENTS_WINDOW = timedelta(hours=24)     # Tek GetSellerEvents çağrısının ModTime penceresi
+MIN_EVENTS_WINDOW = timedelta(minutes=1)
+WATERMARK_OVERLAP = timedelta(minutes=5)  # eBay'de değişiklik zamanı gecikebilir: pencere filigranın bu kadar gerisinden açılır
 
 def get_or_create_supplier_store():
     # Load marketplace cache
@@ -33,6 +41,80 @@ def get_or_create_supplier_store():
         
     return supplier_id, store_id
 
+def parse_api_item(item, ns):
+    """GetSellerList / GetSellerEvents Item elemanından paket satırı (ItemID yoksa None)."""
+    item_id = item.find(f"{ns}ItemID")
+    sku_node = item.find(f"{ns}SKU")
+    title_node = item.find(f"{ns}Title")
+    qty_node = item.find(f"{ns}Quantity")
+    selling_status = item.find(f"{ns}SellingStatus")
+    price_node = None
+    listing_status = None
+    if selling_status is not None:
+        price_node = selling_status.find(f"{ns}CurrentPrice")
+        listing_status = selling_status.findtext(f"{ns}ListingStatus")
+        
+    cat_node = item.find(f"{ns}PrimaryCategory")
+    cat_id_val = None
+    cat_name_val = None
+    if cat_node is not None:
+        cid = cat_node.find(f"{ns}CategoryID")
+        cname = cat_node.find(f"{ns}CategoryName")
+        cat_id_val = cid.text if cid is not None else None
+        cat_name_val = cname.text if cname is not None else None
+
+    seller_profiles = item.find(f"{ns}SellerProfiles")
+    ship_prof_id, ret_prof_id, pay_prof_id = None, None, None
+    if seller_profiles is not None:
+        ship_prof = seller_profiles.find(f"{ns}SellerShippingProfile")
+        if ship_prof is not None:
+            s_id = ship_prof.find(f"{ns}ShippingProfileID")
+            ship_prof_id = s_id.text if s_id is not None else None
+        ret_prof = seller_profiles.find(f"{ns}SellerReturnProfile")
+        if ret_prof is not None:
+            r_id = ret_prof.find(f"{ns}ReturnProfileID")
+            ret_prof_id = r_id.text if r_id is not None else None
+        pay_prof = seller_profiles.find(f"{ns}SellerPaymentProfile")
+        if pay_prof is not None:
+            p_id = pay_prof.find(f"{ns}PaymentProfileID")
+            pay_prof_id = p_id.text if p_id is not None else None
+        
+    item_id_val = item_id.text if item_id is not None else None
+    sku_val = sku_node.text if sku_node is not None else None
+    title_val = title_node.text if title_node is not None else "İsimsiz Ürün"
+    qty_val = int(qty_node.text) if qty_node is not None and qty_node.text else 0
+    price_val = float(price_node.text) if price_node is not None and price_node.text else 0.0
+    # GetSellerList sadece aktif ilanları döndürür; GetSellerEvents biten (Ended/Completed) ilanları da içerir
+    is_active = listing_status in (None, "Active")
+    
+    if not item_id_val:
+        return None
+        
+    asin = sku_val
+    if sku_val:
+        if sku_val.startswith("A-"):
+            asin = sku_val[2:]
+        elif sku_val.startswith("A") and len(sku_val) == 11:
+            asin = sku_val[1:]
+    if not asin:
+        asin = f"UNKNOWN-{item_id_val}"
+        
+    print(f"DEBUG: Cat: {cat_id_val}, Ship: {ship_prof_id}, Ret: {ret_prof_id}, Pay: {pay_prof_id}")
+    return {
+        "source_id": asin, 
+        "marketplace_sku": sku_val, 
+        "item_id": item_id_val,
+        "title": title_val[:200],
+        "qty": qty_val,
+        "price": price_val,
+        "category_id": cat_id_val,
+        "category_name": cat_name_val,
+        "shipping_profile_id": ship_prof_id,
+        "return_profile_id": ret_prof_id,
+        "payment_profile_id": pay_prof_id,
+        "is_active": is_active
+    }
+
 def import_ebay_natively(limit_pages=None):
     integrator = EbayApiIntegrator()
     ns = integrator.namespace
@@ -40,197 +122,50 @@ def import_ebay_natively(limit_pages=None):
     print("🚀 Veriler eBay API'den çekilip paketleniyor (Native Bulk İşlem)...")
     
     supplier_id, store_id = get_or_create_supplier_store()
+    started_at = datetime.now(timezone.utc)
     
-    page = 1
     api_items = []
-    
-    while True:
-        print(f"Sayfa {page} taranıyor...")
-        xml_data = integrator.xml_get_seller_list(page)
-        if not xml_data:
-            break
-            
-        root = ET.fromstring(xml_data)
-        items = root.findall(f".//{ns}Item")
-        if not items:
-            break
-            
-        for item in items:
-            item_id = item.find(f"{ns}ItemID")
-            sku_node = item.find(f"{ns}SKU")
-            title_node = item.find(f"{ns}Title")
-            qty_node = item.find(f"{ns}Quantity")
-            selling_status = item.find(f"{ns}SellingStatus")
-            price_node = None
-            if selling_status is not None:
-                price_node = selling_status.find(f"{ns}CurrentPrice")
-                
-            cat_node = item.find(f"{ns}PrimaryCategory")
-            cat_id_val = None
-            cat_name_val = None
-            if cat_node is not None:
-                cid = cat_node.find(f"{ns}CategoryID")
-                cname = cat_node.find(f"{ns}CategoryName")
-                cat_id_val = cid.text if cid is not None else None
-                cat_name_val = cname.text if cname is not None else None
+    stats = {}
+    received = 0
+    failed = False
 
-            seller_profiles = item.find(f"{ns}SellerProfiles")
-            ship_prof_id, ret_prof_id, pay_prof_id = None, None, None
-            if seller_profiles is not None:
-                ship_prof = seller_profiles.find(f"{ns}SellerShippingProfile")
-                if ship_prof is not None:
-                    s_id = ship_prof.find(f"{ns}ShippingProfileID")
-                    ship_prof_id = s_id.text if s_id is not None else None
-                ret_prof = seller_profiles.find(f"{ns}SellerReturnProfile")
-                if ret_prof is not None:
-                    r_id = ret_prof.find(f"{ns}ReturnProfileID")
-                    ret_prof_id = r_id.text if r_id is not None else None
-                pay_prof = seller_profiles.find(f"{ns}SellerPaymentProfile")
-                if pay_prof is not None:
-                    p_id = pay_prof.find(f"{ns}PaymentProfileID")
-                    pay_prof_id = p_id.text if p_id is not None else None
-                
-            item_id_val = item_id.text if item_id is not None else None
-            sku_val = sku_node.text if sku_node is not None else None
-            title_val = title_node.text if title_node is not None else "İsimsiz Ürün"
-            qty_val = int(qty_node.text) if qty_node is not None and qty_node.text else 0
-            price_val = float(price_node.text) if price_node is not None and price_node.text else 0.0
-            
-            if not item_id_val:
-                continue
-                
-            asin = sku_val
-            if sku_val:
-                if sku_val.startswith("A-"):
-                    asin = sku_val[2:]
-                elif sku_val.startswith("A") and len(sku_val) == 11:
-                    asin = sku_val[1:]
-            if not asin:
-                asin = f"UNKNOWN-{item_id_val}"
-                
-            print(f"DEBUG: Cat: {cat_id_val}, Ship: {ship_prof_id}, Ret: {ret_prof_id}, Pay: {pay_prof_id}"); api_items.append({
-                "source_id": asin, 
-                "marketplace_sku": sku_val, 
-                "item_id": item_id_val,
-                "title": title_val[:200],
-                "qty": qty_val,
-                "price": price_val,
-                "category_id": cat_id_val,
-                "category_name": cat_name_val,
-                "shipping_profile_id": ship_prof_id,
-                "return_profile_id": ret_prof_id,
-                "payment_profile_id": pay_prof_id
-            })
-            
-        has_more = root.find(f".//{ns}HasMoreItems")
-        if has_more is None or has_more.text.lower() != 'true':
-            break
-            
-        if limit_pages and page >= limit_pages:
-            break
-            
-        page += 1
+    # Sayfalar eşzamanlı çekilir ve yanıtlar geldikçe ayrıştırılır (EbayManager.iter_seller_list)
+    try:
+        for item in integrator.iter_seller_list(max_pages=limit_pages, stats=stats):
+            received += 1
+            row = parse_api_item(item, ns)
+            if row:
+                api_items.append(row)
+    except SellerListPageError as e:
+        failed = True
+        print(f"Tarama yarıda kaldı: {e}")
         
     print(f"Toplam {len(api_items)} adet ürün eBay'den çekildi.")
-    
-    if not api_items:
-        return {"success": 0, "errors": 0}
-
-    # API'den çektiğimiz source_id (ASIN) listesi
-    source_ids_in_api = list({item['source_id'] for item in api_items})
-    
-    prod_data = []
-    chunk_sz = 200
-    for i in range(0, len(source_ids_in_api), chunk_sz):
-        chunk_asins = source_ids_in_api[i:i+chunk_sz]
-        res = db.client.table('core_products').select('id, asin').in_('asin', chunk_asins).execute()
-        prod_data.extend(res.data)
-        
-    prod_cache = {p['asin']: p['id'] for p in prod_data}
-    
-    existing_p_ids = [p['id'] for p in prod_data]
-    list_data = []
-    src_data = []
-    if existing_p_ids:
-        for i in range(0, len(existing_p_ids), chunk_sz):
-            p_chunk = existing_p_ids[i:i+chunk_sz]
-            l_res = db.client.table('listings').select('id, product_id, store_id').in_('product_id', p_chunk).execute()
-            list_data.extend(l_res.data)
-            
-            s_res = db.client.table('sources').select('id, product_id, supplier_id').in_('product_id', p_chunk).execute()
-            src_data.extend(s_res.data)
+    result = upsert_api_items(api_items, supplier_id, store_id)
 
-    listing_cache = {f"{l['product_id']}_{l['store_id']}": l['id'] for l in list_data}
-    source_cache = {f"{s['product_id']}_{s['supplier_id']}": s['id'] for s in src_data}
-    
-    new_products_payload = []
-    new_contents_payload = []
-    new_sources_payload = []
-    new_listings_payload = []
-    
-    for item in api_items:
-        source_id = item['source_id']
-        
-        if source_id not in prod_cache and not any(p['asin'] == source_id for p in new_products_payload):
-            new_products_payload.append({'asin': source_id})
+    # Sadece eksiksiz taramalar artımlı senkronun başlangıç noktası olur: tüm sayfalar okunmuş ve
+    # ilan sayısı eBay'in bildirdiği TotalNumberOfEntries ile tutmalı (boş tarama filigranı ilerletmez)
+    result["complete"] = (
+        not failed and not limit_pages and received > 0
+        and stats.get("pages_fetched") == stats.get("total_pages")
+        and received == stats.get("total_entries")
+    )
+    if result["complete"] and not result["errors"]:
+        save_sync_state(store_id, mod_time_watermark=started_at, last_full_scan_at=started_at)
+        print("\n✅ eBay Native Pull İşlemi Başarıyla Tamamlandı!")
+    elif not limit_pages:
+        print(
+            f"\n⚠️ Tarama eksik ({stats.get('pages_fetched', 0)}/{stats.get('total_pages')} sayfa, "
+            f"{received}/{stats.get('total_entries')} ilan) veya yazma hatalı: senkron durumu güncellenmedi."
+        )
+    return result
 
-    if new_products_payload:
-        chunk_size = 500
-        for i in range(0, len(new_products_payload), chunk_size):
-            chunk = new_products_payload[i:i+chunk_size]
-            res = db.client.table('core_products').upsert(chunk, on_conflict='asin').execute()
-            for p in res.data:
-                prod_cache[p['asin']] = p['id']
 
-    for item in api_items:
-        source_id = item['source_id']
-        product_id = prod_cache.get(source_id)
-        if product_id:
-            if not any(c['product_id'] == product_id for c in new_contents_payload):
-                new_contents_payload.append({'product_id': product_id, 'base_title': item['title']})
-                
-    if new_contents_payload:
-        chunk_size = 500
-        for i in range(0, len(new_contents_payload), chunk_size):
-            db.client.table('product_base_content').upsert(new_contents_payload[i:i+chunk_size], on_conflict='product_id').execute()
-
-    for item in api_items:
-        source_id = item['source_id']
-        product_id = prod_cache.get(source_id)
-        if not product_id:
-            continue
-            
-        src_key = f"{product_id}_{supplier_id}"
-        if not any(s['product_id'] == product_id and s['supplier_id'] == supplier_id for s in new_sources_payload):
-            s_payload = {
-                'product_id': product_id, 'supplier_id': supplier_id, 
-                'source_code': source_id, 'base_cost': 0.0 # Bize asıl maliyet Amazon'dan gelecek, şimdilik 0
-            }
-            if src_key in source_cache:
-                s_payload['id'] = source_cache[src_key]
-            new_sources_payload.append(s_payload)
+def upsert_api_items(api_items, supplier_id, store_id):
+    """parse_api_item satırlarını kategori sözlüğüne ve upsert_product_bundles RPC'sine yazar."""
+    if not api_items:
+        return {"success": 0, "errors": 0}
 
-        lst_key = f"{product_id}_{store_id}"
-        if not any(l['product_id'] == product_id and l['store_id'] == store_id for l in new_listings_payload):
-            l_payload = {
-                'product_id': product_id, 'store_id': store_id, 
-                'channel_item_id': item['item_id'], 
-                'channel_sku': item['marketplace_sku'], 
-                'listed_price': item['price'], 
-                'quantity': item['qty'],
-                'category_id': item['category_id'],
-                'shipping_profile_id': item['shipping_profile_id'],
-                'return_profile_id': item['return_profile_id'],
-                'payment_profile_id': item['payment_profile_id'],
-                'is_active': True,
-                'needs_sync': False
-            }
-            if lst_key in listing_cache:
-                l_payload['id'] = listing_cache[lst_key]
-            new_listings_payload.append(l_payload)
-            
-    chunk_size = 1000
-    
     categories_to_upsert = {}
     for item in api_items:
         if item['category_id'] and item['category_name']:
@@ -247,32 +182,128 @@ def import_ebay_natively(limit_pages=None):
         for i in range(0, len(cat_payload), 500):
             db.client.table('marketplace_categories').upsert(cat_payload[i:i+500], on_conflict='marketplace,category_id').execute()
 
-    if new_sources_payload:
-        sources_with_id = [item for item in new_sources_payload if 'id' in item]
-        sources_without_id = [item for item in new_sources_payload if 'id' not in item]
-        
-        for sublist in [sources_with_id, sources_without_id]:
-            if not sublist: continue
-            for i in range(0, len(sublist), chunk_size):
-                try:
-                    db.client.table('sources').upsert(sublist[i:i+chunk_size]).execute()
-                except Exception as e:
-                    print(f"Source upsert hatası: {e}")
+    # Ürün + başlık + kaynak + ilan paketleri; ID eşleştirmesi sunucuda (upsert_product_bundles RPC)
+    bundles = []
+    for item in api_items:
+        bundles.append({
+            'asin': item['source_id'],
+            'base_title': item['title'],
+            'supplier_id': supplier_id,
+            'source_code': item['source_id'],
+            'base_cost': None, # Bize asıl maliyet Amazon'dan gelecek; yeni kayıtta 0, mevcut maliyet korunur
+            'store_id': store_id,
+            'channel_item_id': item['item_id'],
+            'channel_sku': item['marketplace_sku'],
+            'listed_price': item['price'],
+            'quantity': item['qty'] if item['is_active'] else 0,
+            'category_id': item['category_id'],
+            'shipping_profile_id': item['shipping_profile_id'],
+            'return_profile_id': item['return_profile_id'],
+            'payment_profile_id': item['payment_profile_id'],
+            'is_active': item['is_active'],
+            'needs_sync': False
+        })
 
-    if new_listings_payload:
-        listings_with_id = [item for item in new_listings_payload if 'id' in item]
-        listings_without_id = [item for item in new_listings_payload if 'id' not in item]
-        
-        for sublist in [listings_with_id, listings_without_id]:
-            if not sublist: continue
-            for i in range(0, len(sublist), chunk_size):
-                try:
-                    db.client.table('listings').upsert(sublist[i:i+chunk_size]).execute()
-                except Exception as e:
-                    print(f"Listings upsert hatası: {e}")
+    errors = 0
+    chunk_size = 500
+    for i in range(0, len(bundles), chunk_size):
+        chunk = bundles[i:i+chunk_size]
+        try:
+            db.upsert_product_bundles(chunk, chunk_size=chunk_size)
+        except Exception as e:
+            errors += len(chunk)
+            print(f"Paket upsert hatası: {e}")
+
+    return {"success": len(api_items) - errors, "errors": errors}
+
+def load_sync_state(store_id):
+    """ebay_sync_state satırı: {mod_time_watermark, last_full_scan_at} (datetime) veya None."""
+    rows = db.client.table('ebay_sync_state').select('mod_time_watermark, last_full_scan_at').eq('store_id', store_id).execute().data
+    if not rows:
+        return None
+    return {k: datetime.fromisoformat(v.replace("Z", "+00:00")) if v else None for k, v in rows[0].items()}
+
+
+def save_sync_state(store_id, **fields):
+    payload = {k: v.isoformat() for k, v in fields.items()}
+    payload.update(store_id=store_id, updated_at=datetime.now(timezone.utc).isoformat())
+    db.client.table('ebay_sync_state').upsert(payload, on_conflict='store_id').execute()
+
+
+def _fetch_changed_items(ebay, mod_from, mod_to):
+    """
+    [mod_from, mod_to) aralığında değişen ilanların Item elemanları. Pencere EVENTS_WINDOW'a bölünür;
+    bir pencere GetSellerEvents üst sınırına (3000) ulaşırsa ikiye bölünüp tekrar sorgulanır.
+    API hatasında veya MIN_EVENTS_WINDOW'luk pencere bile kesilmiş dönerse None (çağıran tam taramaya düşer).
+    """
+    items = []
+    windows = []
+    start = mod_from
+    while start < mod_to:
+        windows.append((start, min(start + EVENTS_WINDOW, mod_to)))
+        start = windows[-1][1]
+
+    while windows:
+        start, end = windows.pop(0)
+        batch = ebay.get_seller_events(start, end, SELLER_LIST_SELECTORS)
+        if batch is None:
+            return None
+        if len(batch) >= GET_SELLER_EVENTS_MAX_ITEMS:
+            if end - start <= MIN_EVENTS_WINDOW:
+                print(f"⚠️ {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M} penceresi daraltılamıyor ve sonuç kesilmiş olabilir.")
+                return None
+            middle = start + (end - start) / 2
+            windows[:0] = [(start, middle), (middle, end)]
+            continue
+        print(f" {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M}: {len(batch)} değişiklik")
+        items.extend(batch)
+    return items
+
+
+def import_ebay_incremental(full_scan_days=None):
+    """
+    Son kaydedilen filigrandan (mod_time_watermark) bu yana değişen ilanları GetSellerEvents ile çeker ve
+    import_ebay_natively ile aynı upsert yolundan yazar (rutin senkron birkaç çağrı tutar).
+    Filigran yoksa, son tam tarama full_scan_days'ten eskiyse veya API hata verirse tam taramaya düşer.
+    """
+    full_scan_days = full_scan_days or float(os.getenv("EBAY_FULL_SCAN_DAYS", DEFAULT_FULL_SCAN_DAYS))
+    supplier_id, store_id = get_or_create_supplier_store()
+    state = load_sync_state(store_id)
+    now = datetime.now(timezone.utc)
+
+    if not state or not state["mod_time_watermark"] or not state["last_full_scan_at"]:
+        print("Artımlı senkron filigranı yok, tam tarama yapılıyor...")
+        return import_ebay_natively()
+    if now - state["last_full_scan_at"] > timedelta(days=full_scan_days):
+        print(f"Son tam tarama {full_scan_days:g} günden eski, sapma düzeltmesi için tam tarama yapılıyor...")
+        return import_ebay_natively()
+
+    # EbayApiIntegrator tüm ilan önbelleğini yükler; artımlı yolda sadece API istemcisi gerekir
+    ebay = EbayManager(store_id=STORE_ID)
+    mod_from = state["mod_time_watermark"] - WATERMARK_OVERLAP
+    print(f"🔄 {mod_from:%Y-%m-%d %H:%M} (UTC) sonrası değişen ilanlar çekiliyor (GetSellerEvents)...")
+    items = _fetch_changed_items(ebay, mod_from, now)
+    if items is None:
+        print("Değişen ilanlar eksiksiz alınamadı, tam tarama yapılıyor...")
+        return import_ebay_natively()
+
+    # Aynı ilan birden fazla pencerede dönebilir: ItemID başına son hali
+    rows = {}
+    for item in items:
+        row = parse_api_item(item, TRADING_NS)
+        if row:
+            rows[row["item_id"]] = row
+    api_items = list(rows.values())
+    print(f"Toplam {len(api_items)} değişen ilan.")
+
+    result = upsert_api_items(api_items, supplier_id, store_id)
+    if not result["errors"]:
+        save_sync_state(store_id, mod_time_watermark=now)
+    return result
 
-    print("\n✅ eBay Native Pull İşlemi Başarıyla Tamamlandı!")
-    return {"success": len(api_items), "errors": 0}
 
 if __name__ == "__main__":
-    import_ebay_natively()
+    if "--incremental" in sys.argv[1:]:
+        import_ebay_incremental()
+    else:
+        import_ebay_natively()
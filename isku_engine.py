@@ -3,13 +3,6 @@ import os
 
 from pricing_engine import PricingEngine
 
-def calculate_new_price(cost):
-    if not cost or cost <= 0:
-        return None
-        
-    # Yeni PricingEngine sınıfını çağır
-    return PricingEngine.calculate_final_price(cost)
-
 def run_cerrahi_operasyon():
     easync_map = {}
     easync_file = "easync.csv"
@@ -34,6 +27,11 @@ def run_cerrahi_operasyon():
             if item_id:
                 easync_map[item_id] = {'asin': asin, 'cost': cost}
 
+    # Tüm maliyetler tek vektörel çağrıda fiyatlanır
+    entries = list(easync_map.values())
+    for entry, price in zip(entries, PricingEngine.calculate_final_prices([e['cost'] for e in entries])):
+        entry['price'] = float(price)
+
     print("2. eBay canlı ilanları okunuyor...")
     if not os.path.exists(ebay_file):
         print(f"HATA: {ebay_file} klasörde bulunamadı!")
@@ -90,7 +88,7 @@ def run_cerrahi_operasyon():
 
                 # KURAL 3: Fiyat formülünü uygula
                 if cost > 0:
-                    calculated = calculate_new_price(cost)
+                    calculated = easync_map[item_id]['price']
                     if calculated and calculated != current_price:
                         new_price = calculated
                         guncellenen_fiyat += 1
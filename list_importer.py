@@ -1,24 +1,11 @@
 import asyncio
-import os
 import sys
 import re
 import random
 from urllib.parse import urlparse, urljoin
 from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright
-from dotenv import load_dotenv
-from supabase import create_client, Client
-
-# Load environment variables
-load_dotenv()
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("Error: SUPABASE_URL or SUPABASE_KEY is missing in environment variables.")
-    sys.exit(1)
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+from database import db
 
 # Stealth settings
 USER_AGENTS = [
@@ -219,7 +206,7 @@ async def run_scraper(start_url: str):
             possible_asin = extract_asin_from_url(link)
             if possible_asin:
                 try:
-                    existing = supabase.table("draft").select("id").eq("product_id", possible_asin).limit(1).execute()
+                    existing = db.client.table("draft").select("id").eq("product_id", possible_asin).limit(1).execute()
                     if existing.data:
                         print(f"  [SKIPPED] ASIN {possible_asin} already exists in the draft list. Skipping full scan.")
                         continue
@@ -240,7 +227,7 @@ async def run_scraper(start_url: str):
                 del product_data["url"] # Don't insert URL column if not in schema usually
                 
                 try:
-                    res = supabase.table("draft").upsert(product_data, on_conflict="product_id").execute()
+                    res = db.client.table("draft").upsert(product_data, on_conflict="product_id").execute()
                     print(f"  -> DB Insert/Update Success.")
                     valid_items_added += 1
                 except Exception as db_err:
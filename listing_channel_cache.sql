@@ -0,0 +1,14 @@
+-- İlan başına eBay kanal bilgisi: fiyat/stok hangi API ile güncellenir.
+-- channel_api: 'inventory' (Sell Inventory API, channel_offer_id dolu) veya 'trading' (Easync/legacy ilan).
+-- channel_discovery.py bunları toplu doldurur; gönderim kodu her SKU için offer araması yapmak yerine
+-- bu kolonlara göre doğrudan bulk_update_price_quantity veya ReviseInventoryStatus'a gider.
+-- NULL: henüz sınıflanmamış (veya eskimiş offer nedeniyle sıfırlanmış), ilk gönderimde sınıflanır.
+
+ALTER TABLE listings ADD COLUMN IF NOT EXISTS channel_offer_id TEXT;
+ALTER TABLE listings ADD COLUMN IF NOT EXISTS channel_api TEXT;
+ALTER TABLE listings ADD COLUMN IF NOT EXISTS channel_checked_at TIMESTAMP WITH TIME ZONE;
+
+-- Keşif işi sadece sınıflanmamış ilanları tarar
+CREATE INDEX IF NOT EXISTS idx_listings_channel_unclassified ON listings (store_id) WHERE channel_api IS NULL;
+
+NOTIFY pgrst, 'reload schema';
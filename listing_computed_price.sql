@@ -0,0 +1,11 @@
+-- İlan başına saklanan (materialise edilmiş) otonom fiyat.
+-- computed_price, hangi kural sürümü (pricing_rules_version) ve hangi kaynak maliyetiyle (priced_cost)
+-- hesaplandığıyla birlikte yazılır. repricing_job.py sadece maliyeti veya kural sürümü eskimiş satırları
+-- yeniden hesaplar; portföy ekranı ve senkron kodu fiyatı okuma anında değil, bu kolondan alır.
+
+ALTER TABLE listings ADD COLUMN IF NOT EXISTS computed_price NUMERIC;
+ALTER TABLE listings ADD COLUMN IF NOT EXISTS pricing_rules_version BIGINT;
+ALTER TABLE listings ADD COLUMN IF NOT EXISTS priced_cost NUMERIC;
+ALTER TABLE listings ADD COLUMN IF NOT EXISTS priced_at TIMESTAMP WITH TIME ZONE;
+
+NOTIFY pgrst, 'reload schema';
@@ -3,6 +3,7 @@ import time
 from typing import Dict, Any, List
 
 from database import db
+from product_resolver import resolver
 from pricing_engine import PricingEngine
 from gemini_assistant import GeminiAssistant
 from ebay_core import EbayManager
@@ -17,6 +18,7 @@ class ListingEngine:
     def __init__(self):
         self.ai = GeminiAssistant()
         self.ebay = EbayManager(store_id=STORE_ID)
+        self._amazon_supplier_id = None
 
     def process_drafts_to_ebay(self, draft_ids: List[int]) -> Dict[str, Any]:
         """
@@ -24,16 +26,25 @@ class ListingEngine:
         """
         results = {"success": 0, "failed": 0, "skipped": 0, "details": []}
         
+        # Draft'ları ve ASIN eşleşmelerini tek seferde toplu çek (taslak başına sorgu yerine)
+        drafts = {}
+        for i in range(0, len(draft_ids), 200):
+            draft_res = db.client.table("draft").select("*").in_("id", draft_ids[i:i+200]).execute()
+            drafts.update({d["id"]: d for d in draft_res.data or []})
+        asins = [d.get("product_id") for d in drafts.values() if d.get("product_id")]
+        for asin in asins:
+            resolver.invalidate_asin(asin) # Başka süreçte listelenmiş olabilir, taze durumla başla
+        resolver.resolve_asins(asins)
+        
         for draft_id in draft_ids:
             try:
-                # 1. Draft bilgisini çek
-                draft_res = db.client.table("draft").select("*").eq("id", draft_id).execute()
-                if not draft_res.data:
+                # 1. Draft bilgisini al
+                draft_data = drafts.get(draft_id)
+                if not draft_data:
                     results["failed"] += 1
                     results["details"].append(f"Draft {draft_id} bulunamadı.")
                     continue
                     
-                draft_data = draft_res.data[0]
                 asin = draft_data.get("product_id")
                 
                 # 2. [KRİTİK GEREKSİNİM] Benzersizlik Kontrolü (Daha önce eklendi mi?)
@@ -118,6 +129,7 @@ class ListingEngine:
                 # 6. Başarılı ise Ana Veritabanına (core_products ve listings) Kaydet
                 print(f"[{asin}] Veritabanına işleniyor... Sonuç: {ebay_result}")
                 self._save_to_core_db(asin, isku, title, draft_id, raw_price, calc_price, qty)
+                resolver.invalidate_asin(asin)
                 
                 results["success"] += 1
                 results["details"].append(f"[{asin}] Başarılı: {ebay_result}")
@@ -133,51 +145,33 @@ class ListingEngine:
         Kritik Benzersizlik Kontrolü:
         core_products tablosunda bu asin var mı ve listings tablosunda bu ürün aktif mi?
         """
-        res = db.client.table("core_products").select("id").eq("asin", asin).execute()
-        if not res.data:
-            return False
-            
-        product_id = res.data[0]["id"]
-        
-        # Sadece ürünü tanımak yetmez, eBay'de aktif bir ilanı var mı diye de bakalım:
-        l_res = db.client.table("listings").select("id").eq("product_id", product_id).eq("store_id", STORE_ID).execute()
-        
-        return len(l_res.data) > 0
+        # Ayna birkaç dakika geride olabilir: ilan görünmüyorsa Supabase'e doğrudan sorulur
+        _, listing = resolver.listing_for(asin, STORE_ID, authoritative=True)
+        return listing is not None
+
+    def _get_amazon_supplier_id(self):
+        """Amazon US tedarikçi ID'sini bir kez sorgulayıp önbellekte tutar."""
+        if self._amazon_supplier_id is None:
+            sup_res = db.client.table("suppliers").select("id").eq("name", "Amazon US").execute()
+            self._amazon_supplier_id = sup_res.data[0]["id"] if sup_res.data else ""
+        return self._amazon_supplier_id or None
 
     def _save_to_core_db(self, asin, isku, title, draft_id, base_cost, listed_price, qty):
-        # 1. Core Product Insert
-        p_res = db.client.table("core_products").upsert({"asin": asin}).execute()
-        p_id = p_res.data[0]["id"]
-        
-        # 2. Ürün İçeriği
-        db.client.table("product_base_content").upsert({
-            "product_id": p_id,
-            "base_title": title[:255]
-        }).execute()
-        
-        # 3. Source Insert (Amazon'dan geldiği varsayımıyla)
-        # Supplier ID'sini bulalım (Yoksa oluşturalım)
-        sup_res = db.client.table("suppliers").select("id").eq("name", "Amazon US").execute()
-        sup_id = sup_res.data[0]["id"] if sup_res.data else None
-        
-        if sup_id:
-            db.client.table("sources").upsert({
-                "product_id": p_id,
-                "supplier_id": sup_id,
-                "source_code": asin,
-                "base_cost": base_cost
-            }).execute()
-            
-        # 4. eBay İlanını Listelere Ekle
-        db.client.table("listings").upsert({
-            "product_id": p_id,
+        # 1-4. Ürün, içerik, kaynak (Amazon'dan geldiği varsayımıyla) ve eBay ilanı tek RPC ile yazılır
+        bundle = {
+            "asin": asin,
+            "base_title": title[:255],
             "store_id": STORE_ID,
             "channel_sku": isku,
             "listed_price": listed_price,
             "quantity": qty,
             "is_active": True,
             "needs_sync": False
-        }).execute()
+        }
+        sup_id = self._get_amazon_supplier_id()
+        if sup_id:
+            bundle.update({"supplier_id": sup_id, "source_code": asin, "base_cost": base_cost})
+        db.upsert_product_bundles([bundle])
         
         # 5. Draft tablosundan düş
         db.client.table("draft").update({"needs_sync": False}).eq("id", draft_id).execute()
@@ -0,0 +1,17 @@
+-- needs_full_revise: ilanda fiyat/stok dışında bir alan (kategori, kargo/iade/ödeme politikası) değişti.
+-- PushEngine sadece bu ilanları ReviseFixedPriceItem ile tam revize eder; needs_sync=True olan diğer ilanlar
+-- fiyat/stok değişikliği sayılır ve 4'erli ReviseInventoryStatus çağrılarıyla gönderilir.
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = 'listings' AND column_name = 'needs_full_revise'
+    ) THEN
+        ALTER TABLE listings ADD COLUMN needs_full_revise BOOLEAN DEFAULT FALSE;
+        -- Geçiş anında kuyrukta bekleyen ilanların neyin değiştiği bilinmiyor: eskisi gibi tam revize edilsin
+        UPDATE listings SET needs_full_revise = TRUE WHERE needs_sync;
+    END IF;
+END $$;
+
+NOTIFY pgrst, 'reload schema';
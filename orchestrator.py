@@ -8,6 +8,7 @@ from playwright.async_api import async_playwright
 import pandas as pd
 
 from database import db
+from query_tracer import tracer
 from amazon_auth import ensure_logged_in, STATE_FILE, USER_AGENTS
 import amazon_file_handler
 import list_importer
@@ -70,9 +71,11 @@ async def run_orchestrator(headless: bool = True, step_mode: str = "all"):
             if step_mode in ["all", "sync"]:
                 # ==== ADIM 1: Veritabanından Amazon'a Yükleme (Upload) ====
                 export_path = os.path.join(os.path.dirname(__file__), "temp_uploads", "db_export_upload.xlsx")
-                if db.generate_amazon_export_file(export_path):
+                export_paths = db.generate_amazon_export_file(export_path)
+                if export_paths:
                     print("\\n--- [ADIM 1] WISH_LIST UPLOAD ---")
-                    await amazon_file_handler.upload_wishlist(page, export_path)
+                    for part_path in export_paths:
+                        await amazon_file_handler.upload_wishlist(page, part_path)
                 else:
                     print("\\n--- [ADIM 1] WISH_LIST UPLOAD ATLANDI (Aktarım listesi boş) ---")
                     
@@ -82,22 +85,23 @@ async def run_orchestrator(headless: bool = True, step_mode: str = "all"):
                     downloaded_files = await amazon_file_handler.download_categorical_lists(page)
                     
                     new_asins = []
-                    for file_path in downloaded_files:
-                        try:
-                            df = pd.read_excel(file_path, header=None, skiprows=12)
-                            for index, row in df.iterrows():
-                                val_0 = str(row.get(0, ""))
-                                if "Example line" in val_0 or "Line number" in val_0: continue
-                                asin = str(row.get(1, "")).strip()
-                                if not asin or len(asin) < 5: continue
+                    with tracer.job("orchestrator.adim2"):
+                        for file_path in downloaded_files:
+                            try:
+                                df = pd.read_excel(file_path, header=None, skiprows=12)
+                                for index, row in df.iterrows():
+                                    val_0 = str(row.get(0, ""))
+                                    if "Example line" in val_0 or "Line number" in val_0: continue
+                                    asin = str(row.get(1, "")).strip()
+                                    if not asin or len(asin) < 5: continue
                                 
-                                exists_core = db.client.table("core_products").select("id").eq("asin", asin).limit(1).execute()
-                                exists_draft = db.client.table("draft").select("id").eq("product_id", asin).limit(1).execute()
+                                    exists_core = db.client.table("core_products").select("id").eq("asin", asin).limit(1).execute()
+                                    exists_draft = db.client.table("draft").select("id").eq("product_id", asin).limit(1).execute()
                                 
-                                if not exists_core.data and not exists_draft.data:
-                                    new_asins.append(asin)
-                        except Exception as e:
-                            print(f"Hata: Liste okunurken problem yaşandı {file_path}: {e}")
+                                    if not exists_core.data and not exists_draft.data:
+                                        new_asins.append(asin)
+                            except Exception as e:
+                                print(f"Hata: Liste okunurken problem yaşandı {file_path}: {e}")
                             
                     new_asins = list(set(new_asins))
                     print(f"📌 Draft ve DB ile kıyaslandı. Toplam {len(new_asins)} adet yeni ASIN tespit edildi.")
@@ -131,10 +135,11 @@ async def run_orchestrator(headless: bool = True, step_mode: str = "all"):
                     
                     if harvested:
                         diff_asins = []
-                        for asin in harvested:
-                            exists_draft = db.client.table("draft").select("id").eq("product_id", asin).limit(1).execute()
-                            if not exists_draft.data:
-                                diff_asins.append(asin)
+                        with tracer.job("orchestrator.adim4"):
+                            for asin in harvested:
+                                exists_draft = db.client.table("draft").select("id").eq("product_id", asin).limit(1).execute()
+                                if not exists_draft.data:
+                                    diff_asins.append(asin)
                         
                         if diff_asins:
                             print(f"📌 Hasat edilen {len(diff_asins)} yeni fırsat ASIN'i taranıyor...")
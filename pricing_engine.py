@@ -1,79 +1,250 @@
+import bisect
 import math
+import os
+import threading
+import time
+from types import MappingProxyType
 from database import db
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_RULES_TTL = 15.0  # Kural sürümünün DB'den kontrol aralığı (saniye, PRICING_RULES_TTL ile değiştirilebilir)
+
+# Default fallback (Eğer veritabanında tablolar henüz oluşmadıysa kod patlamasın)
+DEFAULT_PRICING_RULES = {
+    "return_allowance_percent": 0.1,
+    "damage_allowance_percent": 0.1,
+    "overhead_allowance_percent": 0.1,
+    "ad_spend_percent": 0.0,
+    "sales_tax_allowance_percent": 3.0,
+    "additional_logistics_fee": 0.0,
+    "min_profit_absolute": 0.0
+}
+
+# DB'de kademe yoksa veya maliyet hiçbir kademeye düşmezse Kullanıcının Hard Kuralı: (üst sınır, yüzde, sabit)
+FALLBACK_TIERS = ((18.0, 0.0, 6.0), (24.0, 1.0, 6.0), (30.0, 2.0, 6.0), (36.0, 3.0, 6.0), (42.0, 5.0, 6.0))
+FALLBACK_TIER_ABOVE = (7.0, 6.0)
+
+
+class PricingRuleSet:
+    """
+    Bir pazar yerinin derlenmiş, değişmez fiyat kuralları.
+    Tamponlar ve kademeler bir kez float'a çevrilir. Kademe araması, tüm sınır noktalarının sıralı listesi
+    üzerinde bisect ile yapılır: iki komşu sınır arasındaki her aralık (ve her sınır noktası) için
+    sonuç derleme anında DB sırasındaki ilk eşleşen kademe + hard kural ile önceden çözülür.
+    version None ise kural seti sabittir (sürüm kontrolüyle geçersiz kılınmaz; testler ve ölçümler için).
+    """
+
+    __slots__ = (
+        "marketplace", "version", "rules", "tiers",
+        "sales_tax_allowance_percent", "min_profit_absolute", "ad_spend_percent",
+        "return_allowance_percent", "damage_allowance_percent", "overhead_allowance_percent",
+        "additional_logistics_fee", "_points", "_at_point", "_between", "_arrays",
+    )
+
+    def __init__(self, marketplace: str, rules: Optional[Dict], tiers: List[Dict], version: Optional[int] = None):
+        rules = dict(rules or DEFAULT_PRICING_RULES)
+        parsed_tiers = []
+        for tier in tiers or []:
+            min_p = float(tier.get('min_price', 0))
+            max_p = tier.get('max_price')
+            max_p = float(max_p) if max_p is not None else float('inf')
+            parsed_tiers.append((min_p, max_p, float(tier['margin_percent']), float(tier['margin_fixed'])))
+
+        set_ = lambda name, value: object.__setattr__(self, name, value)
+        set_("marketplace", marketplace)
+        set_("version", version)
+        set_("rules", MappingProxyType(rules))
+        set_("tiers", tuple(parsed_tiers))
+        set_("sales_tax_allowance_percent", float(rules.get('sales_tax_allowance_percent', 0.0)))
+        set_("min_profit_absolute", float(rules.get('min_profit_absolute', 0.0)))
+        set_("ad_spend_percent", float(rules.get('ad_spend_percent', 0.0)))
+        set_("return_allowance_percent", float(rules.get('return_allowance_percent', 0.1)))
+        set_("damage_allowance_percent", float(rules.get('damage_allowance_percent', 0.1)))
+        set_("overhead_allowance_percent", float(rules.get('overhead_allowance_percent', 0.1)))
+        set_("additional_logistics_fee", float(rules.get('additional_logistics_fee', 0.0)))
+
+        # Bisect indeksi: points[i] noktasının ve (points[i-1], points[i]) aralığının önceden çözülmüş marjları
+        points = {upper for upper, _, _ in FALLBACK_TIERS}
+        for min_p, max_p, _, _ in self.tiers:
+            points.update(p for p in (min_p, max_p) if math.isfinite(p))
+        points = sorted(points)
+        probes = [points[0] - 1.0] + [(a + b) / 2 for a, b in zip(points, points[1:])] + [points[-1] + 1.0]
+        set_("_points", tuple(points))
+        set_("_at_point", tuple(self._scan(p) for p in points))
+        set_("_between", tuple(self._scan(p) for p in probes))
+        set_("_arrays", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PricingRuleSet değiştirilemez; yeni kurallar için yeni bir set derleyin.")
+
+    def _scan(self, cost: float) -> Tuple[float, float]:
+        """Referans (doğrusal) arama: DB sırasındaki ilk eşleşen kademe, yoksa hard kural."""
+        for min_p, max_p, percent, fixed in self.tiers:
+            if min_p <= cost <= max_p:
+                return percent, fixed
+        for upper, percent, fixed in FALLBACK_TIERS:
+            if cost <= upper:
+                return percent, fixed
+        return FALLBACK_TIER_ABOVE
+
+    def margin_for(self, cost: float) -> Tuple[float, float]:
+        """Maliyetin (yüzde, sabit) kâr marjı; O(log n)."""
+        if cost != cost:  # NaN hiçbir sınırla karşılaştırılamaz
+            return self._scan(cost)
+        i = bisect.bisect_left(self._points, cost)
+        if i < len(self._points) and self._points[i] == cost:
+            return self._at_point[i]
+        return self._between[i]
+
+    def margins_for(self, costs):
+        """margin_for'un vektörel hali (np.searchsorted); (yüzde, sabit) dizileri döndürür."""
+        import numpy as np
+
+        if self._arrays is None:
+            object.__setattr__(self, "_arrays", (
+                np.array(self._points, dtype=np.float64),
+                np.array(self._at_point, dtype=np.float64).reshape(-1, 2),
+                np.array(self._between, dtype=np.float64).reshape(-1, 2),
+            ))
+        points, at_point, between = self._arrays
+
+        idx = np.searchsorted(points, costs, side='left')
+        clipped = np.minimum(idx, len(points) - 1)
+        exact = (idx < len(points)) & (points[clipped] == costs)
+        percent = np.where(exact, at_point[clipped, 0], between[idx, 0])
+        fixed = np.where(exact, at_point[clipped, 1], between[idx, 1])
+        return percent, fixed
+
 
 class PricingEngine:
     """
     Easync tabanlı fiyatlandırma formülünü uygulayan Yapay Zeka Muhasebecisi.
     Kullanıcının ERP vizyonu referans alınarak yazılmıştır.
     Dinamiği doğrudan Supabase'den beslenir.
+
+    Kurallar pazar yeri başına PricingRuleSet olarak derlenip süreç içinde önbelleklenir.
+    Ayarlar ekranı her kayıtta pricing_rules_version tablosundaki sürümü artırır; her süreç en geç
+    PRICING_RULES_TTL saniyede bir sürümleri tek sorguyla kontrol eder ve değişen setleri yeniden derler.
     """
-    
-    _rules_cache = {}
-    _tiers_cache = {}
-    
+
+    _rule_sets: Dict[str, PricingRuleSet] = {}
+    _versions: Dict[str, int] = {}
+    _versions_checked_at = 0.0
+    _lock = threading.Lock()
+    rules_ttl = float(os.getenv("PRICING_RULES_TTL", DEFAULT_RULES_TTL))
+
+    # ---------------------------------------------------------
+    # Kural setleri ve sürüm kontrolü
+    # ---------------------------------------------------------
+    @classmethod
+    def _fetch_versions(cls) -> Optional[Dict[str, int]]:
+        try:
+            res = db.client.table("pricing_rules_version").select("marketplace, version").execute()
+            return {r["marketplace"]: int(r["version"]) for r in res.data or []}
+        except Exception as e:
+            print(f"[Pricing Engine] Kural sürümü okunamadı: {e}")
+            return None
+
+    @classmethod
+    def _check_versions(cls):
+        """TTL dolduysa sürümleri kontrol eder; sürümü değişen (veya bilinmeyen) setleri düşürür."""
+        now = time.monotonic()
+        if now - cls._versions_checked_at < cls.rules_ttl:
+            return
+        cls._versions_checked_at = now
+        if not any(rs.version is not None for rs in cls._rule_sets.values()):
+            return
+        versions = cls._fetch_versions()
+        if versions is None:
+            return
+        with cls._lock:
+            cls._versions = versions
+            for marketplace, rs in list(cls._rule_sets.items()):
+                if rs.version is not None and rs.version != versions.get(marketplace, 0):
+                    del cls._rule_sets[marketplace]
+
+    @classmethod
+    def _compile_rule_set(cls, marketplace: str) -> PricingRuleSet:
+        # Sürüm veriden önce okunur: arada kural değişirse bir sonraki kontrolde set yeniden derlenir
+        versions = cls._fetch_versions()
+        version = (versions or {}).get(marketplace, 0)
+
+        try:
+            tiers = cls.fetch_tiers(marketplace)
+        except Exception as e:
+            print(f"[Pricing Engine] Profit tier çekme hatası: {e}")
+            tiers = []
+
+        try:
+            res = db.client.table("pricing_rules").select("*").eq("marketplace", marketplace).execute()
+            rules = res.data[0] if res.data else None
+        except Exception as e:
+            print(f"[Pricing Engine] Pricing rules çekme hatası: {e}")
+            rules = None
+
+        return PricingRuleSet(marketplace, rules, tiers, version=version)
+
+    @staticmethod
+    def fetch_tiers(marketplace: str) -> List[Dict]:
+        """Pazar yerinin kademelerini motorun değerlendirdiği sırada (DB sırası, ilk eşleşen kazanır) okur."""
+        res = db.client.table("profit_tiers").select("*").eq("marketplace", marketplace).execute()
+        return res.data if res.data else []
+
+    @classmethod
+    def get_rule_set(cls, marketplace: str) -> PricingRuleSet:
+        """Pazar yerinin derlenmiş kural setini döndürür (çağrı başına DB sorgusu yok)."""
+        cls._check_versions()
+        rs = cls._rule_sets.get(marketplace)
+        if rs is None:
+            rs = cls._compile_rule_set(marketplace)
+            with cls._lock:
+                rs = cls._rule_sets.setdefault(marketplace, rs)
+        return rs
+
+    @classmethod
+    def install_rule_set(cls, rule_set: PricingRuleSet):
+        """Hazır bir kural setini önbelleğe koyar (version None ise sürüm kontrolü onu geçersiz kılmaz)."""
+        with cls._lock:
+            cls._rule_sets[rule_set.marketplace] = rule_set
+
+    @classmethod
+    def invalidate(cls, marketplace: str = None):
+        """Bu süreçteki derlenmiş setleri düşürür (marketplace verilmezse hepsini)."""
+        with cls._lock:
+            if marketplace is None:
+                cls._rule_sets.clear()
+            else:
+                cls._rule_sets.pop(marketplace, None)
+
+    @classmethod
+    def bump_rules_version(cls, marketplace: str) -> Optional[int]:
+        """Kurallar kaydedildikten sonra çağrılır: DB'deki sürümü artırır, diğer süreçler TTL içinde yeniden yükler."""
+        cls.invalidate(marketplace)
+        try:
+            res = db.client.rpc("bump_pricing_rules_version", {"target_marketplace": marketplace}).execute()
+            return res.data
+        except Exception as e:
+            print(f"[Pricing Engine] Kural sürümü artırılamadı: {e}")
+            return None
+
     @classmethod
     def get_tier_margin_from_db(cls, marketplace: str, cost: float) -> dict:
-        """Supabase'den geliş maliyetine karşılık gelen kâr kademesini (Profit Tier) bulur."""
-        if marketplace not in cls._tiers_cache:
-            try:
-                res = db.client.table("profit_tiers").select("*").eq("marketplace", marketplace).execute()
-                cls._tiers_cache[marketplace] = res.data if res.data else []
-            except Exception as e:
-                print(f"[Pricing Engine] Profit tier çekme hatası: {e}")
-                cls._tiers_cache[marketplace] = []
-                
-        tiers = cls._tiers_cache[marketplace]
-        
-        if tiers:
-            for tier in tiers:
-                min_p = float(tier.get('min_price', 0))
-                max_p = tier.get('max_price')
-                max_p = float(max_p) if max_p is not None else float('inf')
-                
-                if min_p <= cost <= max_p:
-                    return {"percent": float(tier['margin_percent']), "fixed": float(tier['margin_fixed'])}
-        
-        # DB verisi yoksa veya bulamazsa Kullanıcının Hard Kuralı:
-        if cost <= 18:
-            return {"percent": 0.0, "fixed": 6.0}
-        elif cost <= 24:
-            return {"percent": 1.0, "fixed": 6.0}
-        elif cost <= 30:
-            return {"percent": 2.0, "fixed": 6.0}
-        elif cost <= 36:
-            return {"percent": 3.0, "fixed": 6.0}
-        elif cost <= 42:
-            return {"percent": 5.0, "fixed": 6.0}
-            return {"percent": 7.0, "fixed": 6.0}
+        """Geliş maliyetine karşılık gelen kâr kademesini (Profit Tier) derlenmiş kurallardan bulur."""
+        percent, fixed = cls.get_rule_set(marketplace).margin_for(cost)
+        return {"percent": percent, "fixed": fixed}
+
+    @classmethod
+    def get_tier_margins(cls, marketplace: str, costs):
+        """
+        get_tier_margin_from_db'nin vektörel hali: her maliyet için (yüzde, sabit) dizilerini döndürür.
+        DB sırasındaki ilk eşleşen kademe kazanır; eşleşmeyenler hard kurala düşer.
+        """
+        return cls.get_rule_set(marketplace).margins_for(costs)
 
     @classmethod
     def get_pricing_rules_from_db(cls, marketplace: str) -> dict:
-        """Supabase'den pazar yeri için belirlenmiş ERP Risk tamponlarını çeker."""
-        if marketplace not in cls._rules_cache:
-            try:
-                res = db.client.table("pricing_rules").select("*").eq("marketplace", marketplace).execute()
-                if res.data:
-                    cls._rules_cache[marketplace] = res.data[0]
-                else:
-                    cls._rules_cache[marketplace] = None
-            except Exception as e:
-                print(f"[Pricing Engine] Pricing rules çekme hatası: {e}")
-                cls._rules_cache[marketplace] = None
-                
-        if cls._rules_cache[marketplace]:
-            return cls._rules_cache[marketplace]
-            
-        # Default fallback (Eğer veritabanında tablolar henüz oluşmadıysa kod patlamasın)
-        return {
-            "return_allowance_percent": 0.1,
-            "damage_allowance_percent": 0.1,
-            "overhead_allowance_percent": 0.1,
-            "ad_spend_percent": 0.0,
-            "sales_tax_allowance_percent": 3.0,
-            "additional_logistics_fee": 0.0,
-            "min_profit_absolute": 0.0
-        }
+        """Pazar yeri için belirlenmiş ERP Risk tamponları (DB'de yoksa varsayılanlar)."""
+        return dict(cls.get_rule_set(marketplace).rules)
 
     @staticmethod
     def apply_psychological_rounding(raw_price: float) -> float:
@@ -97,24 +268,21 @@ class PricingEngine:
         category_id: str = None,
         override_marketplace_fee: float = None
     ) -> float:
-        """Nihai Vitrin Satış Fiyatını Tüm Tamponlarla Birlikte Hesaplar"""
-        if source_price <= 0:
+        """Nihai Vitrin Satış Fiyatını Tüm Tamponlarla Birlikte Hesaplar (0/negatif/NaN/sonsuz maliyet 0.0 döner)"""
+        if not (source_price > 0 and math.isfinite(source_price)):
             return 0.0
             
-        # 1. DB'den Verileri / Kuralları Çek
-        tier = PricingEngine.get_tier_margin_from_db(marketplace, source_price)
-        rules = PricingEngine.get_pricing_rules_from_db(marketplace)
+        # 1. Derlenmiş Kuralları Al (DB'ye sadece sürüm değiştiğinde gidilir)
+        rs = PricingEngine.get_rule_set(marketplace)
+        margin_percent, margin_fixed = rs.margin_for(source_price)
         
         # 2. Efektif Kaynak Maliyeti (Vergi Tamponu Eklenmiş = Checkout tax compensation)
-        sales_tax_allowance_pct = float(rules.get('sales_tax_allowance_percent', 0.0))
+        sales_tax_allowance_pct = rs.sales_tax_allowance_percent
         effective_source_price = source_price * (1.0 + (sales_tax_allowance_pct * 0.01))
         
         # 3. Kâr (Profit) Hesaplama
-        margin_percent = tier['percent']
-        margin_fixed = tier['fixed']
-        
         profit = (effective_source_price * margin_percent * 0.01) + margin_fixed
-        min_profit = float(rules.get('min_profit_absolute', 0.0))
+        min_profit = rs.min_profit_absolute
         
         if profit < min_profit:
             profit = min_profit
@@ -123,10 +291,10 @@ class PricingEngine:
         marketplace_fee_percent = override_marketplace_fee if override_marketplace_fee is not None else 15.0
             
         # 5. Toplam İşletme Yükü (Bölen Payda)
-        ad_spend = float(rules.get('ad_spend_percent', 0.0))
-        return_allowance = float(rules.get('return_allowance_percent', 0.1))
-        damage_allowance = float(rules.get('damage_allowance_percent', 0.1))
-        overhead_allowance = float(rules.get('overhead_allowance_percent', 0.1))
+        ad_spend = rs.ad_spend_percent
+        return_allowance = rs.return_allowance_percent
+        damage_allowance = rs.damage_allowance_percent
+        overhead_allowance = rs.overhead_allowance_percent
         
         total_burden_percent = marketplace_fee_percent + ad_spend + return_allowance + damage_allowance + overhead_allowance
         denominator = 1.0 - (total_burden_percent * 0.01)
@@ -136,7 +304,7 @@ class PricingEngine:
             denominator = 0.05 
             
         # 6. Lojistik ve Alt Toplam
-        additional_logistics_fee = float(rules.get('additional_logistics_fee', 0.0))
+        additional_logistics_fee = rs.additional_logistics_fee
         numerator = effective_source_price + profit + additional_logistics_fee
         
         # 7. Nihai Fiyat İlk Hesap (İlk Sabit Ücret $0.40 baz alınır)
@@ -153,6 +321,65 @@ class PricingEngine:
             
         return final_price
 
+    @staticmethod
+    def calculate_final_prices(costs, marketplace: str = "ebay", fee_percents=None, rule_set: PricingRuleSet = None):
+        """
+        calculate_final_price'ın toplu (NumPy) hali: kademe seçimi, tamponlar, $10 sabit ücret eşiği ve
+        .49/.98 yuvarlama tamamen vektörel yapılır. Sonuçlar skaler yolla bit düzeyinde aynıdır.
+        costs: dizi / liste / pandas Series. fee_percents: tek değer veya costs ile aynı boyda dizi (None = %15).
+        Dönüş costs bir Series ise aynı indeksli Series, değilse float64 ndarray. Skaler yolla aynı şekilde
+        0 ve altı, NaN veya sonsuz maliyetler 0.0 döner.
+        rule_set verilirse önbellekteki set yerine o kullanılır (kaydedilmemiş kurallarla simülasyon için).
+        """
+        import numpy as np
+
+        index = costs.index if hasattr(costs, "iloc") else None  # pandas Series
+        cost = np.asarray(costs, dtype=np.float64)
+        valid = (cost > 0) & np.isfinite(cost)
+        cost = np.where(valid, cost, 0.0)  # Geçersiz maliyetler hesaba girmez, sonda 0.0 yapılır
+        if fee_percents is None:
+            fee_percents = 15.0
+        fee = np.broadcast_to(np.asarray(fee_percents, dtype=np.float64), cost.shape)
+
+        rs = rule_set or PricingEngine.get_rule_set(marketplace)
+        margin_percent, margin_fixed = rs.margins_for(cost)
+
+        # İşlem sırası skaler yolla aynı tutulur (kayan nokta sonuçları birebir eşleşsin diye)
+        sales_tax_allowance_pct = rs.sales_tax_allowance_percent
+        effective_source_price = cost * (1.0 + (sales_tax_allowance_pct * 0.01))
+
+        profit = (effective_source_price * margin_percent * 0.01) + margin_fixed
+        min_profit = rs.min_profit_absolute
+        profit = np.where(profit < min_profit, min_profit, profit)
+
+        ad_spend = rs.ad_spend_percent
+        return_allowance = rs.return_allowance_percent
+        damage_allowance = rs.damage_allowance_percent
+        overhead_allowance = rs.overhead_allowance_percent
+
+        total_burden_percent = fee + ad_spend + return_allowance + damage_allowance + overhead_allowance
+        denominator = 1.0 - (total_burden_percent * 0.01)
+        denominator = np.where(denominator <= 0, 0.05, denominator)
+
+        additional_logistics_fee = rs.additional_logistics_fee
+        numerator = effective_source_price + profit + additional_logistics_fee
+
+        base = numerator / denominator
+        raw_price = base + 0.40
+        raw_price = np.where(raw_price < 10.00, base + 0.30, raw_price)
+
+        # .49 / .98 yuvarlaması: x.49 ve x.98'e en yakın double, round(x, 2) ile aynı sonucu verir
+        integer_part = np.floor(raw_price)
+        decimal_part = raw_price - integer_part
+        final_price = np.round(np.where(decimal_part < 0.49, integer_part + 0.49, integer_part + 0.98), 2)
+        final_price = np.where(valid, final_price, 0.0)
+
+        if index is not None:
+            import pandas as pd
+            return pd.Series(final_price, index=index)
+        return final_price
+
+
 if __name__ == "__main__":
     # Test Senaryosu: $10.00'lık ürün (Easync Kuralı 0-18 = %0)
     print("--- 10$ KAYNAK TESTI ---")
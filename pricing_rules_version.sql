@@ -0,0 +1,25 @@
+-- Fiyat kuralları (pricing_rules + profit_tiers) için pazar yeri başına sürüm damgası.
+-- Ayarlar ekranı her kayıtta bump_pricing_rules_version'ı çağırır; PricingEngine çalışan her süreçte
+-- sürümleri PRICING_RULES_TTL saniyede bir tek sorguyla kontrol eder ve değişen kural setlerini yeniden derler.
+-- Python tarafı: PricingEngine.bump_rules_version() / PricingEngine.get_rule_set()
+
+CREATE TABLE IF NOT EXISTS pricing_rules_version (
+    marketplace TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION public.bump_pricing_rules_version(target_marketplace TEXT)
+RETURNS BIGINT
+LANGUAGE sql
+AS $$
+    INSERT INTO pricing_rules_version (marketplace, version, updated_at)
+    VALUES (target_marketplace, 1, NOW())
+    ON CONFLICT (marketplace) DO UPDATE
+        SET version = pricing_rules_version.version + 1,
+            updated_at = NOW()
+    RETURNING version;
+$$;
+
+-- PostgREST şema önbelleğini yenile ki RPC hemen görünsün
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,255 @@
+"""
+ASIN / SKU -> ürün ve ilan çözümleyicisi.
+
+Botların ve ajanların tekil (point) sorgularını toplar:
+    * Aynı anda gelen istekler tek bir in_() sorgusunda birleştirilir (DataLoader tarzı).
+    * Bulunan kayıtlar LRU önbellekte, bulunamayanlar süreli (TTL) negatif önbellekte tutulur.
+    * Katalog aynası tazeyse önce ona bakılır, sadece aynada olmayanlar Supabase'e sorulur.
+
+Kullanım:
+    from product_resolver import resolver
+    resolver.resolve_asins(asins)            # Çalışma başında tek toplu çözümleme
+    product = resolver.resolve_asin("B0...") # Sonraki çağrılar önbellekten gelir
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional
+
+from database import db, DatabaseManager
+from catalog_mirror import mirror
+
+DEFAULT_MAX_ENTRIES = 20000      # LRU'da tutulacak en fazla pozitif kayıt
+DEFAULT_POSITIVE_TTL = 600       # Bulunan kayıtların geçerlilik süresi (saniye)
+DEFAULT_NEGATIVE_TTL = 120       # "Bulunamadı" cevabının geçerlilik süresi (saniye)
+IN_CHUNK_SIZE = 200              # PostgREST URL uzunluğu sınırı için in_() parça boyutu
+
+LISTING_COLUMNS = "id, product_id, store_id, channel_sku, channel_item_id, category_id, is_active"
+
+
+class _BatchLoader:
+    """
+    Eşzamanlı load_many çağrılarını birleştirir. Aynı anda yalnızca bir sorgu uçuşta olur;
+    o sırada gelen anahtarlar bir sonraki tek sorguda topluca çekilir.
+    """
+
+    def __init__(self, fetch_many: Callable[[List[str]], Dict[str, Optional[Dict]]]):
+        self._fetch_many = fetch_many
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+
+    def load_many(self, keys: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        futures = {}
+        with self._lock:
+            for key in keys:
+                future = self._pending.get(key)
+                if future is None:
+                    future = Future()
+                    self._pending[key] = future
+                futures[key] = future
+
+        with self._fetch_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if batch:
+                try:
+                    results = self._fetch_many(list(batch))
+                except Exception as e:
+                    for future in batch.values():
+                        future.set_exception(e)
+                else:
+                    for key, future in batch.items():
+                        future.set_result(results.get(key))
+
+        return {key: future.result() for key, future in futures.items()}
+
+
+class ProductResolver:
+    """ASIN ve kanal SKU'larını toplu sorgularla ürün/ilan kayıtlarına çözer."""
+
+    def __init__(
+        self,
+        manager: DatabaseManager = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        positive_ttl: float = DEFAULT_POSITIVE_TTL,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        use_mirror: bool = True,
+    ):
+        self.manager = manager or db
+        self.max_entries = max_entries
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.use_mirror = use_mirror and os.getenv("RESOLVER_USE_MIRROR", "1") != "0"
+        self._cache_lock = threading.Lock()
+        self._positive: "OrderedDict[tuple, tuple]" = OrderedDict()  # anahtar -> (değer, bitiş zamanı)
+        self._negative: Dict[tuple, float] = {}                       # anahtar -> bitiş zamanı
+        self._asin_loader = _BatchLoader(self._fetch_asins)
+        self._sku_loader = _BatchLoader(self._fetch_skus)
+
+    # ---------------------------------------------------------
+    # Önbellek
+    # ---------------------------------------------------------
+    def _cached(self, key: tuple):
+        """(bulundu_mu, değer) döndürür. Negatif önbellekteki anahtar için (True, None)."""
+        now = time.time()
+        with self._cache_lock:
+            entry = self._positive.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._positive.move_to_end(key)
+                    return True, entry[0]
+                del self._positive[key]
+            expires = self._negative.get(key)
+            if expires is not None:
+                if expires > now:
+                    return True, None
+                del self._negative[key]
+        return False, None
+
+    def _remember(self, key: tuple, value: Optional[Dict]):
+        now = time.time()
+        with self._cache_lock:
+            if value is None:
+                self._negative[key] = now + self.negative_ttl
+                self._positive.pop(key, None)
+                return
+            self._negative.pop(key, None)
+            self._positive[key] = (value, now + self.positive_ttl)
+            self._positive.move_to_end(key)
+            while len(self._positive) > self.max_entries:
+                self._positive.popitem(last=False)
+
+    def invalidate_asin(self, asin: str):
+        """ASIN'e ait kaydı önbellekten düşürür (yeni ilan açıldığında vb.)."""
+        with self._cache_lock:
+            self._positive.pop(("asin", asin), None)
+            self._negative.pop(("asin", asin), None)
+
+    def invalidate_sku(self, channel_sku: str):
+        with self._cache_lock:
+            self._positive.pop(("sku", channel_sku), None)
+            self._negative.pop(("sku", channel_sku), None)
+
+    def clear(self):
+        with self._cache_lock:
+            self._positive.clear()
+            self._negative.clear()
+
+    # ---------------------------------------------------------
+    # Toplu çekiciler
+    # ---------------------------------------------------------
+    @staticmethod
+    def _slim_listing(listing: Dict) -> Dict:
+        return {col: listing.get(col) for col in ("id", "product_id", "store_id", "channel_sku", "channel_item_id", "category_id", "is_active")}
+
+    def _mirror_ready(self) -> bool:
+        if not self.use_mirror:
+            return False
+        try:
+            return mirror.is_fresh()
+        except Exception:
+            return False
+
+    def _fetch_asins(self, asins: List[str]) -> Dict[str, Optional[Dict]]:
+        found = {}
+        remaining = asins
+        if self._mirror_ready():
+            for asin, product in mirror.products_by_asins(asins).items():
+                listings = [self._slim_listing(l) for l in mirror.listings_for(product["id"])]
+                sources = [{"id": src.get("id"), "supplier_id": src.get("supplier_id")} for src in mirror.sources_for(product["id"])]
+                found[asin] = {"product_id": product["id"], "asin": asin, "listings": listings, "sources": sources}
+            remaining = [a for a in asins if a not in found]
+
+        found.update(self._query_asins(remaining))
+        return found
+
+    def _query_asins(self, asins: List[str]) -> Dict[str, Optional[Dict]]:
+        """ASIN'leri aynayı ve önbelleği atlayarak doğrudan Supabase'den çeker."""
+        found = {}
+        for i in range(0, len(asins), IN_CHUNK_SIZE):
+            chunk = asins[i:i + IN_CHUNK_SIZE]
+            res = self.manager.client.table("core_products").select(f"id, asin, listings({LISTING_COLUMNS}), sources(id, supplier_id)").in_("asin", chunk).execute()
+            for p in res.data or []:
+                found.setdefault(p["asin"], {
+                    "product_id": p["id"],
+                    "asin": p["asin"],
+                    "listings": p.get("listings") or [],
+                    "sources": p.get("sources") or [],
+                })
+        return found
+
+    def _fetch_skus(self, skus: List[str]) -> Dict[str, Optional[Dict]]:
+        found = {}
+        remaining = skus
+        if self._mirror_ready():
+            for sku in skus:
+                listing = mirror.listing_by_sku(sku)
+                if listing:
+                    found[sku] = self._slim_listing(listing)
+            remaining = [s for s in skus if s not in found]
+
+        for i in range(0, len(remaining), IN_CHUNK_SIZE):
+            chunk = remaining[i:i + IN_CHUNK_SIZE]
+            res = self.manager.client.table("listings").select(LISTING_COLUMNS).in_("channel_sku", chunk).execute()
+            for l in res.data or []:
+                found.setdefault(l["channel_sku"], l)
+        return found
+
+    def _resolve(self, kind: str, loader: _BatchLoader, keys: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        results, missing = {}, []
+        for key in dict.fromkeys(k for k in keys if k):
+            hit, value = self._cached((kind, key))
+            if hit:
+                results[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            for key, value in loader.load_many(missing).items():
+                self._remember((kind, key), value)
+                results[key] = value
+        return results
+
+    # ---------------------------------------------------------
+    # Genel API
+    # ---------------------------------------------------------
+    def resolve_asins(self, asins: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """ASIN -> {product_id, asin, listings: [...], sources: [...]} (bulunamayanlar None)."""
+        return self._resolve("asin", self._asin_loader, asins)
+
+    def resolve_asin(self, asin: str) -> Optional[Dict]:
+        return self.resolve_asins([asin]).get(asin)
+
+    def resolve_skus(self, skus: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """channel_sku -> ilan kaydı {id, product_id, store_id, channel_sku, channel_item_id, is_active}."""
+        return self._resolve("sku", self._sku_loader, skus)
+
+    def resolve_sku(self, channel_sku: str) -> Optional[Dict]:
+        return self.resolve_skus([channel_sku]).get(channel_sku)
+
+    def listing_for(self, asin: str, store_id: str, authoritative: bool = False) -> tuple:
+        """
+        ASIN için (product_id, mağazadaki ilk ilan) döndürür; ürün yoksa (None, None).
+        authoritative=True iken ayna/önbellek ilan göstermiyorsa (ayna CATALOG_MIRROR_MAX_AGE kadar geride
+        olabilir) sonuç doğrudan Supabase'den okunur; mükerrer ilan kontrolü bunu kullanır.
+        """
+        product = self.resolve_asin(asin)
+        listing = self._store_listing(product, store_id)
+        if listing is None and authoritative:
+            product = self._query_asins([asin]).get(asin)
+            self._remember(("asin", asin), product)
+            listing = self._store_listing(product, store_id)
+        if not product:
+            return None, None
+        return product["product_id"], listing
+
+    @staticmethod
+    def _store_listing(product: Optional[Dict], store_id: str) -> Optional[Dict]:
+        if not product:
+            return None
+        return next((l for l in product["listings"] if l.get("store_id") == store_id), None)
+
+
+resolver = ProductResolver()
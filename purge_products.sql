@@ -0,0 +1,58 @@
+-- Ürünleri tüm alt kayıtlarıyla (product_documents, product_media, listings, sources,
+-- product_base_content, product_logistics) birlikte tek RPC çağrısında ve tek transaction içinde silen fonksiyon.
+-- Python tarafı: DatabaseManager.purge_products()
+--
+-- Parametreler:
+--   product_ids : silinecek core_products.id listesi (opsiyonel)
+--   asins       : silinecek ürünlerin ASIN listesi (opsiyonel, product_ids ile birleştirilir)
+--   dry_run     : TRUE ise hiçbir şey silinmez, sadece tablo başına etkilenecek satır sayısı döner
+-- Dönüş: (table_name, row_count) — alt tablolar önce, core_products en son.
+-- Veritabanında bulunmayan alt tablolar atlanır.
+
+CREATE OR REPLACE FUNCTION public.purge_products(
+    product_ids UUID[] DEFAULT NULL,
+    asins TEXT[] DEFAULT NULL,
+    dry_run BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (table_name TEXT, row_count BIGINT)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    child TEXT;
+    targets UUID[];
+    affected BIGINT;
+BEGIN
+    SELECT COALESCE(array_agg(DISTINCT p.id), '{}') INTO targets
+    FROM core_products p
+    WHERE p.id = ANY(COALESCE(product_ids, '{}'))
+       OR p.asin = ANY(COALESCE(asins, '{}'));
+
+    FOREACH child IN ARRAY ARRAY['product_documents', 'product_media', 'listings', 'sources', 'product_base_content', 'product_logistics']
+    LOOP
+        CONTINUE WHEN to_regclass('public.' || child) IS NULL;
+        IF dry_run THEN
+            EXECUTE format('SELECT count(*) FROM %I WHERE product_id = ANY($1)', child) INTO affected USING targets;
+        ELSE
+            EXECUTE format('DELETE FROM %I WHERE product_id = ANY($1)', child) USING targets;
+            GET DIAGNOSTICS affected = ROW_COUNT;
+        END IF;
+        table_name := child;
+        row_count := affected;
+        RETURN NEXT;
+    END LOOP;
+
+    IF dry_run THEN
+        affected := COALESCE(array_length(targets, 1), 0);
+    ELSE
+        DELETE FROM core_products WHERE id = ANY(targets);
+        GET DIAGNOSTICS affected = ROW_COUNT;
+    END IF;
+    table_name := 'core_products';
+    row_count := affected;
+    RETURN NEXT;
+END;
+$$;
+
+-- PostgREST şema önbelleğini yenile ki RPC hemen görünsün
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,378 @@
+"""
+Supabase sorgu izleyicisi (instrumentation) ve N+1 dedektörü.
+
+Her PostgREST çağrısı için tablo, işlem, filtre şekli, satır sayısı, payload boyutu, gecikme ve
+çağıran fonksiyon süreç içi bir halka tampona (ring buffer) yazılır:
+    * İzleme varsayılan olarak kapalıdır; SUPABASE_TRACE=1 ile açılır.
+    * supabase-py istemcisi database.get_client() içinde sarmalanır; payload boyutları yeniden
+      serileştirilmeden, httpx havuzuna eklenen olay kancalarıyla HTTP yanıtından okunur.
+    * Ham aiohttp çağrıları database.create_async_session() oturumuna eklenen trace config ile yakalanır.
+
+Bir iş (job) içinde aynı sorgu şekli eşik değerinden fazla tekrarlanırsa N+1 uyarısı basılır:
+    from query_tracer import tracer
+    with tracer.job("orchestrator.adim2"):
+        ...
+
+İz dosyası: tracer.export_json(path) / tracer.export_csv(path) veya QUERY_TRACE_EXPORT=trace.json|trace.csv
+ile süreç kapanırken otomatik yazılır.
+"""
+import atexit
+import contextvars
+import csv
+import functools
+import json
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+DEFAULT_CAPACITY = 5000       # Halka tamponda tutulacak son sorgu kaydı sayısı
+DEFAULT_N1_THRESHOLD = 20     # Bir iş içinde aynı şeklin kaç tekrarından sonra N+1 sayılacağı
+
+WRITE_OPS = ("insert", "upsert", "update", "delete")
+QUERY_OPS = ("select",) + WRITE_OPS
+HTTP_OPS = {"GET": "select", "HEAD": "select", "POST": "insert", "PATCH": "update", "PUT": "upsert", "DELETE": "delete"}
+
+_LIBRARY_DIRS = tuple({p for p in (sysconfig.get_paths().get(k) for k in ("stdlib", "purelib", "platlib")) if p})
+_current_job: contextvars.ContextVar = contextvars.ContextVar("query_tracer_job", default=None)
+
+
+def tracing_enabled() -> bool:
+    """İzleme yalnızca SUPABASE_TRACE=1 (veya 0 dışı bir değer) verildiğinde açıktır."""
+    return os.getenv("SUPABASE_TRACE", "0") not in ("", "0")
+
+
+@functools.lru_cache(maxsize=1024)
+def _is_app_file(filename: str) -> bool:
+    is_library = filename.startswith(_LIBRARY_DIRS) or "site-packages" in filename or "dist-packages" in filename
+    return filename != __file__ and not is_library and not filename.startswith("<")
+
+
+def _caller() -> str:
+    """Kütüphane ve izleyici çerçevelerini atlayarak sorguyu tetikleyen ilk uygulama fonksiyonunu bulur.
+    Dosya sınıflandırması önbelleklenir; yürüyüş yalnızca izleme açıkken yapılır."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if _is_app_file(frame.f_code.co_filename):
+            return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "?"
+
+
+def _body_size(message, attr: str) -> int:
+    """httpx istek/yanıt gövdesinin bayt sayısı; gövde okunamazsa Content-Length başlığına düşer."""
+    if message is None:
+        return 0
+    try:
+        return len(getattr(message, attr))
+    except Exception:
+        try:
+            return int(message.headers.get("content-length") or 0)
+        except (TypeError, ValueError):
+            return 0
+
+
+class _Job:
+    """Tek bir iş (job) boyunca şekil sayaçlarını ve N+1 bulgularını tutar."""
+
+    def __init__(self, name: str, threshold: int):
+        self.name = name
+        self.threshold = threshold
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.latency_ms = 0.0
+        self.shapes: Counter = Counter()
+        self.flagged: Dict[str, str] = {}  # şekil -> ilk görülen çağıran
+        self._lock = threading.Lock()
+
+    def observe(self, record: Dict):
+        shape = record["shape_key"]
+        with self._lock:
+            self.queries += 1
+            self.latency_ms += record["latency_ms"]
+            self.shapes[shape] += 1
+            count = self.shapes[shape]
+            newly_flagged = count > self.threshold and shape not in self.flagged
+            if newly_flagged:
+                self.flagged[shape] = record["caller"]
+        if newly_flagged:
+            print(f"[Query Tracer] ⚠️ N+1 şüphesi ({self.name}): '{shape}' bu işte {count}+ kez çağrıldı ({record['caller']}).")
+
+    def summary(self) -> Dict:
+        return {
+            "job": self.name,
+            "queries": self.queries,
+            "latency_ms": round(self.latency_ms, 1),
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "top_shapes": self.shapes.most_common(5),
+            "n_plus_one": [{"shape": s, "count": self.shapes[s], "caller": c} for s, c in self.flagged.items()],
+        }
+
+
+class _TracedQuery:
+    """PostgREST sorgu kurucusunu sarar; zincirlenen çağrılardan filtre şeklini çıkarır, execute() süresini ölçer."""
+
+    def __init__(self, builder, tracer: "QueryTracer", table: str, op: str = None, shape: tuple = (), payload=None):
+        self._builder = builder
+        self._tracer = tracer
+        self._table = table
+        self._op = op
+        self._shape = shape
+        self._payload = payload
+
+    def _chain(self, name: str, args: tuple, result):
+        if not hasattr(result, "execute"):
+            return result
+        op, shape, payload = self._op, self._shape, self._payload
+        if name in QUERY_OPS:
+            op = name
+            if name in ("insert", "upsert", "update") and args:
+                payload = args[0]
+        elif name not in ("order", "limit", "range", "single", "maybe_single"):
+            column = args[0] if args and isinstance(args[0], str) and name != "or_" else ""
+            shape = shape + (f"{name}({column})" if column else name,)
+        return _TracedQuery(result, self._tracer, self._table, op, shape, payload)
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if callable(attr):
+            def call(*args, **kwargs):
+                return self._chain(name, args, attr(*args, **kwargs))
+            return call
+        return self._chain(name, (), attr)
+
+    def execute(self):
+        self._tracer._last_http.response = None
+        start = time.perf_counter()
+        response, error = None, None
+        try:
+            response = self._builder.execute()
+            return response
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            data = getattr(response, "data", None)
+            http_response = self._tracer._last_http.response
+            self._tracer._last_http.response = None
+            self._tracer.record(
+                table=self._table,
+                op=self._op or "select",
+                shape=",".join(self._shape),
+                rows=len(data) if isinstance(data, list) else (1 if data else 0),
+                bytes_sent=_body_size(getattr(http_response, "request", None), "content"),
+                bytes_received=_body_size(http_response, "content"),
+                latency_ms=(time.perf_counter() - start) * 1000,
+                error=error,
+            )
+
+
+class _TracedClient:
+    """supabase.Client vekili: table()/from_()/rpc() izlenir, geri kalan her şey olduğu gibi geçer."""
+
+    def __init__(self, client, tracer: "QueryTracer"):
+        self._client = client
+        self._tracer = tracer
+
+    def table(self, name: str):
+        return _TracedQuery(self._client.table(name), self._tracer, name)
+
+    def from_(self, name: str):
+        return _TracedQuery(self._client.from_(name), self._tracer, name)
+
+    def rpc(self, fn: str, params: dict = None, *args, **kwargs):
+        builder = self._client.rpc(fn, params or {}, *args, **kwargs)
+        return _TracedQuery(builder, self._tracer, f"rpc:{fn}", "rpc", payload=params)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class QueryTracer:
+    """Süreç içi sorgu kaydı, iş bazlı N+1 tespiti ve JSON/CSV dışa aktarım."""
+
+    FIELDS = ("ts", "job", "table", "op", "shape", "rows", "bytes_sent", "bytes_received", "latency_ms", "caller", "error")
+
+    def __init__(self, capacity: int = None, n1_threshold: int = None):
+        self.capacity = capacity or int(os.getenv("QUERY_TRACE_SIZE", DEFAULT_CAPACITY))
+        self.n1_threshold = n1_threshold or int(os.getenv("QUERY_TRACE_N1_THRESHOLD", DEFAULT_N1_THRESHOLD))
+        self.enabled = tracing_enabled()
+        self._buffer: deque = deque(maxlen=self.capacity)
+        self._lock = threading.Lock()
+        self._last_http = threading.local()  # Bu thread'in son httpx yanıtı (execute() bayt sayımı için)
+
+    # ---------------------------------------------------------
+    # Sarmalama
+    # ---------------------------------------------------------
+    def wrap_client(self, client):
+        if not self.enabled or isinstance(client, _TracedClient):
+            return client
+        return _TracedClient(client, self)
+
+    def httpx_event_hooks(self) -> Dict[str, list]:
+        """Paylaşılan httpx havuzuna eklenen kancalar: son yanıtı thread'e not eder ki
+        _TracedQuery.execute() bayt sayısını yanıtın kendisinden okuyabilsin."""
+        def on_response(response):
+            self._last_http.response = response
+
+        return {"response": [on_response]}
+
+    def aiohttp_trace_config(self):
+        """Ham aiohttp PostgREST çağrılarını kaydeden TraceConfig (create_async_session tarafından eklenir)."""
+        import aiohttp
+
+        async def on_start(session, ctx, params):
+            ctx.start = time.perf_counter()
+            ctx.sent = 0
+            ctx.caller = _caller()
+
+        async def on_chunk_sent(session, ctx, params):
+            ctx.sent = getattr(ctx, "sent", 0) + len(params.chunk)
+
+        async def on_end(session, ctx, params):
+            self._record_http(ctx, params.method, params.url, params.response.status, params.response.content_length)
+
+        async def on_error(session, ctx, params):
+            self._record_http(ctx, params.method, params.url, None, None, error=repr(params.exception))
+
+        config = aiohttp.TraceConfig()
+        config.on_request_start.append(on_start)
+        config.on_request_chunk_sent.append(on_chunk_sent)
+        config.on_request_end.append(on_end)
+        config.on_request_exception.append(on_error)
+        return config
+
+    def _record_http(self, ctx, method: str, url, status, content_length, error: str = None):
+        parts = urlsplit(str(url))
+        table = parts.path.rstrip("/").rsplit("/", 1)[-1]
+        shape = []
+        for column, value in parse_qsl(parts.query):
+            if column in ("select", "order", "limit", "offset", "on_conflict"):
+                continue
+            shape.append(f"{value.split('.', 1)[0]}({column})")
+        if error is None and status is not None and status >= 400:
+            error = f"HTTP {status}"
+        self.record(
+            table=table,
+            op=HTTP_OPS.get(method.upper(), method.lower()),
+            shape=",".join(shape),
+            rows=0,
+            bytes_sent=getattr(ctx, "sent", 0),
+            bytes_received=content_length or 0,
+            latency_ms=(time.perf_counter() - getattr(ctx, "start", time.perf_counter())) * 1000,
+            caller=getattr(ctx, "caller", None),
+            error=error,
+        )
+
+    # ---------------------------------------------------------
+    # Kayıt
+    # ---------------------------------------------------------
+    def record(
+        self,
+        table: str,
+        op: str,
+        shape: str = "",
+        rows: int = 0,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        latency_ms: float = 0.0,
+        caller: str = None,
+        error: str = None,
+    ) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        job = _current_job.get()
+        record = {
+            "ts": time.time(),
+            "job": job.name if job else None,
+            "table": table,
+            "op": op,
+            "shape": shape,
+            "rows": rows,
+            "bytes_sent": bytes_sent,
+            "bytes_received": bytes_received,
+            "latency_ms": round(latency_ms, 2),
+            "caller": caller or _caller(),
+            "error": error,
+        }
+        record["shape_key"] = f"{op} {table}" + (f" [{shape}]" if shape else "")
+        with self._lock:
+            self._buffer.append(record)
+        if job:
+            job.observe(record)
+        return record
+
+    @contextmanager
+    def job(self, name: str, n1_threshold: int = None, verbose: bool = True):
+        """Bir iş boyunca sorguları etiketler; çıkışta özet basar, N+1 şüphelerini raporlar."""
+        job = _Job(name, n1_threshold or self.n1_threshold)
+        token = _current_job.set(job)
+        try:
+            yield job
+        finally:
+            _current_job.reset(token)
+            if verbose and self.enabled:
+                s = job.summary()
+                print(f"[Query Tracer] {name}: {s['queries']} sorgu, {s['latency_ms']} ms DB süresi, {len(s['n_plus_one'])} N+1 şüphesi.")
+
+    def records(self, job: str = None) -> List[Dict]:
+        with self._lock:
+            rows = list(self._buffer)
+        return [r for r in rows if job is None or r["job"] == job]
+
+    def summary(self, job: str = None) -> List[Dict]:
+        """Şekil bazında toplam çağrı, satır ve gecikme (en pahalıdan ucuza)."""
+        totals: Dict[str, Dict] = {}
+        for r in self.records(job):
+            t = totals.setdefault(r["shape_key"], {"shape": r["shape_key"], "calls": 0, "rows": 0, "latency_ms": 0.0, "callers": Counter()})
+            t["calls"] += 1
+            t["rows"] += r["rows"]
+            t["latency_ms"] += r["latency_ms"]
+            t["callers"][r["caller"]] += 1
+        result = sorted(totals.values(), key=lambda t: t["latency_ms"], reverse=True)
+        for t in result:
+            t["latency_ms"] = round(t["latency_ms"], 1)
+            t["callers"] = dict(t["callers"].most_common(3))
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._buffer.clear()
+
+    # ---------------------------------------------------------
+    # Dışa aktarım
+    # ---------------------------------------------------------
+    def export_json(self, path: str, job: str = None) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"records": [{k: r[k] for k in self.FIELDS} for r in self.records(job)], "summary": self.summary(job)}, f, ensure_ascii=False, indent=2)
+        return path
+
+    def export_csv(self, path: str, job: str = None) -> str:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.records(job))
+        return path
+
+    def export(self, path: str, job: str = None) -> str:
+        return self.export_csv(path, job) if path.lower().endswith(".csv") else self.export_json(path, job)
+
+
+tracer = QueryTracer()
+
+
+def _export_on_exit():
+    path = os.getenv("QUERY_TRACE_EXPORT")
+    if path and tracer.enabled:
+        try:
+            tracer.export(path)
+        except Exception as e:
+            print(f"[Query Tracer] İz dosyası yazılamadı ({path}): {e}")
+
+
+atexit.register(_export_on_exit)
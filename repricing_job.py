@@ -0,0 +1,251 @@
+"""
+Tüm katalog için yeniden fiyatlandırma (repricing) fark motoru.
+
+Maliyet veya fiyat kuralları değiştiğinde ilanları tek tek yeniden hesaplayıp hepsini needs_sync=True
+işaretlemek yerine:
+    1. (ilan, ürün, maliyet, mevcut listed_price, kategori komisyonu) kayıtları toplu okunur,
+    2. yeni fiyatlar tek vektörel çağrıda (PricingEngine.calculate_final_prices) hesaplanır,
+    3. sadece fiyatı tolerans dışında değişen ilanlar yazılır ve eBay senkronu için işaretlenir.
+
+Hesaplanan fiyat ilanın computed_price kolonuna, türetildiği kural sürümü (pricing_rules_version) ve
+kaynak maliyetiyle (priced_cost) birlikte saklanır. Damga sadece maliyeti veya kural sürümü eskimiş
+satırlarda yenilenir; ekranlar fiyatı her gösterimde hesaplamak yerine bu kolondan okur.
+
+Kullanım:
+    python repricing_job.py            # Değişiklikleri yaz
+    python repricing_job.py --dry-run  # Sadece kaç ilanın değişeceğini göster
+    python repricing_job.py --loop     # Arka planda REPRICE_INTERVAL saniyede bir çalış
+"""
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+
+import pandas as pd
+
+from database import db, DatabaseManager
+from pricing_engine import PricingEngine, PricingRuleSet
+from write_buffer import write_buffer
+
+DEFAULT_TOLERANCE = 0.005   # Bu kadar veya daha az fark "değişmedi" sayılır ($)
+DEFAULT_FEE_PERCENT = 15.0  # Kategorisi veya kategori komisyonu olmayan ilanlar için
+DEFAULT_INTERVAL = 900      # --loop modunda iki çalışma arası bekleme (saniye)
+IN_CHUNK_SIZE = 200         # product_ids filtresinde in_() parça boyutu (PostgREST URL uzunluğu sınırı)
+
+LISTING_COLUMNS = ["id", "product_id", "listed_price", "category_id", "computed_price", "pricing_rules_version", "priced_cost"]
+
+
+class RepricingJob:
+    """Katalogu toplu fiyatlar ve yalnızca fiyatı değişen ilanları yazar."""
+
+    def __init__(
+        self,
+        manager: DatabaseManager = None,
+        marketplace: str = "ebay",
+        tolerance: float = None,
+        default_fee_percent: float = DEFAULT_FEE_PERCENT,
+        store_ids: Iterable[str] = None,
+    ):
+        self.manager = manager or db
+        self.marketplace = marketplace
+        self.tolerance = tolerance if tolerance is not None else float(os.getenv("REPRICE_TOLERANCE", DEFAULT_TOLERANCE))
+        self.default_fee_percent = default_fee_percent
+        self.store_ids = list(store_ids) if store_ids is not None else None
+        self._fees = None
+
+    # ---------------------------------------------------------
+    # Toplu okuma
+    # ---------------------------------------------------------
+    def load(self, product_ids: Iterable[str] = None) -> pd.DataFrame:
+        """
+        İlan başına bir satır: listing_id, product_id, listed_price, category_id, computed_price,
+        pricing_rules_version, priced_cost, base_cost, fee_percent.
+        Sadece işin pazar yerindeki mağazaların ilanları okunur (diğer pazarlar bu kurallarla fiyatlanmaz).
+        Ürünün birden fazla kaynağı varsa ilki (id sırası) kullanılır; product_ids verilirse sadece o ürünlerin
+        ilan ve kaynakları (parça parça in_ sorgularıyla) okunur.
+        """
+        store_ids = self.marketplace_store_ids()
+        listings = pd.DataFrame(
+            self._read_rows(
+                "listings", ", ".join(LISTING_COLUMNS), product_ids,
+                filters=lambda q: q.in_("store_id", store_ids),
+            ) if store_ids else [],
+            columns=LISTING_COLUMNS,
+        ).rename(columns={"id": "listing_id"})
+
+        sources = pd.DataFrame(
+            self._read_rows("sources", "id, product_id, base_cost", product_ids, filters=lambda q: q.not_.is_("base_cost", "null")),
+            columns=["id", "product_id", "base_cost"],
+        ).sort_values("id", kind="stable").drop_duplicates(subset="product_id", keep="first")
+
+        frame = listings.merge(sources[["product_id", "base_cost"]], on="product_id", how="left")
+        frame["fee_percent"] = self.fee_percents_for(frame["category_id"])
+        for column in ("base_cost", "listed_price", "computed_price", "priced_cost", "pricing_rules_version"):
+            frame[column] = pd.to_numeric(frame[column], errors="coerce")
+        return frame.reset_index(drop=True)
+
+    def marketplace_store_ids(self) -> list:
+        """İşin pazar yerine (marketplaces.name, büyük/küçük harf duyarsız) bağlı mağazaların ID'leri."""
+        if self.store_ids is None:
+            res = self.manager.client.table("stores").select("id, marketplaces(name)").execute()
+            self.store_ids = [
+                s["id"] for s in res.data or []
+                if ((s.get("marketplaces") or {}).get("name") or "").lower() == self.marketplace.lower()
+            ]
+        return self.store_ids
+
+    def category_fees(self) -> pd.Series:
+        """category_id -> pazaryeri komisyonu (%); ilk çağrıda okunur ve örnek ömrü boyunca saklanır."""
+        if self._fees is None:
+            categories = pd.DataFrame(
+                list(self.manager.iter_rows(
+                    "marketplace_categories", "category_id, marketplace, marketplace_fee_percent",
+                    key="category_id", tiebreaker="marketplace",
+                    filters=lambda q: q.eq("marketplace", self.marketplace),
+                )),
+                columns=["category_id", "marketplace", "marketplace_fee_percent"],
+            )
+            self._fees = pd.to_numeric(categories.set_index("category_id")["marketplace_fee_percent"], errors="coerce")
+        return self._fees
+
+    def fee_percents_for(self, category_ids) -> pd.Series:
+        """Kategori başına komisyon; kategorisi veya komisyonu olmayanlara default_fee_percent."""
+        ids = category_ids if isinstance(category_ids, pd.Series) else pd.Series(list(category_ids), dtype=object)
+        return ids.map(self.category_fees()).fillna(self.default_fee_percent).astype(float)
+
+    def price(self, base_costs, category_ids):
+        """
+        Satış fiyatları, diff() ile aynı kural seti ve kategori komisyonlarıyla (tek vektörel çağrı).
+        İlanları bu job dışında fiyatlayan kod (örn. amazon_sync_bot) bunu kullanır ki yazdığı
+        computed_price damgası job tarafından "eski" sayılıp ters yönde yeniden yazılmasın.
+        """
+        fees = self.fee_percents_for(category_ids).to_numpy()
+        return PricingEngine.calculate_final_prices(list(base_costs), marketplace=self.marketplace, fee_percents=fees)
+
+    def _read_rows(self, table: str, columns: str, product_ids: Iterable[str] = None, filters=None) -> list:
+        """Tablonun satırları; product_ids verilirse sadece o ürünlerinkiler (IN_CHUNK_SIZE'lık in_ filtreleriyle)."""
+        if product_ids is None:
+            return list(self.manager.iter_rows(table, columns, filters=filters))
+
+        ids = list(dict.fromkeys(product_ids))
+        rows = []
+        for i in range(0, len(ids), IN_CHUNK_SIZE):
+            chunk = ids[i:i + IN_CHUNK_SIZE]
+
+            def chunk_filters(q, chunk=chunk):
+                q = q.in_("product_id", chunk)
+                return filters(q) if filters else q
+            rows.extend(self.manager.iter_rows(table, columns, filters=chunk_filters))
+        return rows
+
+    # ---------------------------------------------------------
+    # Hesaplama ve fark
+    # ---------------------------------------------------------
+    def diff(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Maliyeti olan ilanları fiyatlar; new_price, changed (listed_price farklı) ve stale (saklanan
+        computed_price damgası eski: maliyet, kural sürümü veya sonuç farklı) sütunlarını ekler.
+        """
+        rule_set = PricingEngine.get_rule_set(self.marketplace)
+        version = rule_set.version or 0
+
+        priced = frame[frame["base_cost"] > 0].copy()
+        priced["new_price"] = PricingEngine.calculate_final_prices(
+            priced["base_cost"], marketplace=self.marketplace, fee_percents=priced["fee_percent"].to_numpy()
+        )
+        priced["rules_version"] = version
+        priced["changed"] = priced["listed_price"].isna() | ((priced["new_price"] - priced["listed_price"]).abs() > self.tolerance)
+        priced["stale"] = (
+            priced["computed_price"].isna()
+            | (priced["pricing_rules_version"] != version)
+            | ((priced["priced_cost"] - priced["base_cost"]).abs() > self.tolerance)
+            | ((priced["new_price"] - priced["computed_price"]).abs() > self.tolerance)
+        ).fillna(True)
+        return priced
+
+    def simulate(self, frame: pd.DataFrame, rule_set: PricingRuleSet) -> pd.DataFrame:
+        """
+        What-if: maliyeti olan ilanları hem yürürlükteki kurallarla hem de kaydedilmemiş rule_set ile
+        fiyatlar (DB'ye yazmadan, iki vektörel çağrı). Eklenen sütunlar: current_price, proposed_price,
+        delta, current_margin, proposed_margin (brüt marj %, (fiyat - maliyet) / fiyat) ve needs_revise
+        (önerilen fiyat eBay'deki listed_price'tan tolerans dışında farklı).
+        """
+        priced = frame[frame["base_cost"] > 0].copy()
+        fees = priced["fee_percent"].to_numpy()
+        priced["current_price"] = PricingEngine.calculate_final_prices(priced["base_cost"], marketplace=self.marketplace, fee_percents=fees)
+        priced["proposed_price"] = PricingEngine.calculate_final_prices(priced["base_cost"], fee_percents=fees, rule_set=rule_set)
+        priced["delta"] = priced["proposed_price"] - priced["current_price"]
+        priced["current_margin"] = (priced["current_price"] - priced["base_cost"]) / priced["current_price"] * 100
+        priced["proposed_margin"] = (priced["proposed_price"] - priced["base_cost"]) / priced["proposed_price"] * 100
+        priced["needs_revise"] = priced["listed_price"].isna() | ((priced["proposed_price"] - priced["listed_price"]).abs() > self.tolerance)
+        return priced
+
+    def run(self, product_ids: Iterable[str] = None, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Yeniden fiyatlandırır. Damgası eskimiş ilanlara computed_price damgasını, fiyatı değişen ilanlara
+        ayrıca listed_price + needs_sync=True yazar; ikisi de değilse satıra dokunulmaz.
+        Yazılamayan ilan sayısı özetteki write_failed alanında döner.
+        """
+        frame = self.load(product_ids)
+        priced = self.diff(frame)
+        changed = priced[priced["changed"]]
+        to_write = priced[priced["changed"] | priced["stale"]]
+
+        summary = {
+            "scanned": len(frame),
+            "priced": len(priced),
+            "changed": len(changed),
+            "unchanged": len(priced) - len(changed),
+            "restamped": int(priced["stale"].sum()),
+            "skipped_no_cost": len(frame) - len(priced),
+            "write_failed": 0,
+        }
+        if dry_run or to_write.empty:
+            return summary
+
+        now = datetime.now(timezone.utc).isoformat()
+        for row in to_write.itertuples(index=False):
+            fields = {}
+            if row.stale:
+                fields.update({
+                    "computed_price": float(row.new_price),
+                    "pricing_rules_version": int(row.rules_version),
+                    "priced_cost": float(row.base_cost),
+                    "priced_at": now,
+                })
+            if row.changed:
+                fields.update({"listed_price": float(row.new_price), "needs_sync": True, "updated_at": now})
+            write_buffer.update("listings", row.listing_id, fields)
+        summary["write_failed"] = len(write_buffer.flush()["failed"])
+        return summary
+
+
+def run_repricing(product_ids: Iterable[str] = None, dry_run: bool = False) -> Dict[str, int]:
+    summary = RepricingJob().run(product_ids=product_ids, dry_run=dry_run)
+    mode = "KURU ÇALIŞTIRMA" if dry_run else "TAMAMLANDI"
+    print(
+        f"🎯 Yeniden fiyatlandırma {mode}: {summary['scanned']} ilan tarandı, {summary['priced']} fiyatlandı, "
+        f"{summary['changed']} değişti, {summary['unchanged']} aynı kaldı, {summary['restamped']} damga yenilendi, "
+        f"{summary['skipped_no_cost']} maliyetsiz."
+        + (f" ⚠️ {summary['write_failed']} ilan yazılamadı." if summary["write_failed"] else "")
+    )
+    return summary
+
+
+def run_loop(interval: float = None):
+    """Arka plan modu: katalogu periyodik olarak yeniden fiyatlar (sadece eskimiş/değişen satırlar yazılır)."""
+    interval = interval or float(os.getenv("REPRICE_INTERVAL", DEFAULT_INTERVAL))
+    while True:
+        try:
+            run_repricing()
+        except Exception as e:
+            print(f"[Repricing] Çalışma hatası: {e}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    if "--loop" in sys.argv[1:]:
+        run_loop()
+    else:
+        run_repricing(dry_run="--dry-run" in sys.argv[1:])
@@ -1,6 +1,9 @@
+import asyncio
+import os
 import time
 from database import db
-from ebay_core import EbayManager
+from write_buffer import write_buffer
+from ebay_core import EbayManager, MAX_INVENTORY_STATUS_PER_CALL, MAX_BULK_INVENTORY_PER_CALL, CHANNEL_API_INVENTORY
 
 STORE_ID = "197bd215-3bec-4f43-aa40-f2fb4d204eee"
 
@@ -10,14 +13,66 @@ class PushEngine:
         self.ebay = EbayManager(store_id=STORE_ID)
         
     def get_pending_updates(self):
-        """needs_sync=True olan tüm aktif ilanları Supabase'den çeker."""
-        response = self.db.client.table('listings').select(
-            "product_id, channel_item_id, channel_sku, listed_price, quantity, category_id, shipping_profile_id, return_profile_id, payment_profile_id"
-        ).eq("needs_sync", True).eq("is_active", True).execute()
-        return response.data
+        """needs_sync=True olan tüm aktif ilanları Supabase'den çeker (keyset sayfalama; 1000 satır sınırı yok)."""
+        return list(self.db.iter_rows(
+            'listings',
+            "id, product_id, channel_item_id, channel_sku, listed_price, quantity, category_id, shipping_profile_id, return_profile_id, payment_profile_id, needs_full_revise, channel_offer_id, channel_api",
+            filters=lambda q: q.eq("needs_sync", True).eq("is_active", True),
+        ))
 
-    def push_updates(self):
-        """Kuyruktaki güncellemeleri ReviseFixedPriceItem ile eBay'e basar ve başarılı olanları needs_sync=False yapar."""
+    @staticmethod
+    def _build_payload(item):
+        """İlan satırından ReviseFixedPriceItem payload'ı (sadece dolu alanlar)."""
+        payload = {}
+        if item.get('listed_price') is not None:
+            payload["StartPrice"] = item.get('listed_price')
+        if item.get('quantity') is not None:
+            payload["Quantity"] = item.get('quantity')
+        if item.get('category_id'):
+            payload["CategoryID"] = item.get('category_id')
+            
+        # Politikalar
+        profiles = {}
+        if item.get('payment_profile_id'): profiles['PaymentProfileID'] = item.get('payment_profile_id')
+        if item.get('return_profile_id'): profiles['ReturnProfileID'] = item.get('return_profile_id')
+        if item.get('shipping_profile_id'): profiles['ShippingProfileID'] = item.get('shipping_profile_id')
+        if profiles:
+            payload["SellerProfiles"] = profiles
+        return payload
+
+    @staticmethod
+    def _inventory_entry(item):
+        return {
+            "sku": item.get('channel_sku'), "item_id": item.get('channel_item_id'),
+            "price": item.get('listed_price'), "quantity": item.get('quantity'),
+            # Kayıtlı kanal bilgisi: offer araması yapmadan doğru uca gider
+            "api": item.get('channel_api'), "offer_id": item.get('channel_offer_id'),
+        }
+
+    async def _revise_all_async(self, full, status):
+        """Revizeleri AsyncEbayManager ile eşzamanlı gönderir (eşzamanlılık ve hız limiti manager'da)."""
+        from ebay_async import AsyncEbayManager
+
+        async with AsyncEbayManager(STORE_ID) as ebay:
+            full_results, status_results = await asyncio.gather(
+                asyncio.gather(*(ebay.revise_item(item['channel_item_id'], payload) for item, payload in full), return_exceptions=True),
+                ebay.update_prices_and_quantities([self._inventory_entry(item) for item in status]),
+            )
+        return list(full_results), status_results
+
+    def _revise_all(self, full, status):
+        full_results = [self.ebay.revise_item_xml(item['channel_item_id'], payload) for item, payload in full]
+        return full_results, self.ebay.update_prices_and_quantities([self._inventory_entry(item) for item in status])
+
+    def push_updates(self, use_async: bool = None):
+        """
+        Kuyruktaki güncellemeleri eBay'e basar ve başarılı olanları needs_sync=False yapar.
+        needs_full_revise işaretli ilanlar (kategori/politika değişikliği) ReviseFixedPriceItem ile, sadece fiyat/stok
+        değişenler update_prices_and_quantities ile (Inventory API SKU'ları 25'erli bulk_update_price_quantity,
+        legacy ilanlar 4'erli ReviseInventoryStatus) gönderilir. Varsayılan olarak çağrılar eşzamanlı gönderilir (ebay_async); EBAY_ASYNC=0 veya use_async=False seri yoldur.
+        """
+        if use_async is None:
+            use_async = os.getenv("EBAY_ASYNC", "1") != "0"
         items_to_sync = self.get_pending_updates()
         total_items = len(items_to_sync)
         
@@ -27,6 +82,8 @@ class PushEngine:
         success_count = 0
         error_count = 0
         logs = []
+        full = []
+        status = []
         
         for item in items_to_sync:
             item_id = item.get('channel_item_id')
@@ -35,42 +92,52 @@ class PushEngine:
                 error_count += 1
                 continue
                 
-            payload = {}
-            if item.get('listed_price') is not None:
-                payload["StartPrice"] = item.get('listed_price')
-            if item.get('quantity') is not None:
-                payload["Quantity"] = item.get('quantity')
-            if item.get('category_id'):
-                payload["CategoryID"] = item.get('category_id')
-                
-            # Politikalar
-            profiles = {}
-            if item.get('payment_profile_id'): profiles['PaymentProfileID'] = item.get('payment_profile_id')
-            if item.get('return_profile_id'): profiles['ReturnProfileID'] = item.get('return_profile_id')
-            if item.get('shipping_profile_id'): profiles['ShippingProfileID'] = item.get('shipping_profile_id')
-            if profiles:
-                payload["SellerProfiles"] = profiles
-                
+            if not item.get('needs_full_revise'):
+                if item.get('listed_price') is None and item.get('quantity') is None:
+                    write_buffer.update('listings', item['id'], {"needs_sync": False})
+                else:
+                    status.append(item)
+                continue
+
+            payload = self._build_payload(item)
             if not payload:
                 # Güncellenecek detay yoksa atla
-                self.db.client.table('listings').update({"needs_sync": False}).eq("product_id", item['product_id']).execute()
+                write_buffer.update('listings', item['id'], {"needs_sync": False, "needs_full_revise": False})
                 continue
+            full.append((item, payload))
                 
-            # eBay'e XML gönder
-            result = self.ebay.revise_item_xml(item_id, payload)
-            
+        # eBay'e XML gönder
+        if use_async:
+            full_results, status_results = asyncio.run(self._revise_all_async(full, status))
+        else:
+            full_results, status_results = self._revise_all(full, status)
+
+        results = full_results + status_results
+        for item, result in zip([item for item, _ in full] + status, results):
+            if isinstance(result, Exception):
+                result = {"success": False, "message": f"{type(result).__name__}: {result}"}
             if result['success']:
                 success_count += 1
-                # Supabase'i güncelle
-                self.db.client.table('listings').update({"needs_sync": False}).eq("product_id", item['product_id']).execute()
+                # Supabase'i güncelle (toplu yazma tamponu, döngü sonunda tek seferde)
+                write_buffer.update('listings', item['id'], {"needs_sync": False, "needs_full_revise": False})
             else:
                 error_count += 1
                 logs.append(f"❌ {item.get('channel_sku')}: {result['message']}")
                 
+        # eBay güncellendi ama needs_sync temizlenemediyse ilan bir sonraki turda yeniden gönderilir
+        failed = write_buffer.flush()["failed"]
+        if failed:
+            logs.append(f"⚠️ {len(failed)} ilanın needs_sync bayrağı temizlenemedi, bir sonraki senkronda tekrar gönderilecek.")
+                
         # Özet Dön
+        via_rest = sum(1 for r in status_results if isinstance(r, dict) and r.get("path") == CHANNEL_API_INVENTORY)
+        rest_calls = -(-via_rest // MAX_BULK_INVENTORY_PER_CALL)
+        trading_calls = -(-(len(status) - via_rest) // MAX_INVENTORY_STATUS_PER_CALL)
         return {
-            "status": "success" if error_count == 0 else "warning",
-            "message": f"{success_count} ürün başarıyla güncellendi, {error_count} hata.",
+            "status": "success" if error_count == 0 and not failed else "warning",
+            "message": f"{success_count} ürün başarıyla güncellendi, {error_count} hata. "
+                       f"({len(full)} tam revize, {len(status)} fiyat/stok: {via_rest} Inventory API {rest_calls} çağrıda, "
+                       f"{len(status) - via_rest} Trading API {trading_calls} çağrıda)",
             "logs": logs
         }
 
@@ -1,17 +1,7 @@
 import time
-import os
-from dotenv import load_dotenv
-from supabase import create_client
+from database import db
 from ebay_core import EbayManager
 
-load_dotenv()
-SUPABASE_URL = os.environ.get("SUPABASE_URL")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL or SUPABASE_KEY is missing in .env")
-
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 # Kendi mağaza UUID'ni buraya gir
 STORE_ID = "197bd215-3bec-4f43-aa40-f2fb4d204eee" 
 
@@ -25,7 +15,7 @@ def run_sync_worker():
     while True:
         try:
             # Sadece 'needs_sync' şalteri TRUE olan (değişmiş) ürünleri çek
-            response = supabase.table("listings").select("*").eq("needs_sync", True).execute()
+            response = db.client.table("listings").select("*").eq("needs_sync", True).execute()
             changed_items = response.data
             
             if not changed_items:
@@ -50,7 +40,7 @@ def run_sync_worker():
                 manager.update_price_and_quantity(isku, new_price, new_qty)
                 
                 # 2. İşlem bittikten sonra şalteri geri indir (FALSE yap) ki bir daha göndermesin
-                supabase.table("listings").update({"needs_sync": False}).eq("id", db_id).execute()
+                db.client.table("listings").update({"needs_sync": False}).eq("id", db_id).execute()
                 print(f"-> {isku} başarıyla senkronize edildi ve şalter kapatıldı.")
                 
             print("Kuyruk temizlendi. Yeni değişiklikler bekleniyor...\n")
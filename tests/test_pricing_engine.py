@@ -0,0 +1,132 @@
+"""PricingEngine.calculate_final_prices (toplu) ile calculate_final_price (skaler) bit düzeyinde aynı olmalı."""
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("supabase")  # pricing_engine -> database
+
+from pricing_engine import FALLBACK_TIER_ABOVE, FALLBACK_TIERS, PricingEngine, PricingRuleSet
+
+MARKETPLACE = "test-market"
+NO_TIERS = "test-market-no-tiers"
+
+RULES = {
+    "return_allowance_percent": 0.5,
+    "damage_allowance_percent": 0.3,
+    "overhead_allowance_percent": 1.2,
+    "ad_spend_percent": 2.0,
+    "sales_tax_allowance_percent": 7.25,
+    "additional_logistics_fee": 0.35,
+    "min_profit_absolute": 4.5,
+}
+
+# DB sırasıyla, bilerek sıralanmamış ve çakışan kademeler: ilk eşleşen kazanır.
+# En üst kademe 100$'da biter; üstündeki maliyetler hard kurala düşer.
+TIERS = [
+    {"min_price": 20, "max_price": 40, "margin_percent": 4, "margin_fixed": 5},
+    {"min_price": 0, "max_price": 25, "margin_percent": 2, "margin_fixed": 7},
+    {"min_price": 35, "max_price": 60, "margin_percent": 6, "margin_fixed": 3},
+    {"min_price": 60, "max_price": 100, "margin_percent": 8.5, "margin_fixed": 2.25},
+]
+
+FEES = [None, 0.0, 12.9, 15.0, 60.0, 120.0]
+
+
+@pytest.fixture(autouse=True)
+def seeded_rules():
+    """DB yerine sabit (sürümsüz) kural setleri kurar."""
+    PricingEngine.install_rule_set(PricingRuleSet(MARKETPLACE, RULES, TIERS))
+    PricingEngine.install_rule_set(PricingRuleSet(NO_TIERS, None, []))
+    yield
+    PricingEngine.invalidate(MARKETPLACE)
+    PricingEngine.invalidate(NO_TIERS)
+
+
+def _edges(values):
+    values = np.asarray(sorted(set(values)), dtype=np.float64)
+    return (values[:, None] + np.array([-1e-9, 0.0, 1e-9])).ravel()
+
+
+def _assert_matches_scalar(costs, marketplace, fees=None):
+    costs = np.asarray(costs, dtype=np.float64)
+    if fees is None:
+        fees = [FEES[i % len(FEES)] for i in range(len(costs))]
+    fee_array = np.array([15.0 if f is None else f for f in fees])
+
+    batch = PricingEngine.calculate_final_prices(costs, marketplace, fee_percents=fee_array)
+    scalar = np.array([
+        PricingEngine.calculate_final_price(float(c), marketplace, override_marketplace_fee=f)
+        for c, f in zip(costs, fees)
+    ])
+    mismatches = np.flatnonzero(batch.view(np.int64) != scalar.view(np.int64))
+    assert not len(mismatches), [(costs[i], fees[i], batch[i], scalar[i]) for i in mismatches[:10]]
+    return scalar
+
+
+@pytest.mark.parametrize("marketplace", [MARKETPLACE, NO_TIERS])
+def test_random_costs(marketplace):
+    rng = np.random.default_rng(7)
+    costs = np.concatenate([rng.uniform(0.01, 500, 5000), rng.lognormal(3, 1, 5000)])
+    _assert_matches_scalar(costs, marketplace, list(rng.choice(FEES, len(costs))))
+
+
+def test_tier_edges():
+    bounds = [t["min_price"] for t in TIERS] + [t["max_price"] for t in TIERS]
+    _assert_matches_scalar(_edges(bounds), MARKETPLACE)
+
+
+def test_fallback_tier_edges():
+    bounds = [upper for upper, _, _ in FALLBACK_TIERS]
+    _assert_matches_scalar(_edges([0.01] + bounds), NO_TIERS)
+
+
+@pytest.mark.parametrize("marketplace", [MARKETPLACE, NO_TIERS])
+def test_ten_dollar_fixed_fee_switch(marketplace):
+    # Ham fiyatın $10 eşiğini geçtiği bölgeyi ince bir ızgarayla tara
+    costs = np.linspace(0.01, 8.0, 40001)
+    scalar = _assert_matches_scalar(costs, marketplace, [15.0] * len(costs))
+    assert (scalar < 10).any() and (scalar >= 10).any()
+
+
+@pytest.mark.parametrize("marketplace", [MARKETPLACE, NO_TIERS])
+def test_costs_above_top_tier(marketplace):
+    costs = np.concatenate([_edges([100.0]), np.geomspace(100.5, 1e6, 500)])
+    _assert_matches_scalar(costs, marketplace)
+    percent, fixed = PricingEngine.get_tier_margins(marketplace, np.array([150.0, 1e6]))
+    assert percent.tolist() == [FALLBACK_TIER_ABOVE[0]] * 2
+    assert fixed.tolist() == [FALLBACK_TIER_ABOVE[1]] * 2
+
+
+def test_overlapping_tiers_first_match_wins():
+    costs = np.array([22.0, 25.0, 38.0, 40.0, 60.0])
+    percent, fixed = PricingEngine.get_tier_margins(MARKETPLACE, costs)
+    assert percent.tolist() == [4.0, 4.0, 4.0, 4.0, 6.0]
+    assert fixed.tolist() == [5.0, 5.0, 5.0, 5.0, 3.0]
+    for cost, p, f in zip(costs, percent, fixed):
+        assert PricingEngine.get_tier_margin_from_db(MARKETPLACE, float(cost)) == {"percent": p, "fixed": f}
+    _assert_matches_scalar(costs, MARKETPLACE)
+
+
+@pytest.mark.parametrize("marketplace", [MARKETPLACE, NO_TIERS])
+def test_bisect_index_matches_linear_scan(marketplace):
+    rs = PricingEngine.get_rule_set(marketplace)
+    rng = np.random.default_rng(11)
+    costs = np.concatenate([_edges(rs._points), rng.uniform(-5, 200, 2000)])
+    percent, fixed = rs.margins_for(costs)
+    for cost, p, f in zip(costs, percent, fixed):
+        assert rs.margin_for(float(cost)) == rs._scan(float(cost)) == (p, f)
+
+
+@pytest.mark.parametrize("cost", [0.0, -0.0, -1.0, math.nan, math.inf, -math.inf])
+def test_invalid_costs_price_to_zero(cost):
+    assert PricingEngine.calculate_final_price(cost, MARKETPLACE) == 0.0
+    assert PricingEngine.calculate_final_prices([cost], MARKETPLACE).tolist() == [0.0]
+
+
+def test_series_keeps_index():
+    pd = pytest.importorskip("pandas")
+    costs = pd.Series([12.5, math.nan, 48.0], index=["a", "b", "c"])
+    prices = PricingEngine.calculate_final_prices(costs, MARKETPLACE)
+    assert list(prices.index) == ["a", "b", "c"]
+    assert prices["b"] == 0.0
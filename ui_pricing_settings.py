@@ -1,6 +1,10 @@
+import time
 import streamlit as st
+import numpy as np
 import pandas as pd
 from database import db
+from pricing_engine import PricingEngine, PricingRuleSet
+from repricing_job import RepricingJob
 
 def render_pricing_settings():
     st.title("⚙️ Fiyatlandırma Yönetimi (ERP)")
@@ -52,8 +56,24 @@ def render_pricing_settings():
 
         min_profit = st.number_input("Minimum Mutlak Kâr ($)", min_value=0.0, max_value=100.0, value=float(current_rules.get("min_profit_absolute", 0.00)), step=0.5, help="Fiyat rekabeti algoritması kârı asla bunun altına düşüremez.")
             
-        submit_buffers = st.form_submit_button("🛡️ Risk Tamponlarını Güncelle", use_container_width=True)
+        col_save, col_sim = st.columns(2)
+        with col_save:
+            submit_buffers = st.form_submit_button("🛡️ Risk Tamponlarını Güncelle", use_container_width=True)
+        with col_sim:
+            simulate_buffers = st.form_submit_button("🧪 Kaydetmeden Simüle Et", use_container_width=True)
+        if simulate_buffers:
+            # Bekleyen tamponlar sadece aşağıdaki simülasyon paneline verilir, DB'ye yazılmaz
+            st.session_state[f"pricing_sim_rules_{target_marketplace}"] = {
+                "return_allowance_percent": ret_allowance,
+                "damage_allowance_percent": dmg_allowance,
+                "overhead_allowance_percent": overhead_allowance,
+                "ad_spend_percent": ad_spend,
+                "sales_tax_allowance_percent": tax_allowance,
+                "additional_logistics_fee": additional_fee,
+                "min_profit_absolute": min_profit
+            }
         if submit_buffers:
+            st.session_state.pop(f"pricing_sim_rules_{target_marketplace}", None)
             payload = {
                 "marketplace": target_marketplace,
                 "return_allowance_percent": ret_allowance,
@@ -66,6 +86,8 @@ def render_pricing_settings():
             }
             try:
                 db.client.table("pricing_rules").upsert(payload, on_conflict="marketplace").execute()
+                # Çalışan botlar yeni kuralları PRICING_RULES_TTL içinde yüklesin
+                PricingEngine.bump_rules_version(target_marketplace)
                 st.success("Tüm risk tamponları ve güvenlik kalkanları başarıyla güncellendi!")
                 st.rerun()
             except Exception as e:
@@ -78,17 +100,19 @@ def render_pricing_settings():
     st.caption("Ürün geliş fiyatına göre kademeli (Tiered) artan kâr planları. (Örn: 0-18Dolar arasına %0 ve 6$ Sabit Kâr)")
     
     try:
-        tiers_res = db.client.table("profit_tiers").select("*").eq("marketplace", target_marketplace).order("min_price").execute()
-        tiers_data = tiers_res.data
+        # Motorla aynı sırada: kademeler çakışırsa listede üstte olan (ilk eşleşen) kazanır
+        tiers_data = PricingEngine.fetch_tiers(target_marketplace)
     except Exception as e:
         tiers_data = []
 
+    edited_tiers = None
     if tiers_data:
         df_tiers = pd.DataFrame(tiers_data)
         # Display editable dataframe
         display_df = df_tiers[["id", "min_price", "max_price", "margin_percent", "margin_fixed"]].copy()
         
         st.markdown("**Mevcut Kademeler:**")
+        st.caption("Sıra, fiyat motorunun kademeleri değerlendirdiği sıradır: çakışan aralıklarda üstteki ilk eşleşen kademe uygulanır.")
         edited_tiers = st.data_editor(
             display_df,
             column_config={
@@ -123,12 +147,18 @@ def render_pricing_settings():
                 except Exception as e:
                     st.error(f"Tier güncelleme hatası: {e}")
                     
+            PricingEngine.bump_rules_version(target_marketplace)
             st.success("Kâr kademeleri veritabanına işlendi!")
             st.rerun()
     else:
         st.info("Bu pazar yeri için kâr kademesi tanımlanmamış.")
 
     st.markdown("---")
+
+    # 4. KURAL DEĞİŞİKLİĞİ SİMÜLASYONU (WHAT-IF)
+    render_rule_change_simulation(target_marketplace, current_rules, edited_tiers)
+
+    st.markdown("---")
     
     # 5. TEST MOTORU (CANLI SİMÜLATÖR)
     st.subheader("🧪 Canlı Fiyatlandırma Simülatörü")
@@ -146,7 +176,6 @@ def render_pricing_settings():
             with col_test2:
                 st.markdown("<br>", unsafe_allow_html=True)
                 if st.button("🧮 Manuel Değerlerle Hesapla", use_container_width=True):
-                    from pricing_engine import PricingEngine
                     try:
                         final_price = PricingEngine.calculate_final_price(
                             source_price=test_source_cost,
@@ -198,7 +227,6 @@ def render_pricing_settings():
                                                 if c_res.data:
                                                     cat_fee = float(c_res.data[0]['marketplace_fee_percent'])
                                         
-                                        from pricing_engine import PricingEngine
                                         final_price = PricingEngine.calculate_final_price(
                                             source_price=db_cost,
                                             marketplace=target_marketplace,
@@ -213,3 +241,81 @@ def render_pricing_settings():
                             st.error(f"Sorgu veya Hesaplama Hatası: {e}")
                     else:
                         st.warning("Lütfen bir ASIN girin.")
+
+
+def _pending_tiers(edited_tiers) -> list:
+    """data_editor'deki (kaydedilmemiş) kademeleri PricingRuleSet'in beklediği biçime çevirir; eksik satırlar atlanır.
+    Editör motorun sırasıyla (PricingEngine.fetch_tiers) doldurulduğu için sıra korunur, yeniden sıralanmaz."""
+    if edited_tiers is None:
+        return []
+    tiers = []
+    for row in edited_tiers.to_dict("records"):
+        if pd.isnull(row.get("min_price")) or pd.isnull(row.get("margin_percent")) or pd.isnull(row.get("margin_fixed")):
+            continue
+        tiers.append({
+            "min_price": float(row["min_price"]),
+            "max_price": float(row["max_price"]) if pd.notnull(row.get("max_price")) else None,
+            "margin_percent": float(row["margin_percent"]),
+            "margin_fixed": float(row["margin_fixed"]),
+        })
+    return tiers
+
+
+def render_rule_change_simulation(target_marketplace: str, current_rules: dict, edited_tiers):
+    """
+    Bekleyen tampon/kademe değişikliklerini kaydetmeden tüm kataloğa uygular: katalog bir kez toplu okunur
+    (oturumda saklanır), her iki kural setiyle fiyatlar RepricingJob.simulate ile vektörel hesaplanır.
+    Fiyat farkı dağılımı, marj değişimi ve eBay'de revize gerekecek ilan sayısı gösterilir.
+    """
+    st.subheader("📊 Kural Değişikliği Simülasyonu (What-if)")
+    st.caption("Yukarıdaki kaydedilmemiş kademe düzenlemeleri ve '🧪 Kaydetmeden Simüle Et' ile gönderilen tamponlar tüm kataloğa uygulanır. Veritabanına hiçbir şey yazılmaz.")
+
+    frame_key = f"pricing_sim_frame_{target_marketplace}"
+    job = RepricingJob(marketplace=target_marketplace)
+    if st.button("📥 Kataloğu Yükle / Yenile", key=f"pricing_sim_load_{target_marketplace}"):
+        with st.spinner("İlanlar, maliyetler ve kategori komisyonları toplu okunuyor..."):
+            st.session_state[frame_key] = job.load()
+
+    frame = st.session_state.get(frame_key)
+    if frame is None:
+        st.info("Simülasyon için önce kataloğu yükleyin.")
+        return
+
+    pending_rules = st.session_state.get(f"pricing_sim_rules_{target_marketplace}")
+    rule_set = PricingRuleSet(target_marketplace, pending_rules or current_rules, _pending_tiers(edited_tiers))
+
+    started = time.perf_counter()
+    sim = job.simulate(frame, rule_set)
+    elapsed = time.perf_counter() - started
+    if sim.empty:
+        st.warning("Maliyeti olan ilan bulunamadı.")
+        return
+
+    changed = (sim["delta"].abs() > job.tolerance)
+    revise_now = sim["listed_price"].isna() | ((sim["current_price"] - sim["listed_price"]).abs() > job.tolerance)
+    revise_added = sim["needs_revise"] & ~revise_now
+
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Fiyatı Değişecek İlan", f"{int(changed.sum()):,}", help=f"{len(sim):,} maliyetli ilan içinden")
+    m2.metric("eBay Revize Gerekecek", f"{int(sim['needs_revise'].sum()):,}", delta=f"{int(revise_added.sum()):,} bu değişiklikten", delta_color="off")
+    m3.metric("Ort. Fiyat Farkı", f"${sim['delta'].mean():+.2f}", delta=f"Toplam ${sim['delta'].sum():+,.2f}", delta_color="off")
+    m4.metric("Ort. Brüt Marj", f"%{sim['proposed_margin'].mean():.2f}", delta=f"{sim['proposed_margin'].mean() - sim['current_margin'].mean():+.2f} puan")
+
+    col_hist, col_margin = st.columns(2)
+    with col_hist:
+        st.markdown("**Fiyat Farkı Dağılımı ($, değişen ilanlar)**")
+        deltas = sim.loc[changed, "delta"].to_numpy()
+        if len(deltas):
+            counts, edges = np.histogram(deltas, bins=min(30, max(1, len(np.unique(deltas)))))
+            labels = [f"{lo:+.2f} … {hi:+.2f}" for lo, hi in zip(edges[:-1], edges[1:])]
+            st.bar_chart(pd.DataFrame({"İlan": counts}, index=labels))
+        else:
+            st.info("Bekleyen değişiklik hiçbir fiyatı değiştirmiyor.")
+    with col_margin:
+        st.markdown("**Brüt Marj Değişimi (%)**")
+        margins = sim[["current_margin", "proposed_margin"]].describe(percentiles=[0.1, 0.5, 0.9]).drop("count")
+        margins.columns = ["Mevcut", "Önerilen"]
+        margins["Fark"] = margins["Önerilen"] - margins["Mevcut"]
+        st.dataframe(margins.round(2), use_container_width=True)
+
+    st.caption(f"{len(sim):,} ilan, {elapsed * 1000:.0f} ms içinde yeniden fiyatlandı.")
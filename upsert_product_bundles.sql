@@ -0,0 +1,178 @@
+-- Ürün paketlerini (core_products + product_base_content + product_logistics + sources + listings)
+-- tek RPC çağrısında ve tek transaction içinde upsert eden fonksiyon.
+-- Python tarafı: DatabaseManager.upsert_product_bundles()
+--
+-- Her paket (bundle) bir JSON nesnesidir. Tüm anahtarlar opsiyoneldir:
+--   asin, upc, requires_expiration, base_title, with_logistics,
+--   supplier_id, source_code, base_cost,
+--   store_id, channel_item_id, channel_sku, listed_price, quantity, category_id,
+--   shipping_profile_id, return_profile_id, payment_profile_id, is_active, needs_sync
+--
+-- Kurallar:
+--   * Ürün ASIN ile eşleştirilir. ASIN'i olmayan paket her zaman yeni ürün oluşturur.
+--   * Aynı pakette tekrar eden anahtarlarda (ASIN, ürün+tedarikçi, ürün+mağaza) İLK kayıt geçerlidir.
+--   * Güncellemelerde NULL gelen alanlar mevcut değeri ezmez (COALESCE).
+--   * supplier_id verilmezse sources, store_id verilmezse listings tablosuna dokunulmaz.
+-- Dönüş: gönderilen sırayla (bundle_index, asin, product_id, source_id, listing_id)
+
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+
+CREATE OR REPLACE FUNCTION public.upsert_product_bundles(bundles JSONB)
+RETURNS TABLE (bundle_index INT, asin TEXT, product_id UUID, source_id UUID, listing_id UUID)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+BEGIN
+    DROP TABLE IF EXISTS _bundles;
+    CREATE TEMP TABLE _bundles ON COMMIT DROP AS
+    SELECT
+        (e.ord - 1)::INT                                     AS bundle_index,
+        NULLIF(TRIM(e.doc->>'asin'), '')                     AS asin,
+        NULLIF(e.doc->>'upc', '')                            AS upc,
+        (e.doc->>'requires_expiration')::BOOLEAN             AS requires_expiration,
+        e.doc->>'base_title'                                 AS base_title,
+        COALESCE((e.doc->>'with_logistics')::BOOLEAN, FALSE) AS with_logistics,
+        (e.doc->>'supplier_id')::UUID                        AS supplier_id,
+        e.doc->>'source_code'                                AS source_code,
+        (e.doc->>'base_cost')::NUMERIC                       AS base_cost,
+        (e.doc->>'store_id')::UUID                           AS store_id,
+        NULLIF(e.doc->>'channel_item_id', '')                AS channel_item_id,
+        NULLIF(e.doc->>'channel_sku', '')                    AS channel_sku,
+        (e.doc->>'listed_price')::NUMERIC                    AS listed_price,
+        (e.doc->>'quantity')::INT                            AS quantity,
+        e.doc->>'category_id'                                AS category_id,
+        e.doc->>'shipping_profile_id'                        AS shipping_profile_id,
+        e.doc->>'return_profile_id'                          AS return_profile_id,
+        e.doc->>'payment_profile_id'                         AS payment_profile_id,
+        (e.doc->>'is_active')::BOOLEAN                       AS is_active,
+        (e.doc->>'needs_sync')::BOOLEAN                      AS needs_sync,
+        NULL::UUID                                           AS product_id,
+        NULL::UUID                                           AS source_id,
+        NULL::UUID                                           AS listing_id
+    FROM jsonb_array_elements(bundles) WITH ORDINALITY AS e(doc, ord);
+
+    -- 1) Mevcut ürünleri ASIN üzerinden eşleştir
+    UPDATE _bundles b SET product_id = cp.id
+    FROM core_products cp
+    WHERE b.asin IS NOT NULL AND cp.asin = b.asin;
+
+    -- 2) Yeni ürünlere ID üret (aynı ASIN'i taşıyan paketler tek ID paylaşır)
+    WITH fresh AS (
+        SELECT COALESCE(asin, 'bundle:' || bundle_index) AS k, uuid_generate_v4() AS new_id
+        FROM _bundles
+        WHERE product_id IS NULL
+        GROUP BY COALESCE(asin, 'bundle:' || bundle_index)
+    )
+    UPDATE _bundles b SET product_id = f.new_id
+    FROM fresh f
+    WHERE b.product_id IS NULL AND COALESCE(b.asin, 'bundle:' || b.bundle_index) = f.k;
+
+    -- 3) core_products
+    UPDATE core_products cp
+    SET upc = COALESCE(b.upc, cp.upc),
+        requires_expiration = COALESCE(b.requires_expiration, cp.requires_expiration)
+    FROM (SELECT DISTINCT ON (product_id) * FROM _bundles ORDER BY product_id, bundle_index) b
+    WHERE cp.id = b.product_id AND (b.upc IS NOT NULL OR b.requires_expiration IS NOT NULL);
+
+    INSERT INTO core_products (id, asin, upc, requires_expiration)
+    SELECT DISTINCT ON (b.product_id) b.product_id, b.asin, b.upc, COALESCE(b.requires_expiration, FALSE)
+    FROM _bundles b
+    WHERE NOT EXISTS (SELECT 1 FROM core_products cp WHERE cp.id = b.product_id)
+    ORDER BY b.product_id, b.bundle_index
+    ON CONFLICT (asin) DO NOTHING;
+
+    -- Aynı ASIN'i eşzamanlı bir çağrı bizden önce eklediyse onun ID'sine geç
+    UPDATE _bundles b SET product_id = cp.id
+    FROM core_products cp
+    WHERE b.asin IS NOT NULL AND cp.asin = b.asin AND b.product_id <> cp.id;
+
+    -- 4) product_base_content (Başlık): her ürünün bir içerik satırı olur,
+    --    başlık gelmediyse mevcut başlık korunur
+    INSERT INTO product_base_content (product_id, base_title)
+    SELECT DISTINCT ON (b.product_id) b.product_id, b.base_title
+    FROM _bundles b
+    ORDER BY b.product_id, (b.base_title IS NULL), b.bundle_index
+    ON CONFLICT (product_id) DO UPDATE
+        SET base_title = EXCLUDED.base_title,
+            updated_at = NOW()
+        WHERE EXCLUDED.base_title IS NOT NULL;
+
+    -- 5) product_logistics (Sadece istenirse boş lojistik kaydı açılır)
+    INSERT INTO product_logistics (product_id)
+    SELECT DISTINCT b.product_id
+    FROM _bundles b
+    WHERE b.with_logistics
+      AND NOT EXISTS (SELECT 1 FROM product_logistics pl WHERE pl.product_id = b.product_id);
+
+    -- 6) sources (ürün + tedarikçi)
+    UPDATE sources s
+    SET source_code = COALESCE(b.source_code, s.source_code),
+        base_cost = COALESCE(b.base_cost, s.base_cost),
+        updated_at = NOW()
+    FROM (
+        SELECT DISTINCT ON (product_id, supplier_id) * FROM _bundles
+        WHERE supplier_id IS NOT NULL
+        ORDER BY product_id, supplier_id, bundle_index
+    ) b
+    WHERE s.product_id = b.product_id AND s.supplier_id = b.supplier_id;
+
+    INSERT INTO sources (product_id, supplier_id, source_code, base_cost)
+    SELECT DISTINCT ON (b.product_id, b.supplier_id) b.product_id, b.supplier_id, b.source_code, COALESCE(b.base_cost, 0)
+    FROM _bundles b
+    WHERE b.supplier_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM sources s WHERE s.product_id = b.product_id AND s.supplier_id = b.supplier_id)
+    ORDER BY b.product_id, b.supplier_id, b.bundle_index;
+
+    UPDATE _bundles b SET source_id = s.id
+    FROM sources s
+    WHERE s.product_id = b.product_id AND s.supplier_id = b.supplier_id;
+
+    -- 7) listings (ürün + mağaza)
+    UPDATE listings l
+    SET channel_item_id = COALESCE(b.channel_item_id, l.channel_item_id),
+        channel_sku = COALESCE(b.channel_sku, l.channel_sku),
+        listed_price = COALESCE(b.listed_price, l.listed_price),
+        quantity = COALESCE(b.quantity, l.quantity),
+        category_id = COALESCE(b.category_id, l.category_id),
+        shipping_profile_id = COALESCE(b.shipping_profile_id, l.shipping_profile_id),
+        return_profile_id = COALESCE(b.return_profile_id, l.return_profile_id),
+        payment_profile_id = COALESCE(b.payment_profile_id, l.payment_profile_id),
+        is_active = COALESCE(b.is_active, l.is_active),
+        needs_sync = COALESCE(b.needs_sync, l.needs_sync),
+        updated_at = NOW()
+    FROM (
+        SELECT DISTINCT ON (product_id, store_id) * FROM _bundles
+        WHERE store_id IS NOT NULL
+        ORDER BY product_id, store_id, bundle_index
+    ) b
+    WHERE l.product_id = b.product_id AND l.store_id = b.store_id;
+
+    INSERT INTO listings (
+        product_id, store_id, channel_item_id, channel_sku, listed_price, quantity, category_id,
+        shipping_profile_id, return_profile_id, payment_profile_id, is_active, needs_sync
+    )
+    SELECT DISTINCT ON (b.product_id, b.store_id)
+        b.product_id, b.store_id, b.channel_item_id, b.channel_sku, b.listed_price, COALESCE(b.quantity, 0), b.category_id,
+        b.shipping_profile_id, b.return_profile_id, b.payment_profile_id, COALESCE(b.is_active, TRUE), COALESCE(b.needs_sync, FALSE)
+    FROM _bundles b
+    WHERE b.store_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM listings l WHERE l.product_id = b.product_id AND l.store_id = b.store_id)
+    ORDER BY b.product_id, b.store_id, b.bundle_index;
+
+    UPDATE _bundles b SET listing_id = (
+        SELECT l.id FROM listings l
+        WHERE l.product_id = b.product_id AND l.store_id = b.store_id
+        ORDER BY l.id
+        LIMIT 1
+    )
+    WHERE b.store_id IS NOT NULL;
+
+    RETURN QUERY
+    SELECT b.bundle_index, b.asin, b.product_id, b.source_id, b.listing_id
+    FROM _bundles b
+    ORDER BY b.bundle_index;
+END;
+$$;
+
+-- PostgREST şema önbelleğini yenile ki RPC hemen görünsün
+NOTIFY pgrst, 'reload schema';
@@ -0,0 +1,167 @@
+"""
+Write-behind (geciktirilmiş yazma) tamponu.
+
+Tek satırlık update() çağrıları yerine, aynı satıra (tablo, birincil anahtar) gelen ardışık alan
+güncellemeleri bellekte birleştirilir ve toplu upsert'ler halinde yazılır:
+    * Bekleyen satır sayısı max_rows'a ulaşınca veya flush_interval saniye dolunca arka planda,
+    * flush() çağrıldığında veya süreç kapanırken (atexit) hemen.
+
+Aynı alan kümesine sahip satırlar tek upsert'te gider (PostgREST toplu upsert'te tüm satırların
+aynı kolonlara sahip olmasını bekler).
+
+flush() başarısız satırları MAX_ATTEMPTS'e kadar hemen yeniden dener ve sonucu döndürür; çağıran
+yazılamayan satırları kontrol etmelidir:
+    from write_buffer import write_buffer
+    write_buffer.update("listings", listing_id, {"listed_price": 19.98, "needs_sync": False})
+    result = write_buffer.flush()   # {"written": {"listings": 1}, "failed": []}
+    if result["failed"]:
+        ...  # [(tablo, pk değeri), ...]
+"""
+import atexit
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import db, DatabaseManager
+
+DEFAULT_MAX_ROWS = 500         # Bu kadar bekleyen satır olunca hemen yazılır
+DEFAULT_FLUSH_INTERVAL = 5.0   # Arka plan yazma aralığı (saniye)
+DEFAULT_CHUNK_SIZE = 500       # Tek upsert çağrısındaki en fazla satır
+MAX_ATTEMPTS = 3               # Başarısız satır bu kadar denemeden sonra atılır
+
+
+class WriteBehindBuffer:
+    """(tablo, birincil anahtar) başına alan güncellemelerini birleştirip toplu upsert eden tampon."""
+
+    def __init__(
+        self,
+        manager: DatabaseManager = None,
+        max_rows: int = None,
+        flush_interval: float = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        self.manager = manager or db
+        self.max_rows = max_rows or int(os.getenv("WRITE_BUFFER_MAX_ROWS", DEFAULT_MAX_ROWS))
+        self.flush_interval = flush_interval or float(os.getenv("WRITE_BUFFER_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+        self.chunk_size = chunk_size
+        self._pending: Dict[Tuple[str, str, Any], Dict] = {}
+        self._attempts: Dict[Tuple[str, str, Any], int] = {}
+        self._failed: List[Tuple[str, Any]] = []  # Son flush()'tan beri atılan satırlar (tablo, pk değeri)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    # ---------------------------------------------------------
+    # Kuyruğa alma
+    # ---------------------------------------------------------
+    def update(self, table: str, pk_value: Any, fields: Dict, pk: str = "id"):
+        """Satırın alanlarını günceller; aynı satıra daha önce gelmiş alanlarla birleştirilir (son yazan kazanır)."""
+        if pk_value is None or not fields:
+            return
+        key = (table, pk, pk_value)
+        with self._lock:
+            self._pending.setdefault(key, {}).update(fields)
+            full = len(self._pending) >= self.max_rows
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._stopped.clear()
+                    self._worker = threading.Thread(target=self._run, name="write-behind-buffer", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self._write_pending()
+            except Exception as e:
+                print(f"[Write Buffer] Arka plan yazma hatası: {e}")
+
+    # ---------------------------------------------------------
+    # Yazma
+    # ---------------------------------------------------------
+    def flush(self) -> Dict[str, Any]:
+        """Bekleyen tüm satırları toplu upsert eder, başarısızları MAX_ATTEMPTS'e kadar hemen yeniden dener.
+        Dönüş: {"written": {tablo: satır sayısı}, "failed": [(tablo, pk değeri), ...]}; failed arka plan
+        turlarında atılanlar dahil son flush()'tan beri yazılamayan tüm satırları içerir."""
+        written: Dict[str, int] = {}
+        for _ in range(MAX_ATTEMPTS):
+            for table, count in self._write_pending().items():
+                written[table] = written.get(table, 0) + count
+            if not len(self):
+                break
+        with self._lock:
+            failed, self._failed = self._failed, []
+        return {"written": written, "failed": failed}
+
+    def _write_pending(self) -> Dict[str, int]:
+        """Bekleyenleri tek turda yazar; başarısız parçalar bir sonraki tur için geri konur."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return {}
+
+            # (tablo, pk kolonu, alan kümesi) başına grupla
+            groups: Dict[Tuple[str, str, Tuple[str, ...]], list] = {}
+            for (table, pk, pk_value), fields in pending.items():
+                groups.setdefault((table, pk, tuple(sorted(fields))), []).append({pk: pk_value, **fields})
+
+            written: Dict[str, int] = {}
+            for (table, pk, _), rows in groups.items():
+                for i in range(0, len(rows), self.chunk_size):
+                    chunk = rows[i:i + self.chunk_size]
+                    try:
+                        self.manager.client.table(table).upsert(chunk, on_conflict=pk).execute()
+                        written[table] = written.get(table, 0) + len(chunk)
+                        if self._attempts:
+                            with self._lock:
+                                for row in chunk:
+                                    self._attempts.pop((table, pk, row[pk]), None)
+                    except Exception as e:
+                        print(f"[Write Buffer] {table} upsert hatası ({len(chunk)} satır), bir sonraki turda tekrar denenecek: {e}")
+                        self._requeue(table, pk, chunk)
+            return written
+
+    def _requeue(self, table: str, pk: str, rows: list):
+        """Başarısız satırları geri koyar; bu arada gelen daha yeni alanlar korunur."""
+        with self._lock:
+            for row in rows:
+                key = (table, pk, row[pk])
+                attempts = self._attempts.get(key, 0) + 1
+                if attempts >= MAX_ATTEMPTS:
+                    self._attempts.pop(key, None)
+                    self._failed.append((table, row[pk]))
+                    print(f"[Write Buffer] {table}.{pk}={row[pk]} {attempts} denemede yazılamadı, atlanıyor.")
+                    continue
+                self._attempts[key] = attempts
+                fields = {k: v for k, v in row.items() if k != pk}
+                self._pending[key] = {**fields, **self._pending.get(key, {})}
+
+    def close(self) -> Dict[str, Any]:
+        """Arka plan thread'ini durdurur ve kalanları yazar (süreç kapanışında çağrılır)."""
+        self._stopped.set()
+        self._wakeup.set()
+        return self.flush()
+
+
+write_buffer = WriteBehindBuffer()
+atexit.register(write_buffer.close)